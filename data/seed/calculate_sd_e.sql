@@ -45,17 +45,26 @@ of math, english and foreign language subjects.
 */
 -- Calculate E and SD dynamically based on the `exam` table
 -- TODO it only works for GEORGIAN, FOREIGN, MATHEMATICS triple of exams for aplha
+-- Superseded by `python -m src.db.calibration`, which fits every exam with bounds from all observed scores
 WITH
 SubjectScoreStats AS (
+    -- Grouped by subject ID, the names of the few groups are joined afterwards
     SELECT
-        r.subject_name,
-        e.year,
-        MIN(scaled_score) AS min_score,
-        MAX(scaled_score) AS max_score
-    FROM result r
-    JOIN enrollment e ON e.student_id = r.enrollment_id
-    WHERE r.subject_name IN (SELECT name FROM subject)
-    GROUP BY e.year, r.subject_name
+        s.name AS subject_name,
+        stats.year,
+        stats.min_score,
+        stats.max_score
+    FROM (
+        SELECT
+            r.subject_id,
+            e.year,
+            MIN(scaled_score) AS min_score,
+            MAX(scaled_score) AS max_score
+        FROM result r
+        JOIN enrollment e ON e.student_id = r.enrollment_id
+        GROUP BY e.year, r.subject_id
+    ) stats
+    JOIN subject s ON s.id = stats.subject_id
 ),
 CalculateSPAndThresholds AS (
     SELECT
@@ -0,0 +1,15 @@
+-- Manifest of ingested source files, one row per parsed PDF of a year.
+-- Lets the parsers skip unchanged files and replace only the rows of changed years.
+CREATE TABLE IF NOT EXISTS ingestion
+(
+    kind             VARCHAR(31)  NOT NULL, -- 'enrollment' or 'grant'.
+    year             INTEGER      NOT NULL, -- The year the source file covers.
+    source_file      VARCHAR(255) NOT NULL, -- File name of the source PDF.
+    file_hash        CHAR(64)     NOT NULL, -- SHA-256 of the source PDF content.
+    enrollment_count INTEGER      NOT NULL DEFAULT 0, -- Rows written to the enrollment table.
+    result_count     INTEGER      NOT NULL DEFAULT 0, -- Rows written to the result table.
+    grant_count      INTEGER      NOT NULL DEFAULT 0, -- Rows written to the grant table.
+    ingested_at      TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (kind, year)
+);
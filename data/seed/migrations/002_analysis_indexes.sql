@@ -0,0 +1,10 @@
+-- Composite indexes matching the lookups of `src/db/analysis.py`.
+
+-- Rank below a contest score, enrolled count and minimum contest score per faculty and year.
+-- Includes rank so the rank lookup is answered from the index alone.
+CREATE INDEX IF NOT EXISTS enrollment_faculty_year_score_idx
+    ON enrollment (faculty_id, year, contest_score, rank);
+
+-- Grant amount below a grant score and grant thresholds per subject and year.
+CREATE INDEX IF NOT EXISTS grant_subject_year_score_idx
+    ON grant (subject_name, year, grant_score, grant_amount);
@@ -0,0 +1,60 @@
+-- Summary tables precomputed at ingestion time, refreshed per year by `src/db/api.py`.
+
+-- Contest score range and enrolled count of a faculty on a year.
+CREATE TABLE IF NOT EXISTS faculty_threshold
+(
+    faculty_id        CHAR(11) NOT NULL, -- FK to the faculty table.
+    year              INTEGER  NOT NULL,
+    min_contest_score FLOAT    NOT NULL, -- Contest score of the last enrolled student.
+    max_contest_score FLOAT    NOT NULL, -- Contest score of the first enrolled student.
+    last_rank         INTEGER  NOT NULL, -- Rank of the last enrolled student.
+    enrolled          INTEGER  NOT NULL, -- Number of enrolled students.
+
+    PRIMARY KEY (faculty_id, year),
+    FOREIGN KEY (faculty_id) REFERENCES faculty (id)
+);
+
+-- Score to rank curve of a faculty on a year, the rank reached with each enrolled contest score.
+CREATE TABLE IF NOT EXISTS faculty_rank_curve
+(
+    faculty_id    CHAR(11) NOT NULL, -- FK to the faculty table.
+    year          INTEGER  NOT NULL,
+    contest_score FLOAT    NOT NULL,
+    rank          INTEGER  NOT NULL, -- Highest rank among students enrolled with this contest score.
+
+    PRIMARY KEY (faculty_id, year, contest_score),
+    FOREIGN KEY (faculty_id) REFERENCES faculty (id)
+);
+
+-- Minimum grant scores of each grant amount for a subject on a year.
+CREATE TABLE IF NOT EXISTS grant_threshold
+(
+    subject_name  VARCHAR(255) NOT NULL, -- FK to subject table.
+    year          INTEGER      NOT NULL,
+    min_grant_50  FLOAT,
+    min_grant_70  FLOAT,
+    min_grant_100 FLOAT,
+
+    PRIMARY KEY (subject_name, year),
+    FOREIGN KEY (subject_name) REFERENCES subject (name)
+);
+
+-- Populate from already ingested data.
+INSERT OR REPLACE INTO faculty_threshold (faculty_id, year, min_contest_score, max_contest_score, last_rank, enrolled)
+SELECT faculty_id, year, MIN(contest_score), MAX(contest_score), MAX(rank), COUNT(*)
+FROM enrollment
+GROUP BY faculty_id, year;
+
+INSERT OR REPLACE INTO faculty_rank_curve (faculty_id, year, contest_score, rank)
+SELECT faculty_id, year, contest_score, MAX(rank)
+FROM enrollment
+GROUP BY faculty_id, year, contest_score;
+
+INSERT OR REPLACE INTO grant_threshold (subject_name, year, min_grant_50, min_grant_70, min_grant_100)
+SELECT subject_name,
+       year,
+       MIN(grant_score) FILTER (WHERE grant_amount = 50),
+       MIN(grant_score) FILTER (WHERE grant_amount = 70),
+       MIN(grant_score) FILTER (WHERE grant_amount = 100)
+FROM grant
+GROUP BY subject_name, year;
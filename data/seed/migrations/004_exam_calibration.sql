@@ -0,0 +1,14 @@
+-- Calibration state of `exam` mean and standard deviation, one row per calibrated subject and year.
+-- Written by `src/db/calibration.py`, which re-runs only for years whose enrollment source changed.
+CREATE TABLE IF NOT EXISTS calibration
+(
+    subject_name    VARCHAR(255) NOT NULL, -- FK to subject table.
+    year            INTEGER      NOT NULL,
+    source_hash     CHAR(64),              -- Hash of the ingested enrollment file the fit was made from.
+    observed_values INTEGER      NOT NULL, -- Distinct scaled scores observed.
+    lattice_share   FLOAT        NOT NULL, -- Share of results lying on the fitted raw-score lattice.
+    calibrated_at   TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (subject_name, year),
+    FOREIGN KEY (subject_name) REFERENCES subject (name)
+);
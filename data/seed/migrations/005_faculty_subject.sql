@@ -0,0 +1,19 @@
+-- Contest subjects and coefficients of each faculty and year, inferred from the results of its enrolled students.
+-- Written by `src/db/cross_faculty.py` after ingestion, for years ingested since they were last inferred.
+CREATE TABLE IF NOT EXISTS faculty_subject
+(
+    faculty_id   CHAR(11)     NOT NULL, -- FK to the faculty table.
+    year         INTEGER      NOT NULL,
+    subject_name VARCHAR(255) NOT NULL, -- FK to subject table.
+    weight       FLOAT        NOT NULL, -- Coefficient of the subject's scaled score in the contest score.
+    fit_share    FLOAT        NOT NULL, -- Share of the year's enrolled students whose contest score the weights reproduce.
+    inferred_at  TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (faculty_id, year, subject_name),
+    FOREIGN KEY (faculty_id) REFERENCES faculty (id),
+    FOREIGN KEY (subject_name) REFERENCES subject (name)
+);
+
+-- Latest inference, part of the state the cross-faculty cutoff matrix is cached for.
+CREATE INDEX IF NOT EXISTS faculty_subject_inferred_at_idx
+    ON faculty_subject (inferred_at);
@@ -0,0 +1,168 @@
+-- Compact storage layout, the bulk tables are rebuilt in place:
+--  * Student IDs are INTEGER. The parsers produce integers, which CHAR affinity stored as text.
+--    Faculty and university IDs stay text, their leading zeros are significant (e.g. 00101015).
+--  * `result` and `grant` reference subjects by the small integer ID of the `subject` dictionary
+--    instead of repeating its name.
+--  * Tables searched by a composite key are WITHOUT ROWID, clustered on that key: the primary key
+--    is the table itself instead of a rowid table plus a separate primary key index. Enrollments
+--    are clustered by (faculty_id, year, contest_score) and grants by (subject_id, year, grant_score)
+--    like the lookups of `src/db/analysis.py`, which makes indexes 002 redundant.
+-- `setup.migrate` runs it in one transaction with the version bump, and vacuums the replaced pages afterwards.
+
+-- Subject dictionary. IDs follow the seed order; subjects written that are not in it, e.g. unknown
+-- subject headers kept as is by the parser, are added by the writers of `src/db/api.py`.
+CREATE TABLE subject_dictionary
+(
+    id   INTEGER PRIMARY KEY,          -- Small integer key referenced by `result` and `grant`.
+    name VARCHAR(255) NOT NULL UNIQUE  -- The name of the subject.
+);
+
+INSERT INTO subject_dictionary (name)
+SELECT name FROM subject ORDER BY rowid;
+
+INSERT OR IGNORE INTO subject_dictionary (name)
+SELECT DISTINCT subject_name FROM result ORDER BY subject_name;
+
+INSERT OR IGNORE INTO subject_dictionary (name)
+SELECT DISTINCT subject_name FROM grant ORDER BY subject_name;
+
+-- Record for student enrollment in a specific faculty on a specific year with written subject scores.
+CREATE TABLE enrollment_clustered
+(
+    student_id    INTEGER  NOT NULL, -- Each student can only enroll once. Same person on different years will have different student IDs.
+    faculty_id    CHAR(11) NOT NULL, -- FK to the faculty table.
+    contest_score FLOAT    NOT NULL,
+    rank          INTEGER  NOT NULL,
+    year          INTEGER  NOT NULL,
+
+    -- Rank breaks contest score ties in the order the rank lookups expect, student ID keeps the key unique
+    PRIMARY KEY (faculty_id, year, contest_score, rank, student_id),
+    FOREIGN KEY (faculty_id) REFERENCES faculty (id)
+) WITHOUT ROWID;
+
+INSERT INTO enrollment_clustered (student_id, faculty_id, contest_score, rank, year)
+SELECT CAST(student_id AS INTEGER), faculty_id, contest_score, rank, year
+FROM enrollment
+ORDER BY faculty_id, year, contest_score, rank, CAST(student_id AS INTEGER);
+
+-- Record for enrollment results for specific subjects, clustered by student for the join with `enrollment`.
+CREATE TABLE result_clustered
+(
+    enrollment_id INTEGER NOT NULL, -- FK to enrollment table.
+    subject_id    INTEGER NOT NULL, -- FK to subject table.
+    scaled_score  FLOAT   NOT NULL, -- Scaled score of the student.
+    raw_score     FLOAT,            -- Raw score of the student (before scaling).
+
+    PRIMARY KEY (enrollment_id, subject_id),
+    FOREIGN KEY (enrollment_id) REFERENCES enrollment (student_id),
+    FOREIGN KEY (subject_id) REFERENCES subject (id)
+) WITHOUT ROWID;
+
+INSERT INTO result_clustered (enrollment_id, subject_id, scaled_score, raw_score)
+SELECT CAST(result.enrollment_id AS INTEGER), subject_dictionary.id, result.scaled_score, result.raw_score
+FROM result
+JOIN subject_dictionary ON subject_dictionary.name = result.subject_name
+ORDER BY 1, 2;
+
+-- Record for acquired grants.
+CREATE TABLE grant_clustered
+(
+    student_id   INTEGER NOT NULL, -- FK to enrollment table.
+    grant_score  FLOAT   NOT NULL, -- Cumulative score of the student.
+    grant_amount INTEGER NOT NULL, -- 50%, 75%, or 100%.
+    subject_id   INTEGER NOT NULL, -- FK to subject table.
+    year         INTEGER NOT NULL,
+
+    -- Grant amount breaks grant score ties in the order the grant lookups expect
+    PRIMARY KEY (subject_id, year, grant_score, grant_amount, student_id),
+    FOREIGN KEY (student_id) REFERENCES enrollment (student_id),
+    FOREIGN KEY (subject_id) REFERENCES subject (id)
+) WITHOUT ROWID;
+
+INSERT INTO grant_clustered (student_id, grant_score, grant_amount, subject_id, year)
+SELECT CAST(grant.student_id AS INTEGER), grant.grant_score, grant.grant_amount, subject_dictionary.id, grant.year
+FROM grant
+JOIN subject_dictionary ON subject_dictionary.name = grant.subject_name
+ORDER BY 4, 5, 2, 3, 1;
+
+-- Threshold and inference tables of migrations 003 and 005, same columns without the rowid.
+CREATE TABLE faculty_threshold_clustered
+(
+    faculty_id        CHAR(11) NOT NULL, -- FK to the faculty table.
+    year              INTEGER  NOT NULL,
+    min_contest_score FLOAT    NOT NULL, -- Contest score of the last enrolled student.
+    max_contest_score FLOAT    NOT NULL, -- Contest score of the first enrolled student.
+    last_rank         INTEGER  NOT NULL, -- Rank of the last enrolled student.
+    enrolled          INTEGER  NOT NULL, -- Number of enrolled students.
+
+    PRIMARY KEY (faculty_id, year),
+    FOREIGN KEY (faculty_id) REFERENCES faculty (id)
+) WITHOUT ROWID;
+
+INSERT INTO faculty_threshold_clustered
+SELECT faculty_id, year, min_contest_score, max_contest_score, last_rank, enrolled
+FROM faculty_threshold
+ORDER BY faculty_id, year;
+
+CREATE TABLE faculty_rank_curve_clustered
+(
+    faculty_id    CHAR(11) NOT NULL, -- FK to the faculty table.
+    year          INTEGER  NOT NULL,
+    contest_score FLOAT    NOT NULL,
+    rank          INTEGER  NOT NULL, -- Highest rank among students enrolled with this contest score.
+
+    PRIMARY KEY (faculty_id, year, contest_score),
+    FOREIGN KEY (faculty_id) REFERENCES faculty (id)
+) WITHOUT ROWID;
+
+INSERT INTO faculty_rank_curve_clustered
+SELECT faculty_id, year, contest_score, rank
+FROM faculty_rank_curve
+ORDER BY faculty_id, year, contest_score;
+
+CREATE TABLE faculty_subject_clustered
+(
+    faculty_id   CHAR(11)     NOT NULL, -- FK to the faculty table.
+    year         INTEGER      NOT NULL,
+    subject_name VARCHAR(255) NOT NULL, -- FK to subject table.
+    weight       FLOAT        NOT NULL, -- Coefficient of the subject's scaled score in the contest score.
+    fit_share    FLOAT        NOT NULL, -- Share of the year's enrolled students whose contest score the weights reproduce.
+    inferred_at  TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (faculty_id, year, subject_name),
+    FOREIGN KEY (faculty_id) REFERENCES faculty (id),
+    FOREIGN KEY (subject_name) REFERENCES subject (name)
+) WITHOUT ROWID;
+
+INSERT INTO faculty_subject_clustered
+SELECT faculty_id, year, subject_name, weight, fit_share, inferred_at
+FROM faculty_subject
+ORDER BY faculty_id, year, subject_name;
+
+-- Replace the tables, their indexes are dropped with them
+DROP TABLE result;
+DROP TABLE grant;
+DROP TABLE enrollment;
+DROP TABLE subject;
+DROP TABLE faculty_threshold;
+DROP TABLE faculty_rank_curve;
+DROP TABLE faculty_subject;
+
+ALTER TABLE subject_dictionary RENAME TO subject;
+ALTER TABLE enrollment_clustered RENAME TO enrollment;
+ALTER TABLE result_clustered RENAME TO result;
+ALTER TABLE grant_clustered RENAME TO grant;
+ALTER TABLE faculty_threshold_clustered RENAME TO faculty_threshold;
+ALTER TABLE faculty_rank_curve_clustered RENAME TO faculty_rank_curve;
+ALTER TABLE faculty_subject_clustered RENAME TO faculty_subject;
+
+-- Student IDs stay unique, and are looked up by the joins with `result`
+CREATE UNIQUE INDEX enrollment_student_idx
+    ON enrollment (student_id);
+
+CREATE UNIQUE INDEX grant_student_idx
+    ON grant (student_id);
+
+-- Latest inference, part of the state the cross-faculty cutoff matrix is cached for.
+CREATE INDEX faculty_subject_inferred_at_idx
+    ON faculty_subject (inferred_at);
@@ -0,0 +1,11 @@
+-- Version of the data the analysis lookups read, bumped by `src/db/api.py` in the same transaction
+-- as every ingested year and exam calibration. Results cached by `src/db/result_cache.py` are
+-- tagged with it, so a change of the data invalidates them.
+CREATE TABLE IF NOT EXISTS data_version
+(
+    id      INTEGER PRIMARY KEY CHECK (id = 0), -- Single row.
+    version INTEGER NOT NULL                    -- Incremented on every change of the data.
+);
+
+INSERT OR IGNORE INTO data_version (id, version)
+VALUES (0, 1);
@@ -0,0 +1,4 @@
+from src import cli
+
+if __name__ == "__main__":
+    cli.main()
@@ -0,0 +1,138 @@
+"""
+Benchmark of the result cache of `db.analysis` on a replayed, skewed request log.
+
+The log mixes historical data, faculty threshold and grant threshold lookups like the
+service load test. Requests are drawn from a fixed set of distinct ones with Zipf
+popularity, so a few popular faculties and point combinations make up most of the traffic.
+The log is replayed without the cache, then with caches of several sizes, reporting hit
+rate, evictions and latency; cached results are checked against the uncached ones. Last,
+the data version is bumped halfway through a replay, as ingestion does, to show the
+invalidation. The replays run on a copy of the database, it is not modified.
+
+Usage: python -m src.benchmarks.cache_benchmark [log_length]
+"""
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from src import config
+from src.benchmarks.engine_benchmark import sample_requests
+from src.db import analysis, api
+
+# Share of requests per lookup
+LOOKUP_SHARES = (("historical", 0.7), ("faculty-thresholds", 0.2), ("grant-thresholds", 0.1))
+# Distinct (faculty_id, student_points, weights) requests, and the Zipf exponent of their popularity
+DISTINCT_REQUESTS = 5000
+ZIPF_SKEW = 1.1
+# Cache sizes replayed, the last one is used for the invalidation replay
+CACHE_SIZES = (64, 256, 1024, config.RESULT_CACHE_SIZE)
+
+
+def build_request_log(length, distinct=DISTINCT_REQUESTS, skew=ZIPF_SKEW, seed=0):
+    """
+    Skewed log of (lookup, request) entries, request i of the distinct ones drawn with weight 1 / (i + 1) ** skew.
+    """
+    requests = sample_requests(distinct, seed)
+    rng = random.Random(seed)
+    lookups, shares = zip(*LOOKUP_SHARES)
+
+    return list(zip(
+        rng.choices(lookups, shares, k=length),
+        rng.choices(requests, [1 / (i + 1) ** skew for i in range(distinct)], k=length),
+    ))
+
+
+def lookup(name, request):
+    faculty_id, student_points, weights = request
+    if name == "historical":
+        return analysis.check_historical_data(faculty_id, student_points, weights)
+    if name == "faculty-thresholds":
+        return analysis.get_enrollment_thresholds(faculty_id)
+    return analysis.get_grant_thresholds()
+
+
+def replay(log, on_entry=None):
+    """
+    Run the lookups of a log in order.
+
+    :param on_entry: Called with the index of each entry before it runs.
+    :return: Tuple of (results, per-call latencies in microseconds).
+    """
+    results = []
+    latencies = []
+    for i, (name, request) in enumerate(log):
+        if on_entry is not None:
+            on_entry(i)
+        start = time.perf_counter()
+        results.append(lookup(name, request))
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+    return results, latencies
+
+
+def report(name, latencies, stats=None):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    line = f"{name:<14} {statistics.mean(latencies):7.0f}us {p50:7.0f}us {p99:7.0f}us"
+    if stats is not None:
+        line += f" {stats['hit_rate']:8.1%} {stats['evictions']:9d} {stats['invalidations']:13d}"
+    print(line)
+
+
+def bump_data_version():
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    api.bump_data_version(connection.cursor())
+    connection.commit()
+    connection.close()
+
+
+def main(length=10000):
+    log = build_request_log(length)
+    distinct = len({(name, repr(request)) for name, request in log})
+    print(f"{length} requests, {distinct} distinct, Zipf skew {ZIPF_SKEW}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Replays bump the data version of a copy, the backup API includes pages of a WAL
+        source = sqlite3.connect(config.DATABASE_PATH)
+        database_path = os.path.join(directory, "naec.db")
+        copy = sqlite3.connect(database_path)
+        source.backup(copy)
+        copy.close()
+        source.close()
+        config.DATABASE_PATH = database_path
+
+        print(f"{'cache size':<14} {'mean':>9} {'p50':>9} {'p99':>9} {'hit rate':>8} {'evictions':>9} "
+              f"{'invalidations':>13}")
+        analysis.result_cache.resize(0)
+        expected, latencies = replay(log)
+        report("none", latencies)
+        uncached_mean = statistics.mean(latencies)
+
+        for size in CACHE_SIZES:
+            analysis.result_cache.clear()
+            analysis.result_cache.resize(size)
+            results, latencies = replay(log)
+            assert results == expected, f"cache of {size} results answered differently than the queries"
+            report(str(size), latencies, analysis.cache_stats())
+        print(f"{'':<14} {uncached_mean / statistics.mean(latencies):.1f}x faster than without cache "
+              f"at {CACHE_SIZES[-1]} results")
+
+        # Ingestion halfway through: results cached before are dropped, the second half refills the cache
+        analysis.result_cache.clear()
+
+        def ingest_halfway(i):
+            if i == length // 2:
+                bump_data_version()
+
+        results, latencies = replay(log, ingest_halfway)
+        assert results == expected
+        report("bump halfway", latencies, analysis.cache_stats())
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
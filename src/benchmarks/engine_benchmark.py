@@ -0,0 +1,85 @@
+"""
+Latency benchmark of analysis lookups: per-call connections of `db.analysis` against
+the pooled `AnalysisEngine`, reading the database file and an in-memory copy.
+
+Usage: python -m src.benchmarks.engine_benchmark [calls]
+"""
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+from src import config
+from src.db import analysis
+from src.db.engine import AnalysisEngine
+
+
+def sample_requests(calls, seed=0):
+    """
+    Random (faculty_id, student_points, weights) requests over faculties of the database.
+    """
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    faculty_ids = [faculty_id for (faculty_id,) in connection.execute("SELECT id FROM faculty;")]
+    connection.close()
+
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(calls):
+        student_points = {
+            "MATHEMATICS": rng.randint(11, 51),
+            "FOREIGN LANGUAGE": rng.randint(14, 70),
+            "GEORGIAN LANGUAGE": rng.randint(15, 60),
+        }
+        weights = {subject: rng.randint(1, 6) for subject in student_points}
+        requests.append((rng.choice(faculty_ids), student_points, weights))
+
+    return requests
+
+
+def measure(lookup, requests):
+    """
+    Return per-call latencies in microseconds.
+    """
+    latencies = []
+    for faculty_id, student_points, weights in requests:
+        start = time.perf_counter()
+        lookup(faculty_id, student_points, weights)
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{name:<28} mean {statistics.mean(latencies):8.0f}us  p50 {p50:8.0f}us  p99 {p99:8.0f}us")
+
+
+def main(calls=1000):
+    requests = sample_requests(calls)
+    # Compare the connection handling, `cache_benchmark` measures the result cache of `db.analysis`
+    analysis.result_cache.resize(0)
+
+    def per_call(faculty_id, student_points, weights):
+        analysis.check_historical_data(faculty_id, student_points, weights)
+        analysis.get_enrollment_thresholds(faculty_id)
+
+    report("per-call connections", measure(per_call, requests))
+
+    for name, in_memory in (("engine, read-only file", False), ("engine, in-memory copy", True)):
+        start = time.perf_counter()
+        with AnalysisEngine(in_memory=in_memory) as engine:
+            startup = time.perf_counter() - start
+
+            def pooled(faculty_id, student_points, weights):
+                engine.check_historical_data(faculty_id, student_points, weights)
+                engine.get_enrollment_thresholds(faculty_id)
+
+            report(name, measure(pooled, requests))
+        print(f"{'':<28} startup {startup * 1e3:.0f}ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,147 @@
+"""
+Import time regression check of the query commands of `src.cli`.
+
+Runs each query command with `python -X importtime` against an empty database built from
+the schema seed and migrations, and fails if it imports one of `HEAVY_MODULES` or if its
+imports take longer than `IMPORT_BUDGET_MS` on top of those of the bare interpreter.
+Commands allowed to load them are reported for comparison only. `tests/test_import_time.py`
+runs the same check.
+
+Usage: python -m src.benchmarks.import_time [runs]
+"""
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from src import config
+from src.db import setup
+
+# Modules only ingestion and the numeric analyses may import
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow", "pdfplumber")
+
+# Import time of a query command on top of the bare interpreter, in milliseconds
+IMPORT_BUDGET_MS = 100
+
+# Command lines of `src.cli` checked against the budget
+QUERY_COMMANDS = {
+    "check": [
+        "check", "19701034", "MATHEMATICS=46", "FOREIGN LANGUAGE=69", "GEORGIAN LANGUAGE=56",
+        "--weights", "MATHEMATICS=6", "FOREIGN LANGUAGE=3", "GEORGIAN LANGUAGE=3",
+    ],
+    "thresholds": ["thresholds", "19701034"],
+}
+
+# Command lines reported for comparison, they load the heavy modules by design
+REFERENCE_COMMANDS = {
+    "ingest --help": ["ingest", "--help"],
+}
+
+
+def parse_import_times(output):
+    """
+    Parse `-X importtime` output.
+
+    :return: Tuple of (total microseconds of the top level imports, set of imported module names).
+    """
+    total = 0
+    modules = set()
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        # Nested imports are indented below the module importing them, their time is part of its cumulative time
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+
+    return total, modules
+
+
+def measure(arguments, env, runs):
+    """
+    Run a Python command line `runs` times.
+
+    :return: Tuple of (median import milliseconds, median wall-clock milliseconds, imported modules).
+    """
+    import_times = []
+    wall_times = []
+    modules = set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime"] + arguments,
+            cwd=config.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        wall_times.append((time.perf_counter() - start) * 1e3)
+        if process.returncode != 0:
+            raise RuntimeError(f"{' '.join(arguments)} exited with {process.returncode}:\n{process.stderr[-2000:]}")
+
+        total, run_modules = parse_import_times(process.stderr)
+        import_times.append(total / 1e3)
+        modules |= run_modules
+
+    return statistics.median(import_times), statistics.median(wall_times), modules
+
+
+def check_commands(runs=5):
+    """
+    Measure the query and reference commands against the bare interpreter.
+
+    :return: Tuple of (rows, failures): rows of (command, import milliseconds, wall-clock
+        milliseconds, heavy modules), the interpreter first with its own import time and the
+        commands with theirs on top of it; failure messages of the query commands.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "naec.db")
+        connection = sqlite3.connect(database_path)
+        with open(os.path.join(config.SEED_DIR, "schema.sql"), 'r', encoding='utf-8') as file:
+            connection.executescript(file.read())
+        setup.migrate(connection)
+        connection.close()
+
+        env = dict(os.environ, NAEC_DATABASE_PATH=database_path)
+        base_imports, base_wall, _ = measure(["-c", "pass"], env, runs)
+        rows = [("(interpreter)", base_imports, base_wall, [])]
+
+        failures = []
+        for commands, checked in ((QUERY_COMMANDS, True), (REFERENCE_COMMANDS, False)):
+            for name, arguments in commands.items():
+                import_ms, wall_ms, modules = measure(["-m", "src"] + arguments, env, runs)
+                heavy = [module for module in HEAVY_MODULES if module in modules]
+                cost = import_ms - base_imports
+                rows.append((name, cost, wall_ms, heavy))
+
+                if checked and heavy:
+                    failures.append(f"{name} imports {', '.join(heavy)}")
+                if checked and cost > IMPORT_BUDGET_MS:
+                    failures.append(f"{name} imports take {cost:.0f}ms, over the {IMPORT_BUDGET_MS}ms budget")
+
+    return rows, failures
+
+
+def main(runs=5):
+    rows, failures = check_commands(runs)
+
+    print(f"{'command':<16} {'imports':>9} {'wall':>9}  heavy modules")
+    (name, import_ms, wall_ms, _), *rows = rows
+    print(f"{name:<16} {import_ms:7.1f}ms {wall_ms:7.1f}ms")
+    for name, cost, wall_ms, heavy in rows:
+        print(f"{name:<16} {cost:+7.1f}ms {wall_ms:7.1f}ms  {', '.join(heavy) or '-'}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+
+    if failures:
+        return 1
+
+    print(f"OK: {len(QUERY_COMMANDS)} query commands import no heavy modules, within {IMPORT_BUDGET_MS}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
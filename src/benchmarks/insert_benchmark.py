@@ -0,0 +1,170 @@
+"""
+Benchmark enrollment insertion of a full year: the per-row `cursor.execute` writer
+the project started with against the bulk `executemany` writer of `db.api`.
+
+Both spend most of their time inserting into the SQLite B-trees, so the benchmark also
+times the floor of any writer: the same `executemany` calls on rows flattened beforehand.
+
+Usage: python -m src.benchmarks.insert_benchmark [year]
+"""
+import copy
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from src import config, constants
+from src.db import api, setup
+from src.enrollments import enrollment_parser
+
+
+def create_database(database_path):
+    """
+    Create an empty database with the project schema and migrations.
+    """
+    connection = sqlite3.connect(database_path)
+    with open(os.path.join(config.SEED_DIR, "schema.sql"), 'r', encoding='utf-8') as file:
+        connection.executescript(file.read())
+    setup.migrate(connection)
+    return connection
+
+
+def legacy_insert_enrollment_records(connection, records):
+    """
+    Reference writer issuing one statement per university, faculty, enrollment and subject score.
+    """
+    cursor = connection.cursor()
+    for batch in records:
+        faculty_id = batch.faculty_id
+        subjects = list(batch.subjects)
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO university (id, name)
+                VALUES (?, ?);""", (batch.university_id, batch.university_name)
+        )
+        cursor.execute("""
+            INSERT OR IGNORE INTO faculty (id, name, university_id)
+                VALUES (?, ?, ?);""", (faculty_id, batch.faculty_name, batch.university_id)
+        )
+
+        mapping_subjects = constants.SUBJECTS_KA_TO_EN_MAPPING.keys()
+        for i in range(len(subjects)):
+            for key in mapping_subjects:
+                if key.split()[0] == subjects[i]:
+                    subjects[i] = constants.SUBJECTS_KA_TO_EN_MAPPING[key]
+                    break
+
+        subject_ids = api.get_subject_ids(cursor, subjects)
+        for student_id, contest_score, rank, subject_scores in zip(
+                batch.student_ids.tolist(), batch.contest_scores.tolist(), batch.ranks.tolist(),
+                batch.subject_scores.tolist()):
+            cursor.execute("""
+                INSERT INTO enrollment (student_id, faculty_id, contest_score, rank, year)
+                    VALUES (?, ?, ?, ?, ?);""",
+                (student_id, faculty_id, contest_score, rank, batch.year)
+            )
+
+            for subject, score in zip(subjects, subject_scores):
+                cursor.execute("""
+                    INSERT INTO result (enrollment_id, subject_id, scaled_score)
+                        VALUES (?, ?, ?);""", (student_id, subject_ids[subject], score)
+                )
+
+    connection.commit()
+
+
+def bulk_insert_enrollment_records(connection, records):
+    """
+    Bulk writer of `db.api`, batched `executemany` under load-time settings.
+    """
+    with api.bulk_load_settings(connection):
+        cursor = connection.cursor()
+        for batch in api.iter_batches(records, config.INSERT_BATCH_SIZE):
+            api.insert_enrollment_batch(cursor, batch)
+        connection.commit()
+
+
+def flatten_rows(connection, records):
+    """
+    Enrollment and result rows of the records, as `api.insert_enrollment_batch` writes them.
+    """
+    subject_ids = api.get_subject_ids(connection.cursor(), {name for batch in records for name in batch.subject_names})
+    enrollment_rows = []
+    result_rows = []
+    for batch in records:
+        enrollment_rows.extend(zip(
+            batch.student_ids.tolist(), itertools.repeat(batch.faculty_id), batch.contest_scores.tolist(),
+            batch.ranks.tolist(), itertools.repeat(batch.year),
+        ))
+        for subject_name, student_ids, scaled_scores in batch.iter_result_columns():
+            result_rows.extend(zip(
+                student_ids.tolist(), itertools.repeat(subject_ids[subject_name]), scaled_scores.tolist()
+            ))
+
+    return enrollment_rows, result_rows
+
+
+def insert_flattened_rows(connection, rows):
+    """
+    SQLite floor: insert rows flattened beforehand, with one `executemany` per table.
+    """
+    enrollment_rows, result_rows = rows
+    with api.bulk_load_settings(connection):
+        cursor = connection.cursor()
+        cursor.executemany("""
+            INSERT INTO enrollment (student_id, faculty_id, contest_score, rank, year)
+                VALUES (?, ?, ?, ?, ?);""", enrollment_rows
+        )
+        cursor.executemany("""
+            INSERT INTO result (enrollment_id, subject_id, scaled_score)
+                VALUES (?, ?, ?);""", result_rows
+        )
+        connection.commit()
+
+
+def time_writer(writer, records, repeat, prepare=copy.deepcopy):
+    """
+    Return the best wall-clock time of `repeat` runs of a writer, each on a fresh database.
+
+    :param prepare: Called with the records before the writer is timed, its result is written.
+    """
+    timings = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            connection = create_database(os.path.join(directory, "naec.db"))
+            run_records = prepare(records)
+
+            start = time.perf_counter()
+            writer(connection, run_records)
+            timings.append(time.perf_counter() - start)
+
+            connection.close()
+
+    return min(timings)
+
+
+def main(year=None, repeat=3):
+    if year is None:
+        year = max(int(pdf_filename.split(".")[0]) for pdf_filename in os.listdir(config.ENROLLMENT_DATA_DIR))
+
+    print(f"Parsing {year} enrollments...")
+    records = list(enrollment_parser.iter_enrollment_records(f"{year}.pdf"))
+    rows = sum(len(batch) for batch in records)
+    print(f"{len(records)} faculty groups, {rows} enrollments")
+
+    legacy = time_writer(legacy_insert_enrollment_records, records, repeat)
+    bulk = time_writer(bulk_insert_enrollment_records, records, repeat)
+    # Subject IDs of a fresh database, the same in every run
+    flattened_rows = flatten_rows(create_database(":memory:"), records)
+    floor = time_writer(insert_flattened_rows, records, repeat, prepare=lambda _: flattened_rows)
+
+    print(f"legacy per-row writer: {legacy:.3f}s ({rows / legacy:,.0f} enrollments/s)")
+    print(f"bulk writer:           {bulk:.3f}s ({rows / bulk:,.0f} enrollments/s)")
+    print(f"SQLite floor:          {floor:.3f}s ({rows / floor:,.0f} enrollments/s)")
+    print(f"speedup:               {legacy / bulk:.1f}x, at most {legacy / floor:.1f}x for any writer")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
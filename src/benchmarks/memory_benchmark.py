@@ -0,0 +1,88 @@
+"""
+Memory benchmark of parsed enrollments of a full year: the per-student dictionaries the
+parser used to produce against the struct-of-arrays `EnrollmentBatch`.
+
+Chunks are extracted first (from the page cache when possible), then parsed into each
+representation and kept, the memory they retain is measured with tracemalloc. Parse time
+is measured separately without tracing, and the pickled size is what a batch costs on the
+ingestion queue of `src.ingestion`.
+
+Usage: python -m src.benchmarks.memory_benchmark [year]
+"""
+import gc
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+from src import config
+from src.enrollments import enrollment_parser, extractors, segmentation
+
+
+def parse_dictionaries(chunk, year):
+    """
+    Parse a chunk into the former record format: one dictionary and one list of floats per student.
+    """
+    university_id, university_name = extractors.extract_university_name_and_id(chunk)
+    faculty_id, faculty_name = extractors.extract_faculty_name_and_id(chunk)
+    return {
+        "year": year,
+        "university_id": university_id,
+        "university_name": university_name,
+        "faculty_id": faculty_id,
+        "faculty_name": faculty_name,
+        "subjects": extractors.extract_taken_subjects(chunk),
+        "enrollments": extractors.extract_enrollment_records(chunk),
+    }
+
+
+def measure(parse, chunks, year):
+    """
+    Parse all chunks and keep the records.
+
+    :return: Tuple of (records, retained bytes, parse seconds).
+    """
+    start = time.perf_counter()
+    [parse(chunk, year) for chunk in chunks]
+    seconds = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [parse(chunk, year) for chunk in chunks]
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return records, retained, seconds
+
+
+def main(year=None):
+    if year is None:
+        year = max(int(pdf_filename.split(".")[0]) for pdf_filename in os.listdir(config.ENROLLMENT_DATA_DIR))
+
+    chunks = list(segmentation.iter_chunks(segmentation.iter_pdf_pages(f"{year}.pdf")))
+    dictionaries, dictionary_bytes, dictionary_seconds = measure(parse_dictionaries, chunks, year)
+    batches, batch_bytes, batch_seconds = measure(enrollment_parser.parse_chunk, chunks, year)
+
+    rows = sum(len(batch) for batch in batches)
+    assert rows == sum(len(record["enrollments"]) for record in dictionaries)
+    column_bytes = sum(batch.nbytes for batch in batches)
+
+    print(f"{year}: {len(chunks)} faculties, {rows} enrollments")
+    print(f"{'representation':<16} {'retained':>10} {'bytes/row':>10} {'pickled':>10} {'parse':>9}")
+    for name, records, retained, seconds in (
+            ("dictionaries", dictionaries, dictionary_bytes, dictionary_seconds),
+            ("batches", batches, batch_bytes, batch_seconds),
+    ):
+        pickled = len(pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL))
+        print(f"{name:<16} {retained / 2 ** 20:8.1f}MB {retained / rows:10.0f} {pickled / 2 ** 20:8.1f}MB "
+              f"{seconds * 1e3:7.0f}ms")
+
+    print(f"row columns alone: {column_bytes / rows:.0f} bytes/row, "
+          f"batches retain {dictionary_bytes / batch_bytes:.1f}x less than dictionaries")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,146 @@
+"""
+Load test of the analysis HTTP service: concurrent clients with keep-alive connections
+send a mix of historical data, grant threshold and faculty threshold lookups for a fixed
+duration, then p50/p99 latency and requests/s are reported per endpoint.
+
+A share of the historical data requests is drawn from a small set of popular requests,
+so identical requests arrive concurrently. Without `--url`, the service is started in
+this process on a free port; clients then share the interpreter with the server, run
+`python -m src.service` separately and pass its URL to measure it alone.
+
+Usage: python -m src.benchmarks.service_load_test [--url URL] [--clients 16] [--duration 10] [--workers 4]
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from src import service
+from src.benchmarks.engine_benchmark import sample_requests
+
+# Share of requests per endpoint
+ENDPOINT_SHARES = (("historical", 0.7), ("grant-thresholds", 0.1), ("faculty-thresholds", 0.2))
+# Share of historical data requests drawn from the popular ones, and their number
+POPULAR_SHARE = 0.3
+POPULAR_REQUESTS = 20
+
+
+def build_request(rng, endpoint, requests, popular):
+    """
+    Return (name, method, path, body) of a random request to an endpoint.
+    """
+    if endpoint == "grant-thresholds":
+        return endpoint, "GET", "/grant-thresholds", None
+
+    faculty_id, student_points, weights = rng.choice(popular if rng.random() < POPULAR_SHARE else requests)
+    if endpoint == "faculty-thresholds":
+        return endpoint, "GET", f"/faculties/{faculty_id}/thresholds", None
+
+    body = json.dumps({"faculty_id": faculty_id, "student_points": student_points, "weights": weights})
+    return endpoint, "POST", "/historical", body.encode("utf-8")
+
+
+def run_client(host, port, deadline, requests, popular, seed, latencies, errors):
+    """
+    Send requests over one keep-alive connection until the deadline.
+    """
+    rng = random.Random(seed)
+    endpoints, shares = zip(*ENDPOINT_SHARES)
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+
+    try:
+        while time.perf_counter() < deadline:
+            name, method, path, body = build_request(rng, rng.choices(endpoints, shares)[0], requests, popular)
+            headers = {"Content-Type": "application/json"} if body else {}
+
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                errors[name] = errors.get(name, 0) + 1
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+
+            if response.status != 200:
+                errors[name] = errors.get(name, 0) + 1
+            latencies.setdefault(name, []).append(time.perf_counter() - start)
+    finally:
+        connection.close()
+
+
+def percentile(sorted_values, share):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * share))]
+
+
+def report(latencies, errors, seconds):
+    print(f"{'endpoint':<20} {'requests':>9} {'req/s':>9} {'p50':>9} {'p99':>9} {'errors':>7}")
+    everything = sorted(latency for values in latencies.values() for latency in values)
+    for name, values in sorted(latencies.items()) + [("total", everything)]:
+        values = sorted(values)
+        failed = sum(errors.values()) if name == "total" else errors.get(name, 0)
+        print(f"{name:<20} {len(values):9d} {len(values) / seconds:9.0f} "
+              f"{percentile(values, 0.5) * 1e3:7.2f}ms {percentile(values, 0.99) * 1e3:7.2f}ms {failed:7d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the analysis HTTP service.")
+    parser.add_argument("--url", help="URL of a running service, defaults to starting one in this process")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--workers", type=int, help="reader threads of the in-process service")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        server = service.create_server(port=0, workers=args.workers)
+        host, port = server.server_address[:2]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    requests = sample_requests(1000, args.seed)
+    popular = requests[:POPULAR_REQUESTS]
+
+    latencies = [{} for _ in range(args.clients)]
+    errors = [{} for _ in range(args.clients)]
+    deadline = time.perf_counter() + args.duration
+    start = time.perf_counter()
+    clients = [
+        threading.Thread(target=run_client, args=(host, port, deadline, requests, popular,
+                                                  args.seed + i, latencies[i], errors[i]))
+        for i in range(args.clients)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    seconds = time.perf_counter() - start
+
+    merged_latencies = {}
+    merged_errors = {}
+    for client_latencies, client_errors in zip(latencies, errors):
+        for name, values in client_latencies.items():
+            merged_latencies.setdefault(name, []).extend(values)
+        for name, count in client_errors.items():
+            merged_errors[name] = merged_errors.get(name, 0) + count
+
+    print(f"{args.clients} clients for {seconds:.1f}s against http://{host}:{port}")
+    report(merged_latencies, merged_errors, seconds)
+
+    if server is not None:
+        print(f"{server.executor.coalesced} requests answered by an identical request in flight")
+        server.shutdown()
+        server.server_close()
+        server.executor.close()
+
+
+if __name__ == "__main__":
+    main()
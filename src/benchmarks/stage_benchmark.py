@@ -0,0 +1,260 @@
+"""
+Benchmark of every pipeline stage on its own, on synthetic data at several scales.
+
+Stages: PDF extraction (real PDF pages), segmentation, extraction, database insert,
+calibration (the SQL script and the NumPy calibration) and each query of `db.analysis`.
+Each scale is loaded into a fresh temporary database. Results are written as JSON, and
+can be compared with the results of another commit.
+
+Usage: python -m src.benchmarks.stage_benchmark [--scales 1 10 100] [--output PATH] [--compare PATH]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from src import config, pdf_extraction
+from src.benchmarks import synthetic
+from src.benchmarks.insert_benchmark import create_database
+from src.db import analysis, api, calibration
+from src.enrollments import enrollment_parser, segmentation
+from src.grants import tokenizer as grant_tokenizer
+
+SYNTHETIC_YEAR = 2024
+PDF_BENCHMARK_PAGES = 20
+ANALYSIS_CALLS = 200
+
+
+@contextmanager
+def use_database(database_path):
+    """
+    Point modules reading `config.DATABASE_PATH` to another database for the duration.
+    """
+    previous = config.DATABASE_PATH
+    config.DATABASE_PATH = database_path
+    try:
+        yield database_path
+    finally:
+        config.DATABASE_PATH = previous
+
+
+@contextmanager
+def timed(results, stage, items=None, unit=None):
+    """
+    Time the block and record it in `results` under the stage name.
+    """
+    start = time.perf_counter()
+    result = {}
+    yield result
+    result["seconds"] = time.perf_counter() - start
+    if items is not None:
+        result.setdefault("items", items)
+    if unit is not None:
+        result["unit"] = unit
+    results[stage] = result
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=config.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_pdf_extraction(results):
+    """
+    Extract the first pages of the latest real enrollment PDF without the page cache, on one process.
+    """
+    pdfs = sorted(os.listdir(config.ENROLLMENT_DATA_DIR)) if os.path.isdir(config.ENROLLMENT_DATA_DIR) else []
+    if not pdfs:
+        print("No enrollment PDF found, PDF extraction skipped.")
+        return
+
+    pdf_path = os.path.join(config.ENROLLMENT_DATA_DIR, pdfs[-1])
+    page_numbers = list(range(min(PDF_BENCHMARK_PAGES, pdf_extraction.count_pages(pdf_path))))
+    with timed(results, "pdf_extraction", len(page_numbers), "pages"):
+        pdf_extraction.extract_page_numbers(pdf_path, page_numbers)
+
+
+def benchmark_analysis(results, faculty_ids, calls=ANALYSIS_CALLS, seed=0):
+    """
+    Time each `db.analysis` query, one call per random request.
+    """
+    # Time the queries, repeated threshold lookups would be answered by the result cache
+    analysis.result_cache.resize(0)
+
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(calls):
+        student_points = {
+            "MATHEMATICS": rng.randint(11, 51),
+            "FOREIGN LANGUAGE": rng.randint(14, 70),
+            "GEORGIAN LANGUAGE": rng.randint(15, 60),
+        }
+        weights = {subject: rng.randint(1, 6) for subject in student_points}
+        requests.append((rng.choice(faculty_ids), student_points, weights))
+
+    queries = {
+        "analysis.check_historical_data": lambda request: analysis.check_historical_data(*request),
+        "analysis.get_grant_thresholds": lambda request: analysis.get_grant_thresholds(),
+        "analysis.get_enrollment_thresholds": lambda request: analysis.get_enrollment_thresholds(request[0]),
+    }
+    for stage, query in queries.items():
+        latencies = []
+        for request in requests:
+            start = time.perf_counter()
+            query(request)
+            latencies.append(time.perf_counter() - start)
+
+        results[stage] = {
+            "seconds": sum(latencies),
+            "items": calls,
+            "unit": "calls",
+            "mean_us": statistics.mean(latencies) * 1e6,
+            "p50_us": statistics.median(latencies) * 1e6,
+        }
+
+
+def benchmark_scale(scale, seed=0):
+    """
+    Run every stage on synthetic data of the given scale.
+
+    :return: Dictionary of stage name to its measurements.
+    """
+    results = {}
+    year = SYNTHETIC_YEAR
+
+    with timed(results, "generation") as result:
+        enrollment_pages = synthetic.generate_enrollment_pages(scale, seed)
+        grant_pages = synthetic.generate_grant_pages(scale, seed)
+        result["items"] = len(enrollment_pages) + len(grant_pages)
+        result["unit"] = "pages"
+
+    with timed(results, "segmentation", unit="chunks") as result:
+        chunks = list(segmentation.iter_chunks(iter(enrollment_pages)))
+        result["items"] = len(chunks)
+    del enrollment_pages
+
+    # Records are not kept between stages, they do not fit in memory at large scales
+    with timed(results, "extraction", unit="enrollments") as result:
+        enrollments = 0
+        for chunk in chunks:
+            enrollments += len(enrollment_parser.parse_chunk(chunk, year))
+        for page in grant_pages:
+            grant_tokenizer.tokenize_page(page)
+        result["items"] = enrollments
+
+    grant_records = [
+        (student_id, grant_score, grant_amount, subject_name, year)
+        for subject_name, grant_amount, records in map(grant_tokenizer.tokenize_page, grant_pages)
+        for student_id, grant_score in records
+    ]
+    del grant_pages
+
+    with tempfile.TemporaryDirectory() as directory, use_database(os.path.join(directory, "naec.db")):
+        connection = create_database(config.DATABASE_PATH)
+        cursor = connection.cursor()
+
+        # Only the inserts are timed, batches are parsed again outside of the measurement
+        insert_seconds = 0
+        with api.bulk_load_settings(connection):
+            for start in range(0, len(chunks), config.INSERT_BATCH_SIZE):
+                batch = [enrollment_parser.parse_chunk(chunk, year) for chunk in chunks[start:start + config.INSERT_BATCH_SIZE]]
+
+                batch_start = time.perf_counter()
+                api.insert_enrollment_batch(cursor, batch)
+                insert_seconds += time.perf_counter() - batch_start
+
+            batch_start = time.perf_counter()
+            api.insert_grant_records(cursor, grant_records)
+            api.refresh_faculty_thresholds(cursor, year)
+            api.refresh_grant_thresholds(cursor, year)
+            connection.commit()
+            insert_seconds += time.perf_counter() - batch_start
+
+        results["db_insert"] = {"seconds": insert_seconds, "items": enrollments, "unit": "enrollments"}
+        del chunks, grant_records
+
+        with open(os.path.join(config.SEED_DIR, "calculate_sd_e.sql"), 'r', encoding='utf-8') as file:
+            calibration_script = file.read()
+        with timed(results, "calibration_sql", 1, "years"):
+            connection.executescript(calibration_script)
+            connection.commit()
+
+        faculty_ids = [faculty_id for (faculty_id,) in connection.execute("SELECT id FROM faculty;")]
+        connection.close()
+
+        with timed(results, "calibration", 1, "years"):
+            calibration.calibrate(years=[year])
+
+        benchmark_analysis(results, faculty_ids, seed=seed)
+
+    return results
+
+
+def compare(previous, current):
+    """
+    Print stage timings of two result files side by side.
+    """
+    print(f"{'scale':>6} {'stage':<36} {previous['commit'] or '?':>10} {current['commit'] or '?':>10} {'ratio':>7}")
+    for scale, stages in current["scales"].items():
+        for stage, result in stages.items():
+            before = previous["scales"].get(scale, {}).get(stage)
+            if before is None:
+                continue
+            print(f"{scale:>6} {stage:<36} {before['seconds']:9.3f}s {result['seconds']:9.3f}s "
+                  f"{result['seconds'] / before['seconds']:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic data.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON result path, defaults to data/benchmarks/stages-<commit>.json")
+    parser.add_argument("--compare", help="JSON result of another run to compare with")
+    args = parser.parse_args()
+
+    report = {
+        "commit": get_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scales": {},
+    }
+
+    # PDF extraction runs on real pages, independent of the scale
+    report["scales"]["real"] = {}
+    benchmark_pdf_extraction(report["scales"]["real"])
+    for scale in args.scales:
+        print(f"Scale {scale}x...")
+        report["scales"][str(scale)] = benchmark_scale(scale, args.seed)
+
+    for scale, stages in report["scales"].items():
+        for stage, result in stages.items():
+            print(f"{scale:>6} {stage:<36} {result['seconds']:9.3f}s  {result.get('items', '')} {result.get('unit', '')}")
+
+    output = args.output or os.path.join(config.DATA_DIR, "benchmarks", f"stages-{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            compare(json.load(file), report)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+Storage benchmark of the compact layout of migration 006 against the layout before it:
+database size per table and latency of the queries joining and searching the bulk tables.
+
+The previous layout is built from the data of the current database, in a fresh database
+migrated up to the version before the compact layout. The compact one is that database
+migrated further, so the benchmark also times the migration on the full data.
+
+Usage: python -m src.benchmarks.storage_benchmark [lookups]
+"""
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from src import config
+from src.db import setup
+
+# Migration introducing the compact layout
+COMPACT_STORAGE_VERSION = 6
+
+# Tables with the same columns in both layouts
+COPIED_TABLES = (
+    "university", "faculty", "exam", "ingestion", "calibration",
+    "faculty_threshold", "faculty_rank_curve", "faculty_subject", "grant_threshold",
+)
+
+# Bulk tables in the previous layout, rows in the order the parsers write them
+LEGACY_COPY_QUERIES = (
+    """
+    INSERT INTO enrollment (student_id, faculty_id, contest_score, rank, year)
+    SELECT student_id, faculty_id, contest_score, rank, year
+    FROM source.enrollment
+    ORDER BY year, faculty_id, rank;""",
+    """
+    INSERT INTO result (enrollment_id, subject_name, scaled_score, raw_score)
+    SELECT r.enrollment_id, s.name, r.scaled_score, r.raw_score
+    FROM source.result r
+    JOIN source.enrollment e ON e.student_id = r.enrollment_id
+    JOIN source.subject s ON s.id = r.subject_id
+    ORDER BY e.year, e.faculty_id, e.rank, s.id;""",
+    """
+    INSERT INTO grant (student_id, grant_score, grant_amount, subject_name, year)
+    SELECT g.student_id, g.grant_score, g.grant_amount, s.name, g.year
+    FROM source.grant g
+    JOIN source.subject s ON s.id = g.subject_id
+    ORDER BY g.year, s.id, g.grant_amount DESC, g.grant_score DESC;""",
+)
+
+# Queries of both layouts: (legacy query, compact query), run once each
+SCAN_QUERIES = {
+    # Score range per subject and year, the join of `calculate_sd_e.sql`
+    "calculate_sd_e join": (
+        """
+        SELECT r.subject_name, e.year, MIN(r.scaled_score), MAX(r.scaled_score)
+        FROM result r
+        JOIN enrollment e ON e.student_id = r.enrollment_id
+        GROUP BY e.year, r.subject_name;""",
+        """
+        SELECT s.name, stats.year, stats.min_score, stats.max_score
+        FROM (
+            SELECT r.subject_id, e.year, MIN(r.scaled_score) AS min_score, MAX(r.scaled_score) AS max_score
+            FROM result r
+            JOIN enrollment e ON e.student_id = r.enrollment_id
+            GROUP BY e.year, r.subject_id
+        ) stats
+        JOIN subject s ON s.id = stats.subject_id;""",
+    ),
+    # Results of all years, see `calibration.load_results`
+    "calibration results": (
+        """
+        SELECT r.rowid, r.subject_name, e.year, r.scaled_score
+        FROM result r
+        JOIN enrollment e ON e.student_id = r.enrollment_id;""",
+        """
+        SELECT r.enrollment_id, r.subject_id, e.year, r.scaled_score
+        FROM result r
+        JOIN enrollment e ON e.student_id = r.enrollment_id;""",
+    ),
+    # Results grouped by faculty, see `cross_faculty.iter_faculty_results`
+    "faculty results": (
+        """
+        SELECT enrollment.faculty_id, enrollment.student_id, enrollment.year, enrollment.contest_score,
+               result.subject_name, result.scaled_score
+        FROM enrollment
+        JOIN result ON result.enrollment_id = enrollment.student_id
+        ORDER BY enrollment.faculty_id, enrollment.student_id;""",
+        """
+        SELECT enrollment.faculty_id, enrollment.student_id, enrollment.year, enrollment.contest_score,
+               result.subject_id, result.scaled_score
+        FROM enrollment
+        JOIN result ON result.enrollment_id = enrollment.student_id
+        ORDER BY enrollment.faculty_id, enrollment.student_id;""",
+    ),
+}
+
+# Point lookups of `check_historical_data`: (legacy query, compact query), run once per sampled parameters
+LOOKUP_QUERIES = {
+    "rank lookups": (
+        """
+        SELECT rank FROM enrollment
+        WHERE contest_score < ? AND faculty_id = ? AND year = ?
+        ORDER BY contest_score DESC
+        LIMIT 1;""",
+    ) * 2,
+    "grant lookups": (
+        """
+        SELECT grant_amount FROM grant
+        WHERE grant_score < ? AND subject_name = ? AND year = ?
+        ORDER BY grant_score DESC
+        LIMIT 1;""",
+        """
+        SELECT grant_amount FROM grant
+        WHERE grant_score < ? AND subject_id = (SELECT id FROM subject WHERE name = ?) AND year = ?
+        ORDER BY grant_score DESC
+        LIMIT 1;""",
+    ),
+}
+
+
+def build_legacy_database(path):
+    """
+    Create a database in the layout before `COMPACT_STORAGE_VERSION` holding the data of the current database.
+    """
+    connection = sqlite3.connect(path)
+    with open(os.path.join(config.SEED_DIR, "schema.sql"), 'r', encoding='utf-8') as file:
+        connection.executescript(file.read())
+    setup.migrate(connection, target_version=COMPACT_STORAGE_VERSION - 1)
+
+    connection.execute("ATTACH DATABASE ? AS source;", (config.DATABASE_PATH,))
+    source_version = connection.execute("PRAGMA source.user_version;").fetchone()[0]
+    if source_version < COMPACT_STORAGE_VERSION:
+        raise RuntimeError(f"{config.DATABASE_PATH} is not migrated to the compact layout, run `python -m src.db.setup`")
+
+    for table in COPIED_TABLES:
+        connection.execute(f"INSERT OR REPLACE INTO {table} SELECT * FROM source.{table};")
+    for query in LEGACY_COPY_QUERIES:
+        connection.execute(query)
+    connection.commit()
+
+    connection.execute("DETACH DATABASE source;")
+    connection.execute("VACUUM;")
+    connection.close()
+
+
+def table_sizes(path):
+    """
+    Bytes of each table, its indexes included.
+    """
+    connection = sqlite3.connect(path)
+    sizes = dict(connection.execute("""
+        SELECT sqlite_master.tbl_name, SUM(dbstat.pgsize)
+        FROM dbstat
+        JOIN sqlite_master ON sqlite_master.name = dbstat.name
+        GROUP BY sqlite_master.tbl_name;"""
+    ).fetchall())
+    connection.close()
+    return sizes
+
+
+def sample_lookups(path, lookups, seed=0):
+    """
+    Random parameters of the lookup queries over the faculties and grant subjects of the database.
+    """
+    connection = sqlite3.connect(path)
+    faculty_years = connection.execute("""
+        SELECT faculty_id, year, min_contest_score, max_contest_score
+        FROM faculty_threshold;"""
+    ).fetchall()
+    subject_years = connection.execute("""
+        SELECT subject_name, year, MIN(min_grant_50, min_grant_70, min_grant_100), MAX(min_grant_100) + 100
+        FROM grant_threshold
+        WHERE min_grant_100 IS NOT NULL
+        GROUP BY subject_name, year;"""
+    ).fetchall()
+    connection.close()
+
+    rng = random.Random(seed)
+    parameters = {"rank lookups": [], "grant lookups": []}
+    for _ in range(lookups):
+        faculty_id, year, low, high = rng.choice(faculty_years)
+        parameters["rank lookups"].append((rng.uniform(low - 10, high + 10), faculty_id, year))
+
+        subject_name, year, low, high = rng.choice(subject_years)
+        parameters["grant lookups"].append((rng.uniform(low - 100, high), subject_name, year))
+
+    return parameters
+
+
+def time_queries(path, queries, repeat=5):
+    """
+    Best wall-clock time of `repeat` runs of each (query, parameter list) pair, on a warm page cache.
+    """
+    connection = sqlite3.connect(path)
+    timings = {}
+    for name, (query, parameters) in queries.items():
+        run_timings = []
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            for params in parameters:
+                connection.execute(query, params).fetchall()
+            run_timings.append(time.perf_counter() - start)
+        # The first run warms the page cache
+        timings[name] = min(run_timings[1:])
+
+    connection.close()
+    return timings
+
+
+def main(lookups=10000):
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_path = os.path.join(directory, "legacy.db")
+        compact_path = os.path.join(directory, "compact.db")
+
+        build_legacy_database(legacy_path)
+        shutil.copyfile(legacy_path, compact_path)
+
+        connection = sqlite3.connect(compact_path)
+        start = time.perf_counter()
+        setup.migrate(connection)
+        migration_seconds = time.perf_counter() - start
+        connection.close()
+
+        legacy_sizes, compact_sizes = table_sizes(legacy_path), table_sizes(compact_path)
+        legacy_bytes, compact_bytes = os.path.getsize(legacy_path), os.path.getsize(compact_path)
+        print(f"Migration to the compact layout: {migration_seconds:.1f}s")
+        print(f"{'table (with indexes)':<24} {'legacy':>10} {'compact':>10} {'delta':>8}")
+        for table in sorted(legacy_sizes, key=legacy_sizes.get, reverse=True):
+            legacy, compact = legacy_sizes[table], compact_sizes.get(table, 0)
+            print(f"{table:<24} {legacy / 2 ** 20:8.2f}MB {compact / 2 ** 20:8.2f}MB {compact / legacy - 1:+8.0%}")
+        print(f"{'database file':<24} {legacy_bytes / 2 ** 20:8.2f}MB {compact_bytes / 2 ** 20:8.2f}MB "
+              f"{compact_bytes / legacy_bytes - 1:+8.0%}")
+
+        parameters = sample_lookups(legacy_path, lookups)
+        timings = []
+        for layout, path in ((0, legacy_path), (1, compact_path)):
+            queries = {name: (pair[layout], [()]) for name, pair in SCAN_QUERIES.items()}
+            queries.update({name: (pair[layout], parameters[name]) for name, pair in LOOKUP_QUERIES.items()})
+            timings.append(time_queries(path, queries))
+
+        print(f"\n{'query':<24} {'legacy':>10} {'compact':>10} {'delta':>8}")
+        for name in timings[0]:
+            legacy, compact = timings[0][name], timings[1][name]
+            label = f"{name} x{lookups}" if name in LOOKUP_QUERIES else name
+            print(f"{label:<24} {legacy * 1e3:8.1f}ms {compact * 1e3:8.1f}ms {compact / legacy - 1:+8.0%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
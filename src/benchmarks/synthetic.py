@@ -0,0 +1,220 @@
+"""
+Synthetic NAEC enrollment and grant lists, in the text layout of the real PDFs.
+
+Enrollment pages are generated as `segmentation.iter_pdf_pages` yields them (title
+removed), ready for `segmentation.iter_chunks` and the extractors. Grant pages are
+generated as `pdf_extraction.extract_pages` returns them. Scale 1 is about the volume
+of one real year; scaled scores are produced from raw points with fixed exam
+parameters, so calibration recovers them.
+
+PDF rendering is optional and requires reportlab and a TrueType font with Georgian glyphs.
+
+Usage: python -m src.benchmarks.synthetic [--scale 1] [--year 2024] [--output-dir DIR] [--pdf-font FONT]
+"""
+import argparse
+import os
+import random
+
+from src import constants
+
+# Volume of one real year at scale 1
+UNIVERSITIES = 60
+FACULTIES = 1400
+MEAN_FACULTY_ENROLLMENTS = 21
+GRANT_RECORDS = 6500
+
+LINES_PER_ENROLLMENT_PAGE = 45
+RECORDS_PER_GRANT_PAGE = 30
+
+GRANT_TITLE = (
+    "აბსოლუტური ქულებით რანჟირების დოკუმენტი იმ აბიტურიენტთა ჩამონათვალის\n"
+    "მითითებით რომლებმაც მოიპოვეს გრანტი აკადემიური საგანმანათლებლო პროგრამის\n"
+    "დასაფინანსებლად\n"
+)
+
+# Raw point bounds (min, max) and the mean and SD scaled scores are generated with
+EXAM_PARAMETERS = {
+    "MATHEMATICS": (11, 51, 20.0, 10.0),
+    "FOREIGN LANGUAGE": (14, 70, 47.0, 18.0),
+    "GEORGIAN LANGUAGE": (15, 60, 38.0, 11.5),
+}
+ELECTIVE_EXAM_PARAMETERS = (15, 60, 35.0, 11.0)
+
+MANDATORY_SUBJECTS_KA = ("ქართული ენა", "უცხოური ენა")
+# Electives listed by enrollment tables, "ზოგადი უნარები" is left out as it spans two header tokens
+ELECTIVE_SUBJECTS_KA = tuple(
+    subject for subject in constants.SUBJECTS_KA_TO_EN_MAPPING
+    if subject not in MANDATORY_SUBJECTS_KA and len(subject.split()) == 1
+)
+GEORGIAN_LETTERS = "აბგდევზთიკლმნოპჟრსტუფქღყშჩცძწჭხჯჰ"
+
+
+def georgian_words(rng, count):
+    return " ".join(
+        "".join(rng.choice(GEORGIAN_LETTERS) for _ in range(rng.randint(3, 10))) for _ in range(count)
+    )
+
+
+def get_exam_parameters(subject_ka):
+    return EXAM_PARAMETERS.get(constants.SUBJECTS_KA_TO_EN_MAPPING[subject_ka], ELECTIVE_EXAM_PARAMETERS)
+
+
+def scaled_score(rng, exam_parameters):
+    """
+    Scaled score of a random raw point, SP = 15 * ((X - E) / SD) + 150.
+    """
+    min_score, max_score, mean, standard_deviation = exam_parameters
+    raw_score = min(max_score, max(min_score, round(rng.gauss(mean, standard_deviation))))
+    return min(200.0, max(100.0, round(15 * ((raw_score - mean) / standard_deviation) + 150, 1)))
+
+
+def iter_faculty_lines(rng, scale, student_ids):
+    """
+    Yield text lines of faculty enrollment groups, grouped by university.
+    """
+    faculties = FACULTIES * scale
+    universities = min(UNIVERSITIES * scale, 999)
+
+    for faculty_index in range(faculties):
+        university_id = f"{faculty_index * universities // faculties + 1:03d}"
+        if faculty_index == 0 or university_id != f"{(faculty_index - 1) * universities // faculties + 1:03d}":
+            university_name = f"სსიპ - {georgian_words(random.Random(university_id), 4)} უნივერსიტეტი"
+
+        subjects = list(MANDATORY_SUBJECTS_KA) + rng.sample(ELECTIVE_SUBJECTS_KA, 2 if rng.random() < 0.1 else 1)
+        weights = [rng.randint(1, 6) for _ in subjects]
+
+        yield f"{university_id} {university_name}"
+        yield f"{university_id}{faculty_index % 100000:05d} {georgian_words(rng, rng.randint(1, 4))}"
+        yield f"წლიური გადასახადი {rng.choice((2250, 2750, 3000, 4500))}"
+        yield f"საგამოცდოს {' '.join(subject.split()[0] for subject in subjects)} საკონკურსო გრანტი %"
+        yield "ნომერი ენა ქულა"
+
+        enrollments = []
+        for _ in range(max(1, round(rng.expovariate(1 / MEAN_FACULTY_ENROLLMENTS)))):
+            scores = [scaled_score(rng, get_exam_parameters(subject)) for subject in subjects]
+            contest_score = round(sum(weight * score for weight, score in zip(weights, scores)), 1)
+            enrollments.append((contest_score, next(student_ids), scores))
+
+        enrollments.sort(key=lambda enrollment: -enrollment[0])
+        for rank, (contest_score, student_id, scores) in enumerate(enrollments, start=1):
+            grant = f" {rng.choice((50, 70, 100))}" if rng.random() < 0.2 else ""
+            yield f"{rank} {student_id} {' '.join(f'{score:.1f}' for score in scores)} {contest_score:.1f}{grant}"
+
+
+def iter_student_ids(rng):
+    """
+    Yield unique random 9-digit student IDs.
+    """
+    seen = set()
+    while True:
+        student_id = rng.randint(400000000, 409999999)
+        if student_id not in seen:
+            seen.add(student_id)
+            yield student_id
+
+
+def generate_enrollment_pages(scale=1, seed=0):
+    """
+    Generate enrollment list pages as yielded by `segmentation.iter_pdf_pages`.
+
+    Pages end with their page number and continue with the column numbers header,
+    as in the real PDF text.
+
+    :return: List of page texts.
+    """
+    rng = random.Random(seed)
+    lines = iter_faculty_lines(rng, scale, iter_student_ids(random.Random(seed + 1)))
+
+    pages = []
+    page_lines = []
+    for line in lines:
+        page_lines.append(line)
+        if len(page_lines) == LINES_PER_ENROLLMENT_PAGE:
+            pages.append(page_lines)
+            page_lines = ["1 2 3 4"]
+    pages.append(page_lines)
+
+    return ["\n".join(page_lines) + f"\n{i}" for i, page_lines in enumerate(pages, start=1)]
+
+
+def generate_grant_pages(scale=1, seed=0):
+    """
+    Generate grant list pages as returned by `pdf_extraction.extract_pages`.
+
+    :return: List of page texts.
+    """
+    rng = random.Random(seed)
+    student_ids = iter_student_ids(random.Random(seed + 2))
+
+    # Lists of (subject, grant amount) with a share of the records, most grants are for MATHEMATICS and HISTORY
+    subjects = list(constants.SUBJECTS_KA_TO_EN_MAPPING)[:9]
+    subject_shares = [8 if subject in ("მათემატიკა", "ისტორია") else 1 for subject in subjects]
+
+    pages = []
+    for subject, share in zip(subjects, subject_shares):
+        subject_records = GRANT_RECORDS * scale * share // sum(subject_shares)
+        for grant_amount, amount_share in ((100, 0.15), (70, 0.25), (50, 0.6)):
+            records = max(1, round(subject_records * amount_share))
+
+            grant_scores = sorted((rng.randint(11000, 12400) / 2 for _ in range(records)), reverse=True)
+            for start in range(0, records, RECORDS_PER_GRANT_PAGE):
+                rows = [f"{next(student_ids)} {score:.1f}" for score in grant_scores[start:start + RECORDS_PER_GRANT_PAGE]]
+                pages.append(f"{subject} დაფინანსება {grant_amount}%\nსაგამოცდო # საგრანტო ქულა\n" + "\n".join(rows))
+
+    pages[0] = GRANT_TITLE + pages[0]
+    return [f"{page}\n{i} / {len(pages)}" for i, page in enumerate(pages, start=1)]
+
+
+def render_pdf(pages, pdf_path, font_path):
+    """
+    Render text pages into a PDF file, one line of text per line of the page.
+
+    :param font_path: TrueType font with Georgian glyphs, e.g. DejaVuSans.ttf.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    pdfmetrics.registerFont(TTFont("Georgian", font_path))
+    pdf = canvas.Canvas(pdf_path, pagesize=A4)
+    width, height = A4
+
+    for page in pages:
+        text = pdf.beginText(40, height - 40)
+        text.setFont("Georgian", 9)
+        for line in page.split("\n"):
+            text.textLine(line)
+        pdf.drawText(text)
+        pdf.showPage()
+
+    pdf.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic NAEC enrollment and grant lists.")
+    parser.add_argument("--scale", type=int, default=1, help="volume relative to one real year")
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=os.path.join("data", "synthetic"))
+    parser.add_argument("--pdf-font", help="render PDFs too, with this TrueType font (requires reportlab)")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for kind, pages in (
+            ("enrollments", generate_enrollment_pages(args.scale, args.seed)),
+            ("grants", generate_grant_pages(args.scale, args.seed)),
+    ):
+        path = os.path.join(args.output_dir, f"{kind}_{args.year}_{args.scale}x")
+        # Pages are separated by form feeds
+        with open(f"{path}.txt", "w", encoding="utf-8") as file:
+            file.write("\f".join(pages))
+        print(f"{len(pages)} {kind} pages written to {path}.txt")
+
+        if args.pdf_font:
+            render_pdf(pages, f"{path}.pdf", args.pdf_font)
+            print(f"{path}.pdf rendered")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Micro-benchmark of text extraction: the regular expression extractors against the
+single-pass tokenizers, on the text of every enrollment and grant PDF.
+
+Outputs of both are compared first, the benchmark fails on any difference.
+
+Usage: python -m src.benchmarks.tokenizer_benchmark [repeat]
+"""
+import operator
+import os
+import sys
+import time
+
+from src import config, pdf_extraction
+from src.enrollments import extractors, segmentation
+from src.enrollments.batch import EnrollmentBatch
+from src.enrollments import tokenizer as enrollment_tokenizer
+from src.grants import grant_parser
+from src.grants import tokenizer as grant_tokenizer
+
+
+def regex_chunk(chunk):
+    university_id, university_name = extractors.extract_university_name_and_id(chunk)
+    faculty_id, faculty_name = extractors.extract_faculty_name_and_id(chunk)
+    enrollments = extractors.extract_enrollment_records(chunk)
+    return EnrollmentBatch.from_columns(
+        None, university_id, university_name, faculty_id, faculty_name, extractors.extract_taken_subjects(chunk),
+        [enrollment["rank"] for enrollment in enrollments],
+        [enrollment["student_id"] for enrollment in enrollments],
+        [enrollment["contest_score"] for enrollment in enrollments],
+        [enrollment["subject_scores"] for enrollment in enrollments],
+    )
+
+
+def regex_page(page):
+    subject_name, percentage = grant_parser.extract_subject_and_percentage(page)
+    records = [(record["student_id"], record["grant_score"]) for record in grant_parser.extract_table_of_records(page)]
+    return subject_name, int(percentage[:-1]), records
+
+
+def load_texts():
+    """
+    Load enrollment chunks and grant pages of every year, from the page cache when possible.
+
+    :return: Dictionary of year to (enrollment chunks, grant pages).
+    """
+    texts = {}
+    for pdf_filename in sorted(os.listdir(config.ENROLLMENT_DATA_DIR)):
+        year = int(pdf_filename.split(".")[0])
+        chunks = list(segmentation.iter_chunks(segmentation.iter_pdf_pages(pdf_filename)))
+
+        grant_path = os.path.join(config.GRANTS_DATA_DIR, pdf_filename)
+        pages = pdf_extraction.extract_pages(grant_path) if os.path.exists(grant_path) else []
+        texts[year] = (chunks, pages)
+
+    return texts
+
+
+def find_differences(parse, reference, texts, equal=operator.eq):
+    return sum(not equal(parse(text), reference(text)) for text in texts)
+
+
+def time_parser(parse, texts, repeat):
+    """
+    Return the best wall-clock time of `repeat` runs of a parser over all texts.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            parse(text)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def main(repeat=5):
+    texts = load_texts()
+    differences = 0
+
+    for name, parse, reference, equal, index in (
+            ("enrollment chunks", enrollment_tokenizer.tokenize_chunk, regex_chunk, EnrollmentBatch.equals, 0),
+            ("grant pages", grant_tokenizer.tokenize_page, regex_page, operator.eq, 1),
+    ):
+        print(f"{name}:")
+        for year, year_texts in texts.items():
+            year_texts = year_texts[index]
+            year_differences = find_differences(parse, reference, year_texts, equal)
+            differences += year_differences
+
+            regex_time = time_parser(reference, year_texts, repeat)
+            tokenizer_time = time_parser(parse, year_texts, repeat)
+            print(f"  {year}: {len(year_texts):5} texts, {year_differences} differences, "
+                  f"regex {regex_time * 1e3:7.1f}ms, tokenizer {tokenizer_time * 1e3:7.1f}ms, "
+                  f"speedup {regex_time / tokenizer_time:.1f}x")
+
+    if differences:
+        print(f"FAIL: {differences} texts parsed differently")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,163 @@
+"""
+Command-line entry point of the project: `naec <command>`, or `python -m src <command>`.
+
+The modules of a command are imported when it runs, so the query commands `check` and
+`thresholds` start without NumPy, pandas or pdfplumber, which only ingestion and the numeric
+analyses need. `python -m src.benchmarks.import_time` checks that they stay that way.
+
+Usage: naec {setup,ingest,calibrate,check,thresholds,benchmark} [arguments]
+"""
+import argparse
+import sys
+
+# Package of the modules run by `naec benchmark`
+BENCHMARKS_PACKAGE = "src.benchmarks"
+
+
+def subject_value(argument):
+    """
+    Parse a SUBJECT=VALUE argument into a (subject, number) tuple, subject names are case insensitive.
+    """
+    subject, separator, value = argument.rpartition("=")
+    if not separator or not subject.strip():
+        raise argparse.ArgumentTypeError(f"expected SUBJECT=VALUE, got {argument!r}")
+
+    try:
+        number = int(value)
+    except ValueError:
+        number = float(value)
+    return subject.strip().upper(), number
+
+
+def print_rows(header, rows):
+    """
+    Print result rows as an aligned table.
+    """
+    cells = [
+        ["" if value is None else str(round(value, 3) if isinstance(value, float) else value) for value in row]
+        for row in rows
+    ]
+    widths = [max([len(name)] + [len(row[i]) for row in cells]) for i, name in enumerate(header)]
+
+    print("  ".join(name.rjust(width) for name, width in zip(header, widths)))
+    for row in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def list_benchmarks():
+    """
+    Names of the modules of `BENCHMARKS_PACKAGE`.
+    """
+    import pkgutil
+
+    from src import benchmarks
+
+    return sorted(name for _, name, _ in pkgutil.iter_modules(benchmarks.__path__))
+
+
+def run_setup(args):
+    from src import instrumentation
+    from src.db import setup
+
+    instrumentation.configure_logging()
+    setup.setup()
+
+
+def run_ingest(args):
+    from src import ingestion
+
+    ingestion.main(args.arguments)
+
+
+def run_calibrate(args):
+    from src import instrumentation
+    from src.db import calibration
+
+    with instrumentation.run("calibration"):
+        calibration.calibrate(force=args.force)
+
+
+def run_check(args):
+    from src.db import analysis
+
+    try:
+        rows = analysis.check_historical_data(args.faculty_id, dict(args.points), dict(args.weights), args.grant_subject)
+    except (KeyError, ValueError) as e:
+        sys.exit(f"naec check: {e}")
+
+    print_rows(("year", "grant_score", "contest_score", "grant_amount", "rank", "total_enrolled"), rows)
+
+
+def run_thresholds(args):
+    from src.db import analysis
+
+    print("Grant thresholds of MATHEMATICS:")
+    print_rows(("year", "min_grant_50", "min_grant_70", "min_grant_100"), analysis.get_grant_thresholds())
+
+    if args.faculty_id is not None:
+        print(f"\nEnrollment thresholds of faculty {args.faculty_id}:")
+        print_rows(("year", "rank", "min_contest_score"), analysis.get_enrollment_thresholds(args.faculty_id))
+
+
+def run_benchmark(args):
+    import runpy
+
+    names = list_benchmarks()
+    if args.name not in names:
+        print("Benchmarks: " + ", ".join(names))
+        sys.exit(0 if args.name is None else f"naec benchmark: unknown benchmark {args.name!r}")
+
+    # Run it as `python -m`, with the remaining arguments as its command line
+    module = f"{BENCHMARKS_PACKAGE}.{args.name}"
+    sys.argv = [module] + args.arguments
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="naec", description="NAEC exam data ingestion and analysis.")
+    # An explicit prog spares argparse the terminal size lookup of formatting one, importing shutil
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command", prog="naec")
+
+    command = commands.add_parser("setup", help="create the database and apply pending migrations")
+    command.set_defaults(run=run_setup)
+
+    # Arguments are forwarded to `src.ingestion`, which also prints the help
+    command = commands.add_parser("ingest", add_help=False, help="ingest changed enrollment and grant PDFs")
+    command.set_defaults(run=run_ingest, forward_arguments=True)
+
+    command = commands.add_parser("calibrate", help="fit exam mean and standard deviation of changed years")
+    command.add_argument("--force", action="store_true", help="recalibrate all years")
+    command.set_defaults(run=run_calibrate)
+
+    command = commands.add_parser("check", help="contest score, rank and grant of a student in past years")
+    command.add_argument("faculty_id", help="faculty ID of the contest")
+    command.add_argument("points", nargs="+", type=subject_value, metavar="SUBJECT=POINTS",
+                         help="raw points per subject, e.g. MATHEMATICS=46")
+    command.add_argument("--weights", nargs="+", type=subject_value, required=True, metavar="SUBJECT=WEIGHT",
+                         help="contest coefficient per subject, e.g. MATHEMATICS=6")
+    command.add_argument("--grant-subject", type=str.upper, help="subject of the grant, defaults to the first elective")
+    command.set_defaults(run=run_check)
+
+    command = commands.add_parser("thresholds", help="grant thresholds, and enrollment thresholds of a faculty")
+    command.add_argument("faculty_id", nargs="?", help="faculty ID of the enrollment thresholds")
+    command.set_defaults(run=run_thresholds)
+
+    command = commands.add_parser("benchmark", help="run a benchmark, arguments are passed on to it")
+    command.add_argument("name", nargs="?", help="benchmark module, lists them if omitted")
+    command.set_defaults(run=run_benchmark, forward_arguments=True)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, arguments = parser.parse_known_args(argv)
+    if arguments and not getattr(args, "forward_arguments", False):
+        parser.error(f"unrecognized arguments: {' '.join(arguments)}")
+
+    args.arguments = arguments
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
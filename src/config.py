@@ -7,5 +7,54 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 GRANTS_DATA_DIR = os.path.join(DATA_DIR, 'grants')
 ENROLLMENT_DATA_DIR = os.path.join(DATA_DIR, 'enrollments')
 
-DATABASE_PATH = os.path.join(DATA_DIR, 'naec.db')
-SEED_DIR = os.path.join(DATA_DIR, 'seed')
\ No newline at end of file
+DATABASE_PATH = os.environ.get('NAEC_DATABASE_PATH', os.path.join(DATA_DIR, 'naec.db'))
+SEED_DIR = os.path.join(DATA_DIR, 'seed')
+
+# Number of processes used to extract PDF page text (1 disables the process pool)
+PDF_EXTRACTION_WORKERS = int(os.environ.get('NAEC_PDF_WORKERS', os.cpu_count() or 1))
+
+# Number of faculty enrollment groups written per database transaction while ingesting
+INSERT_BATCH_SIZE = 100
+
+# Number of processes parsing year files concurrently, see `src.ingestion`
+INGESTION_WORKERS = int(os.environ.get('NAEC_INGESTION_WORKERS', os.cpu_count() or 1))
+# Parsed batches waiting for the database writer, parsers block when it is full
+INGESTION_QUEUE_SIZE = 64
+
+# On-disk cache of extracted PDF page text, keyed by file hash, page and extractor version
+PAGE_CACHE_ENABLED = os.environ.get('NAEC_PAGE_CACHE', '1') != '0'
+PAGE_CACHE_PATH = os.path.join(DATA_DIR, 'cache', 'page_text.db')
+PAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Seconds a page cache write waits for the ones of other parsing workers
+PAGE_CACHE_BUSY_TIMEOUT = 60
+
+# Number of pooled read-only connections of the analysis engine
+ANALYSIS_POOL_SIZE = 4
+
+# Results of analysis lookups kept by the LRU cache of `src.db.analysis`, 0 disables it
+RESULT_CACHE_SIZE = int(os.environ.get('NAEC_RESULT_CACHE_SIZE', 4096))
+
+# Columnar snapshots of parsed PDF data, the database can be rebuilt from them
+SNAPSHOT_DIR = os.path.join(DATA_DIR, 'snapshots')
+
+# Logging verbosity of pipeline runs (DEBUG, INFO, WARNING, ...)
+LOG_LEVEL = os.environ.get('NAEC_LOG_LEVEL', 'INFO')
+
+# Track peak memory of pipeline runs with tracemalloc, slows allocation heavy stages down
+TRACE_MEMORY = os.environ.get('NAEC_TRACE_MEMORY', '0') == '1'
+
+# JSON reports of pipeline runs with stage timings, throughput, SQL timings and peak memory
+RUN_REPORT_DIR = os.path.join(DATA_DIR, 'runs')
+
+# Local HTTP service of the analysis lookups, see `src.service`
+SERVICE_HOST = os.environ.get('NAEC_SERVICE_HOST', '127.0.0.1')
+SERVICE_PORT = int(os.environ.get('NAEC_SERVICE_PORT', 8080))
+# Number of reader threads, each with its own read-only SQLite connection
+SERVICE_WORKERS = int(os.environ.get('NAEC_SERVICE_WORKERS', 4))
+
+# Monte Carlo admission forecasts, see `src.db.forecast`
+FORECAST_DRAWS = 20000
+FORECAST_SEED = 0
+
+# Memory-mapped score-distribution index of enrollment contest scores, see `src.db.score_index`
+SCORE_INDEX_PATH = os.path.join(DATA_DIR, 'cache', 'score_index.bin')
@@ -15,3 +15,16 @@ SUBJECTS_KA_TO_EN_MAPPING = {
     "ქართული ენა": "GEORGIAN LANGUAGE",
     "უცხოური ენა": "FOREIGN LANGUAGE"
 }
+
+# Enrollment tables list subjects by the first word of their name only (e.g. "ქართული" for "ქართული ენა"),
+# map them once to the database representation
+# (iterated in reverse, so the first matching subject wins as with a linear scan)
+SUBJECTS_KA_FIRST_WORD_TO_EN_MAPPING = {
+    subject_ka.split()[0]: subject_en for subject_ka, subject_en in reversed(SUBJECTS_KA_TO_EN_MAPPING.items())
+}
+
+# Subjects every applicant takes, they count towards the grant score with coefficient 1
+MANDATORY_SUBJECTS = ("FOREIGN LANGUAGE", "GEORGIAN LANGUAGE")
+
+# Coefficient of the elective (grant) subject in the grant score
+GRANT_SUBJECT_COEFFICIENT = 1.5
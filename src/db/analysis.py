@@ -1,157 +1,139 @@
+import os
 import sqlite3
-from src import config
+import threading
 
+from src import config, instrumentation
+from src.db import api, scoring
+from src.db.result_cache import ResultCache
 
-def check_historical_data(faculty_id, student_points, weights):
+# Mandatory subjects with MATHEMATICS, the most common subject combination
+DEFAULT_SUBJECTS = ("MATHEMATICS", "FOREIGN LANGUAGE", "GEORGIAN LANGUAGE")
+
+CHECK_HISTORICAL_DATA_QUERY = scoring.compile_historical_query(DEFAULT_SUBJECTS)
+
+GRANT_THRESHOLDS_QUERY = """
+    SELECT year, min_grant_50, min_grant_70, min_grant_100
+    FROM grant_threshold
+    WHERE subject_name = 'MATHEMATICS'
+    ORDER BY year;
+    """
+
+ENROLLMENT_THRESHOLDS_QUERY = """
+    SELECT year, last_rank AS rank, min_contest_score
+    FROM faculty_threshold
+    WHERE faculty_id = ?
+    ORDER BY year;
+    """
+
+# Results of the lookups below, tagged with the data version bumped by ingestion, see `cache_stats`
+result_cache = ResultCache(config.RESULT_CACHE_SIZE)
+
+# Per-thread connection reading the data version
+_version_connections = threading.local()
+
+
+def get_data_version():
+    """
+    Data version of the database at `config.DATABASE_PATH`, tagged with its path and file.
+
+    Read on a connection kept open per thread, a new connection loads the schema first,
+    which takes longer than answering a lookup from the cache. It is opened again when
+    the file was replaced, e.g. by `snapshots.rebuild(fresh=True)`.
+    """
+    database_file = (config.DATABASE_PATH, os.stat(config.DATABASE_PATH).st_ino)
+    if getattr(_version_connections, "file", None) != database_file:
+        if getattr(_version_connections, "connection", None) is not None:
+            _version_connections.connection.close()
+        _version_connections.connection = sqlite3.connect(database_file[0])
+        _version_connections.file = database_file
+
+    return database_file + (api.get_data_version(_version_connections.connection.cursor()),)
+
+
+def fetch_rows(query, params=()):
+    """
+    Run a query on a new connection and fetch its rows.
+    """
+    conn = instrumentation.connect(config.DATABASE_PATH)
+    try:
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+
+def fetch_cached(key, query, params=()):
+    """
+    Fetch the rows of a query from the result cache, or run it and cache them.
+
+    :param key: Hashable cache key identifying the lookup and its arguments.
+    :return: List of result rows, a copy of the cached one.
+    """
+    if result_cache.maxsize <= 0:
+        return fetch_rows(query, params)
+
+    version = get_data_version()
+    rows = result_cache.get(key, version)
+    if rows is None:
+        rows = fetch_rows(query, params)
+        result_cache.put(key, version, rows)
+
+    return list(rows)
+
+
+def cache_stats():
+    """
+    Hit, miss, eviction and invalidation counters of the result cache, see `ResultCache.stats`.
+    """
+    return result_cache.stats()
+
+
+def check_historical_data(faculty_id, student_points, weights, grant_subject=None):
     """
     Calculate contest and grant score
     to check each year enrollment and grant amount
     using precalculated SD and E values and parameters.
 
+    Works for any combination of subjects, the query for the subjects of `weights`
+    is generated once and cached, see `scoring.compile_historical_query`. Results are
+    cached per faculty, points, weights and grant subject until the data changes.
+
     :param faculty_id: Faculty ID for contest ranking.
     :param student_points: Dictionary with student points for each subject.
     :param weights: Dictionary with coefficients for subjects (multipliers).
+    :param grant_subject: Subject of the grant lookup, defaults to the first elective subject.
     :return: Result rows from the calculation.
     """
-    conn = sqlite3.connect(config.DATABASE_PATH)
-    cursor = conn.cursor()
-    query = """
-WITH CalculateSubjectScaledScores AS (
-    SELECT
-        x_values.subject_name,
-        x_values.x_value,
-        exam.year,
-        15.0 * ((x_values.x_value - exam.mean) / exam.standard_deviation) + 150 AS scaled_score
-    FROM (
-        SELECT 'MATHEMATICS' AS subject_name, ? AS x_value
-        UNION ALL
-        SELECT 'FOREIGN LANGUAGE', ?
-        UNION ALL
-        SELECT 'GEORGIAN LANGUAGE', ?
-    ) AS x_values
-    JOIN exam ON x_values.subject_name = exam.subject_name
-), ComputeGrantAndContestScores AS (
-    SELECT
-        year,
-        SUM(
-            (scaled_score * 1.5 * CASE WHEN subject_name = 'MATHEMATICS' THEN 1 ELSE 0 END) +
-            (scaled_score * CASE WHEN subject_name = 'FOREIGN LANGUAGE' THEN 1 ELSE 0 END) +
-            (scaled_score * CASE WHEN subject_name = 'GEORGIAN LANGUAGE' THEN 1 ELSE 0 END)
-        ) * 10 AS grant_score,
-        SUM(
-            (scaled_score * ? * CASE WHEN subject_name = 'MATHEMATICS' THEN 1 ELSE 0 END) +
-            (scaled_score * ? * CASE WHEN subject_name = 'FOREIGN LANGUAGE' THEN 1 ELSE 0 END) +
-            (scaled_score * ? * CASE WHEN subject_name = 'GEORGIAN LANGUAGE' THEN 1 ELSE 0 END)
-        ) AS contest_score
-    FROM CalculateSubjectScaledScores
-    GROUP BY year
-), FinalRankAndGrant AS (
-    SELECT
-        scores.year,
-        scores.grant_score,
-        scores.contest_score,
-        (SELECT grant_amount
-         FROM grant
-         WHERE grant_score < scores.grant_score
-           AND subject_name = 'MATHEMATICS'
-           AND year = scores.year
-         ORDER BY grant_score DESC
-         LIMIT 1) AS grant_amount,
-        (SELECT rank
-         FROM enrollment
-         WHERE contest_score < scores.contest_score
-           AND faculty_id = ?
-           AND year = scores.year
-         ORDER BY contest_score DESC
-         LIMIT 1) AS rank,
-         -- Total enrolled students in that faculty on that year
-        (SELECT COUNT(*)
-            FROM enrollment
-            WHERE year = scores.year
-            AND faculty_id = ?
-            ) AS total_enrolled
-    FROM ComputeGrantAndContestScores scores
-)
-SELECT *
-FROM FinalRankAndGrant;
-"""
-
-    params = [
-        student_points['MATHEMATICS'],
-        student_points['FOREIGN LANGUAGE'],
-        student_points['GEORGIAN LANGUAGE'],
-        weights['MATHEMATICS'],
-        weights['FOREIGN LANGUAGE'],
-        weights['GEORGIAN LANGUAGE'],
-        faculty_id,
-        faculty_id
-    ]
-
-    cursor.execute(query, params)
-    results = cursor.fetchall()
-    conn.close()
-
-    return results
+    query, params = scoring.prepare_historical_query(faculty_id, student_points, weights, grant_subject)
+    key = (
+        "historical", str(faculty_id), tuple(sorted(student_points.items())), tuple(sorted(weights.items())),
+        grant_subject,
+    )
+    return fetch_cached(key, query, params)
 
 
 def get_grant_thresholds():
     """
     Fetch minimum grant scores for 50%, 70%, and 100% grants as reference.
+    Reads the `grant_threshold` table refreshed at ingestion time, cached until the data changes.
 
     :return: List of rows with year, min_grant_50, min_grant_70, and min_grant_100.
     """
-    conn = sqlite3.connect(config.DATABASE_PATH)
-    cursor = conn.cursor()
-    query = """
-    WITH GrantThresholds AS (
-        SELECT
-            year,
-            MIN(grant_score) FILTER (WHERE grant_amount = 50) AS min_grant_50,
-            MIN(grant_score) FILTER (WHERE grant_amount = 70) AS min_grant_70,
-            MIN(grant_score) FILTER (WHERE grant_amount = 100) AS min_grant_100
-        FROM grant
-        WHERE subject_name = 'MATHEMATICS'
-        GROUP BY year
-    )
-    SELECT *
-    FROM GrantThresholds
-    ORDER BY year;
-    """
-    cursor.execute(query)
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    return fetch_cached(("grant_thresholds",), GRANT_THRESHOLDS_QUERY)
 
 
 def get_enrollment_thresholds(faculty_id):
     """
     Fetch enrollment thresholds (minimum contest scores for each rank) for a given faculty.
+    Reads the `faculty_threshold` table refreshed at ingestion time, cached until the data changes.
 
     :param faculty_id: Faculty ID for which to fetch thresholds.
-    :return: List of rows with year, rank, and minimum contest scores.
-    """
-    conn = sqlite3.connect(config.DATABASE_PATH)
-    cursor = conn.cursor()
-    query = """
-    WITH EnrollmentThresholds AS (
-        SELECT
-            year,
-            rank,
-            MIN(contest_score) AS min_contest_score
-        FROM enrollment
-        WHERE faculty_id = ?
-        GROUP BY year
-    )
-    SELECT *
-    FROM EnrollmentThresholds
+    :return: List of rows with year, rank of the last enrolled student, and minimum contest scores.
     """
-    cursor.execute(query, (faculty_id,))
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    return fetch_cached(("enrollment_thresholds", str(faculty_id)), ENROLLMENT_THRESHOLDS_QUERY, (faculty_id,))
 
 
 if __name__ == "__main__":
+    instrumentation.configure_logging()
     faculty_id = 19701034
 
     student_points = {"MATHEMATICS": 46, "FOREIGN LANGUAGE": 69, "GEORGIAN LANGUAGE": 56}
@@ -1,110 +1,344 @@
-import sqlite3
-from src import config, constants
+import itertools
+import logging
+import os
+from contextlib import contextmanager
 
+from src import config, instrumentation
+
+logger = logging.getLogger(__name__)
 
-def batch_insert_grant_records(records):
-    """
-    Insert multiple records into the `grant_records` table in a batch.
 
-    :param records: List of tuples containing (student_id, grant_score, percentage, subject)
+def get_subject_ids(cursor, subject_names):
     """
-    # Connect to SQLite database
-    connection = sqlite3.connect(config.DATABASE_PATH)
-    cursor = connection.cursor()
+    Map subject names to their IDs in the `subject` dictionary, adding the subjects not in it yet.
 
-    # Insert the records in a batch
+    :param cursor: Cursor of an open connection, the added subjects are not committed.
+    :param subject_names: Iterable of subject names.
+    :return: Dictionary of subject name to ID, of all subjects of the dictionary.
+    """
     cursor.executemany("""
-    INSERT INTO grant (student_id, grant_score, grant_amount, subject_name, year)
-    VALUES (?, ?, ?, ?, ?);
-    """, records)
+        INSERT OR IGNORE INTO subject (name)
+            VALUES (?);""", [(subject_name,) for subject_name in set(subject_names)]
+    )
+    return dict(cursor.execute("SELECT name, id FROM subject;").fetchall())
 
-    # Commit and close the connection
-    connection.commit()
-    connection.close()
-    print(f"{len(records)} records inserted successfully")
-
-
-def batch_insert_enrollment_records(records):
-    """
-    Insert multiple records into the `enrollment_records` table in a batch.
-
-    received data format:
-    {
-        "year": int,                     # The year of the enrollment group
-        "university_id": str,            # A 3-character string representing the university ID
-        "university_name": str,          # The name of the university
-        "faculty_id": str,               # A 8-10-character string representing the faculty ID
-        "faculty_name": str,             # The name of the faculty
-        "subjects": list[str],           # A list of strings representing the subjects
-        "enrollments": [                 # A list of enrollment records
-            {
-                "student_id": str,       # A 9-character string representing the student ID
-                "rank": int,             # The rank of the student
-                "contest_score": float,  # The contest score of the student
-                "subject_scores": list[float]  # A list of float values representing subject scores with the same order as the subjects
-            }
+
+def insert_grant_records(cursor, records):
+    """
+    Insert grant records, without committing.
+
+    :param cursor: Cursor of an open connection.
+    :param records: List of tuples containing (student_id, grant_score, percentage, subject, year)
+    """
+    subject_ids = get_subject_ids(cursor, {subject_name for _, _, _, subject_name, _ in records})
+    cursor.executemany("""
+        INSERT INTO grant (student_id, grant_score, grant_amount, subject_id, year)
+            VALUES (?, ?, ?, ?, ?);""",
+        [
+            (student_id, grant_score, grant_amount, subject_ids[subject_name], year)
+            for student_id, grant_score, grant_amount, subject_name, year in records
         ]
+    )
+    instrumentation.count("db_insert", "rows", len(records))
+
+
+# Load-time settings applied while bulk writing to the database, restored afterwards. They keep
+# a crash during a load from corrupting the database: the year being replaced is rolled back.
+BULK_LOAD_PRAGMAS = {
+    "journal_mode": "TRUNCATE",
+    "synchronous": "NORMAL",
+    "cache_size": -256 * 1024,  # negative value is in KiB, i.e. 256 MiB
+}
+
+# Load-time settings of a database built into a new file, see `fresh_build`. Without a journal,
+# a crash can corrupt the file, which is discarded as it was never renamed into place.
+FRESH_BUILD_PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": -256 * 1024,
+}
+
+# Database files being built by `fresh_build`
+_fresh_build_paths = set()
+
+
+@contextmanager
+def fresh_build(database_path):
+    """
+    Load with `FRESH_BUILD_PRAGMAS` into the database file for the duration of the context.
+
+    Only for a new file that replaces the database once it is complete, never the database in use.
+    """
+    database_path = os.path.abspath(database_path)
+    _fresh_build_paths.add(database_path)
+    try:
+        yield
+    finally:
+        _fresh_build_paths.discard(database_path)
+
+
+@contextmanager
+def bulk_load_settings(connection):
+    """
+    Apply `BULK_LOAD_PRAGMAS`, or `FRESH_BUILD_PRAGMAS` to a database file being built by
+    `fresh_build`, to the connection for the duration of a load, then restore them.
+
+    Must be entered outside of an open transaction, journal mode cannot be changed inside one.
+    A database in WAL mode stays in it: WAL is crash safe, and leaving it needs all other
+    connections closed, e.g. readers of the service or the data version connection of `src.db.analysis`.
+    """
+    database_path = connection.execute("PRAGMA database_list;").fetchone()[2]
+    pragmas = FRESH_BUILD_PRAGMAS if os.path.abspath(database_path) in _fresh_build_paths else BULK_LOAD_PRAGMAS
+
+    previous = {
+        pragma: connection.execute(f"PRAGMA {pragma};").fetchone()[0]
+        for pragma in pragmas
     }
+    if previous["journal_mode"] == "wal":
+        del previous["journal_mode"]
+
+    for pragma in previous:
+        connection.execute(f"PRAGMA {pragma} = {pragmas[pragma]};")
+
+    try:
+        yield connection
+    finally:
+        if connection.in_transaction:
+            connection.rollback()
+
+        for pragma, value in previous.items():
+            connection.execute(f"PRAGMA {pragma} = {value};")
+
+
+def iter_batches(records, batch_size):
+    """
+    Group an iterable of records into lists of at most `batch_size` records.
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def insert_enrollment_batch(cursor, records):
+    """
+    Insert a batch of faculty enrollment groups, without committing.
+
+    Batch columns are flattened into per-table row lists and written with one `executemany`
+    per table.
+
+    :param cursor: Cursor of an open connection.
+    :param records: List of `EnrollmentBatch` faculty enrollment groups.
+    :return: Tuple of inserted (enrollment rows, result rows) counts.
+    """
+    universities = {}
+    faculties = {}
+    enrollment_rows = []
+    result_rows = []
+
+    subject_ids = get_subject_ids(cursor, {subject_name for batch in records for subject_name in batch.subject_names})
+    for batch in records:
+        universities.setdefault(batch.university_id, (batch.university_id, batch.university_name))
+        faculties.setdefault(batch.faculty_id, (batch.faculty_id, batch.faculty_name, batch.university_id))
+
+        enrollment_rows.extend(zip(
+            batch.student_ids.tolist(), itertools.repeat(batch.faculty_id), batch.contest_scores.tolist(),
+            batch.ranks.tolist(), itertools.repeat(batch.year),
+        ))
+        for subject_name, student_ids, scaled_scores in batch.iter_result_columns():
+            result_rows.extend(zip(
+                student_ids.tolist(), itertools.repeat(subject_ids[subject_name]), scaled_scores.tolist()
+            ))
+
+    # Insert university and faculty if they do not exist
+    cursor.executemany("""
+        INSERT OR IGNORE INTO university (id, name)
+            VALUES (?, ?);""", universities.values()
+    )
+    cursor.executemany("""
+        INSERT OR IGNORE INTO faculty (id, name, university_id)
+            VALUES (?, ?, ?);""", faculties.values()
+    )
+
+    cursor.executemany("""
+        INSERT INTO enrollment (student_id, faculty_id, contest_score, rank, year)
+            VALUES (?, ?, ?, ?, ?);""", enrollment_rows
+    )
+    cursor.executemany("""
+        INSERT INTO result (enrollment_id, subject_id, scaled_score)
+            VALUES (?, ?, ?);""", result_rows
+    )
+    instrumentation.count("db_insert", "rows", len(enrollment_rows) + len(result_rows))
+
+    return len(enrollment_rows), len(result_rows)
+
+
+def get_ingested_file_hash(kind, year):
+    """
+    Fetch the hash of the source file last ingested for a kind and year.
+
+    :param kind: 'enrollment' or 'grant'.
+    :param year: Year of the source file.
+    :return: SHA-256 hex digest of the ingested file, or None if the year was never ingested.
+    """
+    connection = instrumentation.connect(config.DATABASE_PATH)
+    row = connection.execute("""
+        SELECT file_hash FROM ingestion WHERE kind = ? AND year = ?;""", (kind, year)
+    ).fetchone()
+    connection.close()
+
+    return row[0] if row else None
+
+
+def record_ingestion(cursor, kind, year, source_file, file_hash, enrollment_count=0, result_count=0, grant_count=0):
+    """
+    Insert or replace the manifest row of an ingested source file and bump the data version, without committing.
+    """
+    cursor.execute("""
+        INSERT OR REPLACE INTO ingestion
+            (kind, year, source_file, file_hash, enrollment_count, result_count, grant_count, ingested_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP);""",
+        (kind, year, source_file, file_hash, enrollment_count, result_count, grant_count)
+    )
+    bump_data_version(cursor)
+
+
+def get_data_version(cursor):
+    """
+    Fetch the version of the data, see `bump_data_version`.
+    """
+    return cursor.execute("SELECT version FROM data_version WHERE id = 0;").fetchone()[0]
+
+
+def bump_data_version(cursor):
+    """
+    Increment the version of the data, without committing. Called in the transaction of every
+    write of the tables the analysis lookups read, by `record_ingestion` and the exam calibration,
+    results cached for the previous version are not used anymore.
+    """
+    cursor.execute("UPDATE data_version SET version = version + 1 WHERE id = 0;")
+
+
+def refresh_faculty_thresholds(cursor, year):
+    """
+    Recompute `faculty_threshold` and `faculty_rank_curve` rows of a year, without committing.
     """
-    # Connect to SQLite database
-    connection = sqlite3.connect(config.DATABASE_PATH)
+    cursor.execute("DELETE FROM faculty_threshold WHERE year = ?;", (year,))
+    cursor.execute("""
+        INSERT INTO faculty_threshold (faculty_id, year, min_contest_score, max_contest_score, last_rank, enrolled)
+        SELECT faculty_id, year, MIN(contest_score), MAX(contest_score), MAX(rank), COUNT(*)
+        FROM enrollment
+        WHERE year = ?
+        GROUP BY faculty_id, year;""", (year,)
+    )
+
+    cursor.execute("DELETE FROM faculty_rank_curve WHERE year = ?;", (year,))
+    cursor.execute("""
+        INSERT INTO faculty_rank_curve (faculty_id, year, contest_score, rank)
+        SELECT faculty_id, year, contest_score, MAX(rank)
+        FROM enrollment
+        WHERE year = ?
+        GROUP BY faculty_id, year, contest_score;""", (year,)
+    )
+
+
+def refresh_grant_thresholds(cursor, year):
+    """
+    Recompute `grant_threshold` rows of a year, without committing.
+    """
+    cursor.execute("DELETE FROM grant_threshold WHERE year = ?;", (year,))
+    cursor.execute("""
+        INSERT INTO grant_threshold (subject_name, year, min_grant_50, min_grant_70, min_grant_100)
+        SELECT subject.name,
+               grant.year,
+               MIN(grant.grant_score) FILTER (WHERE grant.grant_amount = 50),
+               MIN(grant.grant_score) FILTER (WHERE grant.grant_amount = 70),
+               MIN(grant.grant_score) FILTER (WHERE grant.grant_amount = 100)
+        FROM grant
+        JOIN subject ON subject.id = grant.subject_id
+        WHERE grant.year = ?
+        GROUP BY subject.name, grant.year;""", (year,)
+    )
+
+
+def replace_enrollment_year(year, records, source_file, file_hash):
+    """
+    Replace all `enrollment` and `result` rows of a year in a single transaction,
+    and refresh the faculty threshold tables of that year.
+
+    Records are streamed from the iterable into the open transaction in batches, under
+    `bulk_load_settings`. If parsing or insertion fails, the previous rows of the year
+    are left untouched.
+
+    :param year: Year of the enrollment records.
+    :param records: Iterable of `EnrollmentBatch` faculty enrollment groups of that year.
+    :param source_file: File name of the source PDF.
+    :param file_hash: SHA-256 hex digest of the source PDF, recorded in the manifest.
+    """
+    connection = instrumentation.connect(config.DATABASE_PATH)
     cursor = connection.cursor()
 
-    # Insert the records in a batch
-    for record in records:
-        year = record["year"]
-        university_id = record["university_id"]
-        university_name = record["university_name"]
-        faculty_id = record["faculty_id"]
-        faculty_name = record["faculty_name"]
-        subjects = record["subjects"]
-        enrollments = record["enrollments"]
-
-        # Insert university if it does not exist
-        cursor.execute("""
-            INSERT OR IGNORE INTO university (id, name) 
-                VALUES (?, ?);""",(university_id, university_name)
-        )
-
-        # Insert faculty if it does not exist
-        cursor.execute("""
-            INSERT OR IGNORE INTO faculty (id, name, university_id) 
-                VALUES (?, ?, ?);""",(faculty_id, faculty_name, university_id)
-                       )
-
-        # Map the subjects to database representation with mapping
-        # find value of matching key.split()[0]
-        mapping_subjects = constants.SUBJECTS_KA_TO_EN_MAPPING.keys()
-        for i in range(len(subjects)):
-            subject_name = subjects[i]
-
-            for key in mapping_subjects:
-                if key.split()[0] == subject_name:
-                    subjects[i] = constants.SUBJECTS_KA_TO_EN_MAPPING[key]
-                    break
-
-        # Iterate and insert enrollments of a group
-        for enrollment in enrollments:
-            student_id = enrollment["student_id"]
-            rank = enrollment["rank"]
-            contest_score = enrollment["contest_score"]
-            subject_scores = enrollment["subject_scores"]
-
-            # Insert enrollment record
-            cursor.execute("""
-                INSERT INTO enrollment (student_id, faculty_id, contest_score, rank, year) 
-                    VALUES (?, ?, ?, ?, ?);""",(student_id, faculty_id, contest_score, rank, year)
-            )
-
-            # Insert subject scores
-            for subject, score in zip(subjects, subject_scores):
+    try:
+        with bulk_load_settings(connection):
+            with instrumentation.stage("db_insert"):
                 cursor.execute("""
-                    INSERT INTO result (enrollment_id, subject_name, scaled_score) 
-                        VALUES (?, ?, ?);""",(student_id, subject, score)
+                    DELETE FROM result
+                    WHERE enrollment_id IN (SELECT student_id FROM enrollment WHERE year = ?);""", (year,)
                 )
+                cursor.execute("DELETE FROM enrollment WHERE year = ?;", (year,))
 
+            # Records are pulled outside of the stage, parsing them is timed by its own stages
+            enrollment_count = result_count = 0
+            for batch in iter_batches(records, config.INSERT_BATCH_SIZE):
+                with instrumentation.stage("db_insert"):
+                    inserted_enrollments, inserted_results = insert_enrollment_batch(cursor, batch)
+                enrollment_count += inserted_enrollments
+                result_count += inserted_results
 
-    # Commit and close the connection
-    connection.commit()
-    connection.close()
-    print(f"{len(records)} records inserted successfully")
+            with instrumentation.stage("threshold_refresh"):
+                refresh_faculty_thresholds(cursor, year)
+            with instrumentation.stage("db_insert"):
+                record_ingestion(cursor, "enrollment", year, source_file, file_hash,
+                                 enrollment_count=enrollment_count, result_count=result_count)
+                connection.commit()
+    finally:
+        connection.close()
+
+    logger.info("%d: %d enrollments and %d results replaced successfully", year, enrollment_count, result_count)
+
+
+def replace_grant_year(year, records, source_file, file_hash):
+    """
+    Replace all `grant` rows of a year in a single transaction,
+    and refresh the grant thresholds of that year.
+
+    :param year: Year of the grant records.
+    :param records: List of tuples containing (student_id, grant_score, percentage, subject, year)
+    :param source_file: File name of the source PDF.
+    :param file_hash: SHA-256 hex digest of the source PDF, recorded in the manifest.
+    """
+    connection = instrumentation.connect(config.DATABASE_PATH)
+    cursor = connection.cursor()
+
+    try:
+        with instrumentation.stage("db_insert"):
+            cursor.execute("DELETE FROM grant WHERE year = ?;", (year,))
+            insert_grant_records(cursor, records)
+
+        with instrumentation.stage("threshold_refresh"):
+            refresh_grant_thresholds(cursor, year)
+        with instrumentation.stage("db_insert"):
+            record_ingestion(cursor, "grant", year, source_file, file_hash, grant_count=len(records))
+            connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    logger.info("%d: %d grant records replaced successfully", year, len(records))
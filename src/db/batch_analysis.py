@@ -0,0 +1,190 @@
+import numpy as np
+
+from src import config, instrumentation
+from src.db import scoring
+
+# Default column order of the `student_points` and `weights` arrays
+SUBJECTS = ("MATHEMATICS", "FOREIGN LANGUAGE", "GEORGIAN LANGUAGE")
+
+
+def load_exam_parameters(cursor, subjects=SUBJECTS):
+    """
+    Load per-year mean and standard deviation of the subjects.
+
+    :return: Tuple of (years, mean, standard_deviation), the latter two shaped (years, subjects).
+        Values missing in the `exam` table are NaN.
+    """
+    rows = cursor.execute(f"""
+        SELECT year, subject_name, mean, standard_deviation
+        FROM exam
+        WHERE subject_name IN ({", ".join("?" * len(subjects))})
+        ORDER BY year;""", subjects
+    ).fetchall()
+
+    years = np.array(sorted({year for year, _, _, _ in rows}), dtype=np.int64)
+    mean = np.full((len(years), len(subjects)), np.nan)
+    standard_deviation = np.full((len(years), len(subjects)), np.nan)
+
+    year_index = {int(year): i for i, year in enumerate(years)}
+    for year, subject_name, subject_mean, subject_sd in rows:
+        j = subjects.index(subject_name)
+        mean[year_index[year], j] = np.nan if subject_mean is None else subject_mean
+        standard_deviation[year_index[year], j] = np.nan if subject_sd is None else subject_sd
+
+    return years, mean, standard_deviation
+
+
+def load_grant_cutoffs(cursor, years, subject_name):
+    """
+    Load grant scores and amounts of a subject per year, sorted ascending.
+
+    Ties are ordered by grant amount, the same order the clustered `grant` table is scanned in.
+
+    :return: List with a (grant_scores, grant_amounts) tuple of arrays for each year.
+    """
+    cutoffs = []
+    for year in years:
+        rows = cursor.execute("""
+            SELECT grant_score, grant_amount
+            FROM grant
+            WHERE subject_id = (SELECT id FROM subject WHERE name = ?) AND year = ?
+            ORDER BY grant_score, grant_amount;""", (subject_name, int(year))
+        ).fetchall()
+
+        scores = np.array([score for score, _ in rows], dtype=np.float64)
+        amounts = np.array([amount for _, amount in rows], dtype=np.float64)
+        cutoffs.append((scores, amounts))
+
+    return cutoffs
+
+
+def load_contest_scores(cursor, faculty_ids, years):
+    """
+    Load sorted contest scores and ranks of enrolled students per faculty and year.
+
+    Ties are ordered by rank, the same order the clustered `enrollment` table is scanned in.
+
+    :return: Nested list indexed [faculty][year] of (contest_scores, ranks) tuples of arrays.
+    """
+    faculty_index = {str(faculty_id): i for i, faculty_id in enumerate(faculty_ids)}
+    year_index = {int(year): i for i, year in enumerate(years)}
+
+    grouped = [[([], []) for _ in years] for _ in faculty_ids]
+    rows = cursor.execute(f"""
+        SELECT faculty_id, year, contest_score, rank
+        FROM enrollment
+        WHERE faculty_id IN ({", ".join("?" * len(faculty_index))})
+        ORDER BY faculty_id, year, contest_score, rank;""", list(faculty_index)
+    )
+    for faculty_id, year, contest_score, rank in rows:
+        if year not in year_index:
+            continue
+
+        scores, ranks = grouped[faculty_index[faculty_id]][year_index[year]]
+        scores.append(contest_score)
+        ranks.append(rank)
+
+    return [
+        [(np.array(scores, dtype=np.float64), np.array(ranks, dtype=np.float64)) for scores, ranks in faculty]
+        for faculty in grouped
+    ]
+
+
+def lookup_below(sorted_values, payload, queries):
+    """
+    For each query, the payload of the greatest value strictly below it (last one among ties).
+
+    :return: Array shaped like `queries`, NaN where no value is below the query and where the
+        query is NaN, e.g. a score of a year with missing exam parameters.
+    """
+    queries = np.asarray(queries, dtype=np.float64)
+    result = np.full(queries.shape, np.nan)
+    if len(sorted_values) == 0:
+        return result
+
+    # NaN sorts after every value, it would find the last one
+    positions = np.searchsorted(sorted_values, queries, side="left") - 1
+    found = (positions >= 0) & ~np.isnan(queries)
+    result[found] = payload[positions[found]]
+    return result
+
+
+def weighted_sum(scaled_scores, weights):
+    """
+    Sum of weighted scaled scores over the subject axis, accumulated in subject order.
+    """
+    total = scaled_scores[..., 0] * weights[..., 0]
+    for j in range(1, scaled_scores.shape[-1]):
+        total = total + scaled_scores[..., j] * weights[..., j]
+    return total
+
+
+def batch_check_historical_data(faculty_ids, student_points, weights, subjects=SUBJECTS, grant_subject=None):
+    """
+    Vectorized `analysis.check_historical_data` for many students and faculties at once.
+
+    Exam parameters, grant cutoffs and contest scores are loaded once, scores are then
+    computed with broadcasting and ranks and grant amounts looked up with `searchsorted`.
+    Results agree with the SQL path, scores up to the rounding of the sum: SQLite 3.43 and
+    later sum with compensated summation, the scores here are summed in subject order.
+
+    :param faculty_ids: Sequence of F faculty IDs.
+    :param student_points: Raw points shaped (S, subjects), columns ordered as `subjects`.
+    :param weights: Subject coefficients shaped (F, subjects) per faculty, or (subjects,) for all faculties.
+    :param subjects: Subject names of the columns, any combination of subjects.
+    :param grant_subject: Subject of the grant lookup, defaults to the first elective subject.
+    :return: Dictionary of columnar results:
+        "years" (Y,), "faculty_ids" (F,),
+        "grant_score" (S, Y), "grant_amount" (S, Y),
+        "contest_score" (S, F, Y), "rank" (S, F, Y),
+        "total_enrolled" (F, Y).
+        Grant amount and rank are NaN where the SQL path returns NULL, scores are NaN on
+        years the SQL path leaves out for missing exam parameters.
+    """
+    faculty_ids = list(faculty_ids)
+    subjects = tuple(subjects)
+
+    # Reorder columns to the canonical subject order, scores are summed in that order
+    canonical_subjects = scoring.normalize_subjects(subjects)
+    columns = [subjects.index(subject) for subject in canonical_subjects]
+    if grant_subject is None:
+        grant_subject = scoring.get_grant_subject(canonical_subjects)
+    grant_weights = np.asarray(scoring.get_grant_coefficients(canonical_subjects, grant_subject), dtype=np.float64)
+
+    student_points = np.asarray(student_points, dtype=np.float64).reshape(-1, len(subjects))[:, columns]
+    weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), (len(faculty_ids), len(subjects)))[:, columns]
+
+    connection = instrumentation.connect(config.DATABASE_PATH)
+    cursor = connection.cursor()
+    years, mean, standard_deviation = load_exam_parameters(cursor, canonical_subjects)
+    grant_cutoffs = load_grant_cutoffs(cursor, years, grant_subject) if grant_subject else None
+    contest_scores = load_contest_scores(cursor, faculty_ids, years)
+    connection.close()
+
+    # Scaled scores shaped (S, Y, subjects)
+    scaled = 15.0 * ((student_points[:, None, :] - mean[None, :, :]) / standard_deviation[None, :, :]) + 150
+
+    grant_score = weighted_sum(scaled, grant_weights) * 10
+    # Contest scores shaped (S, F, Y)
+    contest_score = weighted_sum(scaled[:, None, :, :], weights[None, :, None, :])
+
+    grant_amount = np.full(grant_score.shape, np.nan)
+    for y, (scores, amounts) in enumerate(grant_cutoffs or []):
+        grant_amount[:, y] = lookup_below(scores, amounts, grant_score[:, y])
+
+    rank = np.full(contest_score.shape, np.nan)
+    total_enrolled = np.zeros((len(faculty_ids), len(years)), dtype=np.int64)
+    for f, faculty_scores in enumerate(contest_scores):
+        for y, (scores, ranks) in enumerate(faculty_scores):
+            rank[:, f, y] = lookup_below(scores, ranks, contest_score[:, f, y])
+            total_enrolled[f, y] = len(scores)
+
+    return {
+        "years": years,
+        "faculty_ids": np.array(faculty_ids),
+        "grant_score": grant_score,
+        "grant_amount": grant_amount,
+        "contest_score": contest_score,
+        "rank": rank,
+        "total_enrolled": total_enrolled,
+    }
@@ -0,0 +1,219 @@
+"""
+Exam calibration: fit mean and standard deviation of every subject and year from the results.
+
+Scaled scores are a linear function of integer raw points rounded to one decimal,
+SP = 15 * ((X - E) / SD) + 150 = a * X + b, so the scaled scores observed for an exam
+lie on a lattice with step a = 15 / SD. Instead of the two extreme scores used by
+`data/seed/calculate_sd_e.sql`, the fit searches the step and offset on which most
+results lie, then refits them by least squares over every result on the lattice.
+The highest observed score is the exam's `max_score`, as in the two-point estimate.
+
+Scaled scores off the lattice (other exam variants, e.g. languages of FOREIGN LANGUAGE)
+are still converted back to the nearest raw point with the fitted parameters.
+
+Usage: python -m src.db.calibration [--force]
+"""
+import logging
+import sys
+
+import numpy as np
+
+from src import config, instrumentation
+from src.db import api
+
+logger = logging.getLogger(__name__)
+
+# Scaled scores are rounded to one decimal, values on the lattice are at most half of it off
+LATTICE_TOLERANCE = 0.05 + 1e-6
+# Searched lattice steps relative to the two-point estimate, and resolution of the search
+STEP_SEARCH_RANGE = (0.8, 1.25)
+STEP_SEARCH_RESOLUTION = 0.0005
+# Most frequent scaled scores tried as a point of the lattice
+LATTICE_ANCHORS = 24
+
+
+def get_stale_years(cursor, force=False):
+    """
+    Years with exam bounds whose results changed since they were last calibrated.
+
+    A year is stale when one of its exams has no calibration row made from the
+    enrollment file currently recorded in the ingestion manifest, or the year was
+    ingested again since.
+    """
+    rows = cursor.execute("""
+        SELECT DISTINCT exam.year
+        FROM exam
+        LEFT JOIN ingestion ON ingestion.kind = 'enrollment' AND ingestion.year = exam.year
+        LEFT JOIN calibration ON calibration.subject_name = exam.subject_name AND calibration.year = exam.year
+        WHERE exam.max_score IS NOT NULL
+          AND exam.min_score IS NOT NULL
+          AND (? OR calibration.year IS NULL
+               OR calibration.source_hash IS NOT ingestion.file_hash
+               OR calibration.calibrated_at < ingestion.ingested_at)
+        ORDER BY exam.year;""", (force,)
+    ).fetchall()
+
+    return [year for (year,) in rows]
+
+
+def load_results(cursor, years):
+    """
+    Load the results of the years into arrays.
+
+    :return: Tuple of (row_keys, years, scaled_scores) arrays, row keys shaped (results, 2)
+        holding the (enrollment_id, subject_id) primary key of each result.
+    """
+    rows = cursor.execute(f"""
+        SELECT r.enrollment_id, r.subject_id, e.year, r.scaled_score
+        FROM result r
+        JOIN enrollment e ON e.student_id = r.enrollment_id
+        WHERE e.year IN ({", ".join("?" * len(years))});""", years
+    ).fetchall()
+
+    if not rows:
+        return np.empty((0, 2), dtype=np.int64), np.array([], dtype=np.int64), np.array([])
+
+    enrollment_ids, subject_ids, result_years, scaled_scores = zip(*rows)
+    return (
+        np.column_stack((enrollment_ids, subject_ids)).astype(np.int64),
+        np.array(result_years, dtype=np.int64),
+        np.array(scaled_scores, dtype=np.float64),
+    )
+
+
+def fit_lattice(values, counts, min_score, max_score):
+    """
+    Fit the raw-score lattice of one exam.
+
+    :param values: Distinct scaled scores, sorted ascending.
+    :param counts: Number of results with each scaled score.
+    :param min_score: Minimum raw score of the exam (barrier).
+    :param max_score: Maximum raw score of the exam.
+    :return: Tuple of (a, b, lattice_share) with SP = a * X + b, or None if no lattice is found.
+    """
+    if len(values) < 2 or max_score <= min_score:
+        return None
+
+    # Two-point estimate of the step, the extremes of the observed scores
+    step_estimate = (values[-1] - values[0]) / (max_score - min_score)
+    steps = np.arange(
+        STEP_SEARCH_RANGE[0] * step_estimate, STEP_SEARCH_RANGE[1] * step_estimate, STEP_SEARCH_RESOLUTION
+    )
+    anchors = values[np.argsort(counts, kind="stable")[-LATTICE_ANCHORS:]]
+
+    # Distance of each value to the lattice of each (step, anchor) candidate, shaped (steps, anchors, values)
+    positions = (values[None, None, :] - anchors[None, :, None]) / steps[:, None, None]
+    distances = np.abs(positions - np.rint(positions)) * steps[:, None, None]
+    on_lattice_counts = ((distances <= LATTICE_TOLERANCE) * counts).sum(axis=-1)
+
+    best_step, best_anchor = np.unravel_index(on_lattice_counts.argmax(), on_lattice_counts.shape)
+    on_lattice = distances[best_step, best_anchor] <= LATTICE_TOLERANCE
+
+    # Lattice points relative to the anchor
+    points = np.rint(positions[best_step, best_anchor, on_lattice])
+    if len(np.unique(points)) < 2:
+        return None
+
+    a, b = np.polyfit(points, values[on_lattice], 1)
+    # The highest observed score, on the lattice or not, is the maximum raw score
+    top_point = np.rint((values[-1] - b) / a)
+    b -= a * (max_score - top_point)
+
+    lattice_share = counts[on_lattice].sum() / counts.sum()
+    return a, b, lattice_share
+
+
+def to_raw_scores(scaled_scores, a, b, min_score, max_score):
+    """
+    Convert scaled scores to the nearest raw points within the exam bounds.
+    """
+    return np.clip(np.rint((scaled_scores - b) / a), min_score, max_score)
+
+
+@instrumentation.stage("calibration")
+def calibrate(years=None, force=False):
+    """
+    Calibrate exams of changed years: update `exam` mean and standard deviation,
+    backfill `result.raw_score` and record the calibration, in a single transaction.
+
+    :param years: Years to calibrate, defaults to the stale years, see `get_stale_years`.
+    :param force: Recalibrate all years with exam bounds.
+    :return: List of calibrated (subject_name, year) tuples.
+    """
+    connection = instrumentation.connect(config.DATABASE_PATH)
+    cursor = connection.cursor()
+
+    try:
+        if years is None:
+            years = get_stale_years(cursor, force)
+        years = list(years)
+        if not years:
+            logger.info("Exam calibration is up to date.")
+            return []
+
+        exams = cursor.execute(f"""
+            SELECT exam.subject_name, subject.id, exam.year, exam.min_score, exam.max_score, ingestion.file_hash
+            FROM exam
+            JOIN subject ON subject.name = exam.subject_name
+            LEFT JOIN ingestion ON ingestion.kind = 'enrollment' AND ingestion.year = exam.year
+            WHERE exam.max_score IS NOT NULL
+              AND exam.min_score IS NOT NULL
+              AND exam.year IN ({", ".join("?" * len(years))})
+            ORDER BY exam.year, exam.subject_name;""", years
+        ).fetchall()
+
+        row_keys, result_years, scaled_scores = load_results(cursor, years)
+        raw_scores = np.full(len(row_keys), np.nan)
+
+        exam_rows = []
+        calibration_rows = []
+        for subject_name, subject_id, year, min_score, max_score, source_hash in exams:
+            selected = (row_keys[:, 1] == subject_id) & (result_years == year)
+            values, counts = np.unique(scaled_scores[selected], return_counts=True)
+
+            fit = fit_lattice(values, counts, min_score, max_score)
+            if fit is None:
+                logger.warning("%s %d: no raw-score lattice found, skipped", subject_name, year)
+                continue
+
+            a, b, lattice_share = fit
+            raw_scores[selected] = to_raw_scores(scaled_scores[selected], a, b, min_score, max_score)
+
+            mean, standard_deviation = (150 - b) / a, 15 / a
+            exam_rows.append((float(mean), float(standard_deviation), subject_name, year))
+            calibration_rows.append((subject_name, year, source_hash, len(values), float(lattice_share)))
+            logger.debug("%s %d: E=%.3f SD=%.3f, %.0f%% of %d results on the lattice",
+                         subject_name, year, mean, standard_deviation, lattice_share * 100, counts.sum())
+
+        calibrated = ~np.isnan(raw_scores)
+        with api.bulk_load_settings(connection):
+            cursor.executemany("""
+                UPDATE exam SET mean = ?, standard_deviation = ?
+                WHERE subject_name = ? AND year = ?;""", exam_rows
+            )
+            cursor.executemany(
+                "UPDATE result SET raw_score = ? WHERE enrollment_id = ? AND subject_id = ?;",
+                zip(raw_scores[calibrated].tolist(), *row_keys[calibrated].T.tolist())
+            )
+            cursor.executemany("""
+                INSERT OR REPLACE INTO calibration
+                    (subject_name, year, source_hash, observed_values, lattice_share, calibrated_at)
+                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP);""", calibration_rows
+            )
+            # Contest and grant scores of cached lookups depend on the exam parameters
+            api.bump_data_version(cursor)
+            connection.commit()
+    finally:
+        connection.close()
+
+    logger.info("%d exams calibrated, %d raw scores backfilled", len(calibration_rows), int(calibrated.sum()))
+    return [(subject_name, year) for subject_name, year, _, _, _ in calibration_rows]
+
+
+def main():
+    with instrumentation.run("calibration"):
+        calibrate(force="--force" in sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+Cross-faculty ranking: score every faculty for one student's raw points in a single call.
+
+Contest subjects and coefficients of faculties are not published with the enrollment
+lists, they are inferred from the results of enrolled students into `faculty_subject`:
+a contest score is the weighted sum of the student's scaled scores, so the integer
+coefficients that reproduce the contest scores of a faculty's students are searched,
+first pooled over all years of the faculty, then per year where they changed.
+
+Rankings are served from a `CutoffMatrix` loaded once per database state: per faculty
+and year the subject weights, the cutoff (contest score of the last enrolled student)
+and the grant subject, with per-year exam parameters and grant tier cutoffs. Scoring
+all faculties for a student is a few broadcast NumPy operations over that matrix.
+
+Usage: python -m src.db.cross_faculty [--refresh] [--force]
+"""
+import itertools
+import logging
+import sys
+import threading
+
+import numpy as np
+
+from src import config, constants, instrumentation
+from src.db import scoring
+
+logger = logging.getLogger(__name__)
+
+# Contest scores are rounded to one decimal, reproduced ones are at most this far off
+WEIGHT_FIT_TOLERANCE = 0.11
+# Share of students the weights must reproduce to be accepted without a search
+WEIGHT_FIT_SHARE = 0.9
+# Searched coefficients range from 0 to this, for faculties of at most `MAX_SEARCHED_SUBJECTS` subjects
+MAX_WEIGHT = 10
+MAX_SEARCHED_SUBJECTS = 5
+
+# Grant amounts, in the order their cutoffs are compared from the highest
+GRANT_TIERS = (100, 70, 50)
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+def get_stale_years(cursor, force=False):
+    """
+    Enrollment years ingested since their faculty subjects were last inferred.
+    """
+    rows = cursor.execute("""
+        SELECT ingestion.year
+        FROM ingestion
+        WHERE ingestion.kind = 'enrollment'
+          AND (? OR ingestion.ingested_at >= COALESCE(
+                   (SELECT MIN(inferred_at) FROM faculty_subject WHERE faculty_subject.year = ingestion.year), ''))
+        ORDER BY ingestion.year;""", (force,)
+    ).fetchall()
+
+    return [year for (year,) in rows]
+
+
+def iter_faculty_results(cursor, years):
+    """
+    Yield scaled scores and contest scores of the enrolled students of each faculty with enrollments in the years.
+
+    :return: Iterator of (faculty_id, subjects, scaled_scores, contest_scores, student_years), scaled
+        scores shaped (students, subjects) with 0 for subjects a student did not take.
+    """
+    subject_names = dict(cursor.execute("SELECT id, name FROM subject;").fetchall())
+    rows = cursor.execute(f"""
+        SELECT enrollment.faculty_id, enrollment.student_id, enrollment.year, enrollment.contest_score,
+               result.subject_id, result.scaled_score
+        FROM enrollment
+        JOIN result ON result.enrollment_id = enrollment.student_id
+        WHERE enrollment.faculty_id IN (
+            SELECT DISTINCT faculty_id FROM enrollment WHERE year IN ({", ".join("?" * len(years))})
+        )
+        ORDER BY enrollment.faculty_id, enrollment.student_id;""", list(years)
+    )
+
+    for faculty_id, faculty_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        students = {}
+        for _, student_id, year, contest_score, subject_id, scaled_score in faculty_rows:
+            student = students.setdefault(student_id, (year, contest_score, {}))
+            student[2][subject_names[subject_id]] = scaled_score
+
+        subjects = tuple(sorted({subject for _, _, scores in students.values() for subject in scores}))
+        scaled_scores = np.array(
+            [[scores.get(subject, 0.0) for subject in subjects] for _, _, scores in students.values()]
+        ).reshape(len(students), len(subjects))
+        contest_scores = np.array([contest_score for _, contest_score, _ in students.values()])
+        student_years = np.array([year for year, _, _ in students.values()])
+
+        yield faculty_id, subjects, scaled_scores, contest_scores, student_years
+
+
+def get_fit_share(scaled_scores, contest_scores, weights):
+    """
+    Share of students whose contest score the weights reproduce, for each row of `weights`.
+    """
+    reproduced = np.atleast_2d(weights) @ scaled_scores.T
+    return (np.abs(reproduced - contest_scores) <= WEIGHT_FIT_TOLERANCE).mean(axis=1)
+
+
+def fit_weights(scaled_scores, contest_scores, reference=None):
+    """
+    Integer coefficients reproducing contest scores from scaled scores.
+
+    Least squares coefficients are rounded; when they reproduce too few contest scores
+    (e.g. too few students to determine them), every integer combination is tried and
+    the best one closest to `reference` kept.
+
+    :param reference: Coefficients preferred among equally fitting ones, e.g. of other years.
+    :return: Tuple of (weights, fit_share).
+    """
+    weights = np.round(np.linalg.lstsq(scaled_scores, contest_scores, rcond=None)[0])
+    fit_share = get_fit_share(scaled_scores, contest_scores, weights)[0]
+    if fit_share >= WEIGHT_FIT_SHARE or scaled_scores.shape[1] > MAX_SEARCHED_SUBJECTS:
+        return weights, fit_share
+
+    candidates = np.array(list(itertools.product(range(MAX_WEIGHT + 1), repeat=scaled_scores.shape[1])), dtype=float)
+    shares = get_fit_share(scaled_scores, contest_scores, candidates)
+    best = np.flatnonzero(shares == shares.max())
+    if reference is None:
+        reference = weights
+    closest = best[np.argmin(np.abs(candidates[best] - reference).sum(axis=1))]
+
+    return candidates[closest], shares[closest]
+
+
+def refresh_faculty_subjects(years=None, force=False):
+    """
+    Infer subjects and coefficients of faculties of changed years into `faculty_subject`.
+
+    :param years: Years to infer, defaults to the stale years, see `get_stale_years`.
+    :param force: Infer all ingested years.
+    :return: Number of inferred faculty years.
+    """
+    connection = instrumentation.connect(config.DATABASE_PATH)
+    cursor = connection.cursor()
+
+    try:
+        if years is None:
+            years = get_stale_years(cursor, force)
+        years = list(years)
+        if not years:
+            logger.info("Faculty subjects are up to date.")
+            return 0
+
+        rows = []
+        faculty_years = poorly_fitted = 0
+        with instrumentation.stage("faculty_subject_inference"):
+            for faculty_id, subjects, scaled_scores, contest_scores, student_years in iter_faculty_results(cursor, years):
+                pooled, _ = fit_weights(scaled_scores, contest_scores)
+
+                for year in np.unique(student_years):
+                    if year not in years:
+                        continue
+
+                    selected = student_years == year
+                    weights, fit_share = pooled, get_fit_share(scaled_scores[selected], contest_scores[selected], pooled)[0]
+                    if fit_share < WEIGHT_FIT_SHARE:
+                        weights, fit_share = fit_weights(scaled_scores[selected], contest_scores[selected], pooled)
+
+                    faculty_years += 1
+                    poorly_fitted += fit_share < WEIGHT_FIT_SHARE
+                    rows.extend(
+                        (faculty_id, int(year), subject, float(weight), float(fit_share))
+                        for subject, weight in zip(subjects, weights) if weight > 0
+                    )
+
+        cursor.execute(f"DELETE FROM faculty_subject WHERE year IN ({', '.join('?' * len(years))});", years)
+        cursor.executemany("""
+            INSERT INTO faculty_subject (faculty_id, year, subject_name, weight, fit_share, inferred_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP);""", rows
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+    logger.info("Subjects of %d faculty years inferred, %d reproduce less than %.0f%% of contest scores",
+                faculty_years, poorly_fitted, WEIGHT_FIT_SHARE * 100)
+    return faculty_years
+
+
+def get_source(cursor):
+    """
+    State of the tables the cutoff matrix is built from, it is rebuilt when it changes.
+    """
+    return cursor.execute("""
+        SELECT (SELECT group_concat(kind || year || file_hash || ingested_at) FROM ingestion),
+               (SELECT MAX(calibrated_at) FROM calibration),
+               (SELECT MAX(inferred_at) FROM faculty_subject);"""
+    ).fetchone()
+
+
+class CutoffMatrix:
+    """
+    Per faculty and year subject weights, cutoffs and grant subjects, with the per-year
+    exam parameters and grant tier cutoffs needed to score a student against all of them.
+    """
+
+    def __init__(self, cursor):
+        """
+        Load the matrix from the database.
+
+        :param cursor: Cursor of an open connection.
+        """
+        self.source = get_source(cursor)
+        self.subjects = scoring.SUBJECT_ORDER
+        subject_index = {subject: j for j, subject in enumerate(self.subjects)}
+
+        faculties = cursor.execute("""
+            SELECT faculty.id, faculty.name, university.id, university.name
+            FROM faculty
+            JOIN university ON university.id = faculty.university_id
+            WHERE faculty.id IN (SELECT faculty_id FROM faculty_subject)
+            ORDER BY faculty.id;"""
+        ).fetchall()
+        self.faculty_ids = [faculty_id for faculty_id, _, _, _ in faculties]
+        self.faculty_names = [name for _, name, _, _ in faculties]
+        self.university_ids = np.array([str(university_id) for _, _, university_id, _ in faculties], dtype=object)
+        self.university_names = [name for _, _, _, name in faculties]
+        faculty_index = {faculty_id: f for f, faculty_id in enumerate(self.faculty_ids)}
+
+        self.years = np.array([year for (year,) in cursor.execute(
+            "SELECT DISTINCT year FROM faculty_subject ORDER BY year;"
+        )], dtype=np.int64)
+        year_index = {int(year): y for y, year in enumerate(self.years)}
+        shape = (len(self.faculty_ids), len(self.years))
+
+        # Subject weights shaped (F, Y, S)
+        self.weights = np.zeros(shape + (len(self.subjects),))
+        unscorable = np.zeros(shape, dtype=bool)
+        for faculty_id, year, subject_name, weight, fit_share in cursor.execute(
+                "SELECT faculty_id, year, subject_name, weight, fit_share FROM faculty_subject;"):
+            # Subjects not mapped by the parsers can not be scored from a student's points, and weights
+            # reproducing too few contest scores (e.g. of faculties with their own exams) are not trusted
+            if subject_name not in subject_index or fit_share < WEIGHT_FIT_SHARE:
+                unscorable[faculty_index[faculty_id], year_index[year]] = True
+                continue
+            self.weights[faculty_index[faculty_id], year_index[year], subject_index[subject_name]] = weight
+
+        self.cutoffs = np.full(shape, np.nan)
+        for faculty_id, year, min_contest_score in cursor.execute(
+                "SELECT faculty_id, year, min_contest_score FROM faculty_threshold;"):
+            if faculty_id in faculty_index and year in year_index:
+                self.cutoffs[faculty_index[faculty_id], year_index[year]] = min_contest_score
+        self.cutoffs[unscorable] = np.nan
+
+        # Grant subject of each faculty year, its first elective subject in canonical order (-1 for none)
+        electives = np.array([subject not in constants.MANDATORY_SUBJECTS for subject in self.subjects])
+        weighted_electives = (self.weights > 0) & electives
+        self.grant_subjects = np.where(weighted_electives.any(axis=2), weighted_electives.argmax(axis=2), -1)
+
+        # Exam parameters shaped (Y, S), NaN where missing
+        self.mean = np.full((len(self.years), len(self.subjects)), np.nan)
+        self.standard_deviation = np.full((len(self.years), len(self.subjects)), np.nan)
+        for subject_name, year, mean, standard_deviation in cursor.execute(
+                "SELECT subject_name, year, mean, standard_deviation FROM exam WHERE mean IS NOT NULL;"):
+            if year in year_index and subject_name in subject_index:
+                self.mean[year_index[year], subject_index[subject_name]] = mean
+                self.standard_deviation[year_index[year], subject_index[subject_name]] = standard_deviation
+
+        # Grant tier cutoffs shaped (Y, S, tiers), infinite for tiers never awarded
+        self.grant_cutoffs = np.full((len(self.years), len(self.subjects), len(GRANT_TIERS)), np.inf)
+        for subject_name, year, *tier_cutoffs in cursor.execute(
+                "SELECT subject_name, year, min_grant_100, min_grant_70, min_grant_50 FROM grant_threshold;"):
+            if year in year_index and subject_name in subject_index:
+                self.grant_cutoffs[year_index[year], subject_index[subject_name]] = [
+                    np.inf if cutoff is None else cutoff for cutoff in tier_cutoffs
+                ]
+
+        self.mandatory = np.array([subject in constants.MANDATORY_SUBJECTS for subject in self.subjects])
+
+    def score(self, student_points):
+        """
+        Contest scores, admission margins and grant amounts of a student in every faculty and year.
+
+        :param student_points: Dictionary with student raw points for each subject.
+        :return: Tuple of (contest_score, margin, grant_amount) shaped (F, Y), NaN where the faculty
+            year can not be scored: no cutoff, a subject without points or exam parameters.
+        """
+        unknown = set(student_points).difference(self.subjects)
+        if unknown:
+            raise ValueError(f"Unknown subjects: {', '.join(sorted(unknown))}")
+
+        points = np.array([student_points.get(subject, np.nan) for subject in self.subjects], dtype=np.float64)
+        scaled = 15.0 * ((points - self.mean) / self.standard_deviation) + 150
+
+        required = self.weights > 0
+        scorable = ~(required & np.isnan(scaled)).any(axis=2) & ~np.isnan(self.cutoffs)
+        contest_score = np.einsum("fys,ys->fy", self.weights, np.nan_to_num(scaled))
+        contest_score[~scorable] = np.nan
+        margin = contest_score - self.cutoffs
+
+        # Grant score and amount of each year and grant subject, then picked by the faculty's grant subject
+        mandatory_sum = np.where(self.mandatory, scaled, 0).sum(axis=1)
+        grant_score = (constants.GRANT_SUBJECT_COEFFICIENT * scaled + mandatory_sum[:, None]) * 10
+        # As in `analysis.check_historical_data`, a tier takes a grant score above its lowest one
+        reached = grant_score[:, :, None] > self.grant_cutoffs
+        amounts = np.where(reached.any(axis=2), np.array(GRANT_TIERS)[reached.argmax(axis=2)], 0).astype(np.float64)
+        amounts[np.isnan(grant_score)] = np.nan
+
+        year_indices = np.broadcast_to(np.arange(len(self.years)), self.grant_subjects.shape)
+        grant_amount = np.where(
+            self.grant_subjects >= 0, amounts[year_indices, np.maximum(self.grant_subjects, 0)], np.nan
+        )
+        grant_amount[~scorable] = np.nan
+
+        return contest_score, margin, grant_amount
+
+    def rank(self, student_points, top_k=None, university_ids=None):
+        """
+        Faculties a student can be scored in, sorted by mean admission margin over the years,
+        then by the grant amount of the latest scored year.
+
+        :param student_points: Dictionary with student raw points for each subject.
+        :param top_k: Return at most this many faculties.
+        :param university_ids: Only return faculties of these universities.
+        :return: List of dictionaries with faculty and university, "margin" (mean of contest score
+            minus cutoff over scored years), "min_margin", "admitted_years" (years with a positive
+            margin), "scored_years",
+            "latest_year", "latest_margin" and "grant_amount" of the latest year.
+        """
+        contest_score, margin, grant_amount = self.score(student_points)
+
+        scored = ~np.isnan(margin)
+        selected = scored.any(axis=1)
+        if university_ids is not None:
+            selected &= np.isin(self.university_ids, [str(university_id) for university_id in university_ids])
+
+        faculties = np.flatnonzero(selected)
+        scored = scored[faculties]
+        margin = margin[faculties]
+        mean_margin = np.nanmean(margin, axis=1)
+
+        # Latest scored year of each faculty
+        latest = len(self.years) - 1 - np.argmax(scored[:, ::-1], axis=1)
+        latest_margin = margin[np.arange(len(faculties)), latest]
+        latest_grant = grant_amount[faculties, latest]
+
+        order = np.lexsort((-np.nan_to_num(latest_grant), -mean_margin))
+        if top_k is not None:
+            order = order[:top_k]
+
+        # Per-faculty aggregates of the returned faculties only, converted to Python values at once
+        margin = margin[order]
+        columns = zip(
+            faculties[order].tolist(),
+            mean_margin[order].tolist(),
+            np.nanmin(margin, axis=1).tolist(),
+            # As in `analysis.check_historical_data`, a place takes a contest score above the cutoff
+            np.count_nonzero(margin > 0, axis=1).tolist(),
+            np.count_nonzero(scored[order], axis=1).tolist(),
+            self.years[latest[order]].tolist(),
+            latest_margin[order].tolist(),
+            latest_grant[order].tolist(),
+        )
+
+        return [
+            {
+                "faculty_id": self.faculty_ids[f],
+                "faculty_name": self.faculty_names[f],
+                "university_id": self.university_ids[f],
+                "university_name": self.university_names[f],
+                "margin": mean,
+                "min_margin": minimum,
+                "admitted_years": admitted_years,
+                "scored_years": scored_years,
+                "latest_year": latest_year,
+                "latest_margin": latest_year_margin,
+                "grant_amount": None if np.isnan(grant) else int(grant),
+            }
+            for f, mean, minimum, admitted_years, scored_years, latest_year, latest_year_margin, grant in columns
+        ]
+
+
+def get_matrix(cursor):
+    """
+    Cutoff matrix of the current database state, loaded again when the data changed.
+    """
+    global _matrix
+
+    source = get_source(cursor)
+    with _matrix_lock:
+        if _matrix is None or _matrix.source != source:
+            _matrix = CutoffMatrix(cursor)
+
+        return _matrix
+
+
+def rank_faculties(student_points, top_k=None, university_ids=None, cursor=None):
+    """
+    Score every faculty for a student, see `CutoffMatrix.rank`.
+
+    :param cursor: Cursor of an open connection, defaults to a new connection to the database.
+    """
+    if cursor is not None:
+        return get_matrix(cursor).rank(student_points, top_k, university_ids)
+
+    connection = instrumentation.connect(config.DATABASE_PATH)
+    try:
+        return get_matrix(connection.cursor()).rank(student_points, top_k, university_ids)
+    finally:
+        connection.close()
+
+
+def main():
+    arguments = sys.argv[1:]
+    if "--refresh" in arguments or "--force" in arguments:
+        with instrumentation.run("faculty_subject_inference"):
+            refresh_faculty_subjects(force="--force" in arguments)
+        return
+
+    import time
+
+    student_points = {"MATHEMATICS": 46, "FOREIGN LANGUAGE": 69, "GEORGIAN LANGUAGE": 56}
+    start = time.perf_counter()
+    ranking = rank_faculties(student_points, top_k=10)
+    print(f"Top faculties for {student_points}, in {(time.perf_counter() - start) * 1e3:.1f}ms:")
+    for row in ranking:
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import itertools
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from src import config, instrumentation
+from src.db import analysis, scoring
+
+# Distinguishes in-memory copies of different engines and reloads within a process
+_memory_database_ids = itertools.count()
+
+
+class ConnectionPool:
+    """
+    Connections of one load of the engine. A reload retires the pool: its idle connections are
+    closed at once, borrowed ones when they are returned, and the in-memory copy they read with
+    the last of them.
+    """
+
+    def __init__(self, connections, memory_connection=None):
+        """
+        :param connections: Pooled connections.
+        :param memory_connection: Connection keeping the in-memory copy of the pool alive, if any.
+        """
+        self._idle = list(connections)
+        self._memory_connection = memory_connection
+        self._borrowed = 0
+        self._retired = False
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Borrow a connection, blocks while all connections are in use.
+
+        :return: Connection, or None once the pool is retired.
+        """
+        with self._condition:
+            while not self._idle and not self._retired:
+                self._condition.wait()
+            if self._retired:
+                return None
+
+            self._borrowed += 1
+            return self._idle.pop()
+
+    def release(self, connection):
+        """
+        Return a borrowed connection, it is closed if the pool was retired meanwhile.
+        """
+        with self._condition:
+            self._borrowed -= 1
+            if not self._retired:
+                self._idle.append(connection)
+                self._condition.notify()
+                return
+
+            connection.close()
+            self._close_unused()
+
+    def retire(self):
+        """
+        Close the idle connections, and the borrowed ones when returned. Threads waiting for a
+        connection get None instead.
+        """
+        with self._condition:
+            self._retired = True
+            for connection in self._idle:
+                connection.close()
+            self._idle = []
+            self._close_unused()
+            self._condition.notify_all()
+
+    def _close_unused(self):
+        """
+        Close the in-memory copy once no connection reads it anymore, must hold the lock.
+        """
+        if self._borrowed == 0 and self._memory_connection is not None:
+            self._memory_connection.close()
+            self._memory_connection = None
+
+
+class AnalysisEngine:
+    """
+    Long-lived, read-only access to the analysis queries of `src.db.analysis`.
+
+    Keeps a pool of open connections, either read-only connections to the database
+    file (URI `mode=ro`) or connections to an in-memory copy of it loaded on startup.
+    Connections are reused between calls, so their prepared statements stay cached,
+    threshold lookups are memoized. When the database file is written by another
+    connection (e.g. ingestion), its `PRAGMA data_version` changes and the engine
+    reloads the in-memory copy and drops memoized results on the next call.
+    """
+
+    def __init__(self, database_path=None, in_memory=False, pool_size=None):
+        """
+        :param database_path: Path to the database file, defaults to `config.DATABASE_PATH`.
+        :param in_memory: Load the database into memory instead of reading the file.
+        :param pool_size: Number of pooled connections, defaults to `config.ANALYSIS_POOL_SIZE`.
+        """
+        self.database_path = database_path or config.DATABASE_PATH
+        self.in_memory = in_memory
+        self.pool_size = pool_size or config.ANALYSIS_POOL_SIZE
+
+        self._lock = threading.Lock()
+        # Dedicated connection to the file, watches data version and is the source of in-memory copies
+        self._watch_connection = self._connect(f"file:{quote(self.database_path)}?mode=ro")
+        self._data_version = None
+        self._pool = None
+        self._grant_thresholds = None
+        self._enrollment_thresholds = {}
+
+        with self._lock:
+            self._load()
+
+    @staticmethod
+    def _connect(uri):
+        return instrumentation.connect(uri, uri=True, check_same_thread=False)
+
+    def _read_data_version(self):
+        return self._watch_connection.execute("PRAGMA data_version;").fetchone()[0]
+
+    def _load(self):
+        """
+        (Re)open the connection pool and drop memoized results, must hold the lock.
+
+        The previous pool is retired, its connections are closed once returned, see `ConnectionPool`.
+        """
+        self._data_version = self._read_data_version()
+
+        if self.in_memory:
+            uri = f"file:naec-analysis-{next(_memory_database_ids)}?mode=memory&cache=shared"
+            # Keeps the shared in-memory database alive while the pool is in use
+            memory_connection = self._connect(uri)
+            self._watch_connection.backup(memory_connection)
+        else:
+            uri = f"file:{quote(self.database_path)}?mode=ro"
+            memory_connection = None
+
+        connections = []
+        for _ in range(self.pool_size):
+            connection = self._connect(uri)
+            connection.execute("PRAGMA query_only = 1;")
+            connections.append(connection)
+
+        previous_pool = self._pool
+        self._pool = ConnectionPool(connections, memory_connection)
+        if previous_pool is not None:
+            previous_pool.retire()
+
+        self._grant_thresholds = None
+        self._enrollment_thresholds = {}
+
+    def refresh(self):
+        """
+        Reload if the database changed since it was loaded.
+
+        :return: True if the engine was reloaded.
+        """
+        with self._lock:
+            if self._read_data_version() == self._data_version:
+                return False
+
+            self._load()
+            return True
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection, blocks while all connections are in use.
+        """
+        while True:
+            self.refresh()
+
+            # A pool retired by a reload while waiting for it has no connection to lend, the new one has
+            pool = self._pool
+            connection = pool.acquire()
+            if connection is not None:
+                break
+
+        try:
+            yield connection
+        finally:
+            # Connections of a pool replaced by a reload are returned to the old one and closed with it
+            pool.release(connection)
+
+    def check_historical_data(self, faculty_id, student_points, weights, grant_subject=None):
+        """
+        Pooled `analysis.check_historical_data`.
+        """
+        query, params = scoring.prepare_historical_query(faculty_id, student_points, weights, grant_subject)
+        with self.connection() as connection:
+            return connection.execute(query, params).fetchall()
+
+    def get_grant_thresholds(self):
+        """
+        Pooled and memoized `analysis.get_grant_thresholds`.
+        """
+        with self.connection() as connection:
+            if self._grant_thresholds is None:
+                self._grant_thresholds = connection.execute(analysis.GRANT_THRESHOLDS_QUERY).fetchall()
+
+            return list(self._grant_thresholds)
+
+    def get_enrollment_thresholds(self, faculty_id):
+        """
+        Pooled and memoized `analysis.get_enrollment_thresholds`.
+        """
+        with self.connection() as connection:
+            thresholds = self._enrollment_thresholds.get(faculty_id)
+            if thresholds is None:
+                thresholds = connection.execute(analysis.ENROLLMENT_THRESHOLDS_QUERY, (faculty_id,)).fetchall()
+                self._enrollment_thresholds[faculty_id] = thresholds
+
+            return list(thresholds)
+
+    def close(self):
+        """
+        Close pooled connections, borrowed ones when returned. The engine can not be used afterwards.
+        """
+        with self._lock:
+            self._pool.retire()
+            self._watch_connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
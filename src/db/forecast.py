@@ -0,0 +1,211 @@
+"""
+Monte Carlo forecast of next year's admission and grant chances of a student.
+
+`analysis.check_historical_data` answers what the rank would have been in past years.
+The forecast treats next year's exam parameters and cutoffs as unknown: each subject's
+mean and standard deviation (`exam`), the faculty's cutoff (contest score of its last
+enrolled student, `faculty_threshold` built from `enrollment`) and the grant tier cutoffs
+(`grant_threshold`) are drawn from the Student-t predictive distribution of their past
+values, i.e. a normal model with unknown mean and variance fitted to the observed years.
+
+Every draw scales the student's raw points with the drawn exam parameters, sums them into
+a contest and a grant score, and compares them with the drawn cutoffs. Draws are
+vectorized with NumPy and seeded, the same request always gives the same forecast.
+"""
+import numpy as np
+
+from src import config, instrumentation
+from src.db import batch_analysis, scoring
+
+# Grant amounts, in the order their cutoffs are compared from the highest
+GRANT_TIERS = (100, 70, 50)
+
+# Coverage of the reported score and cutoff intervals
+INTERVAL_COVERAGE = 0.9
+# z-score of the 95% Wilson interval of the Monte Carlo probability estimates
+PROBABILITY_INTERVAL_Z = 1.959964
+
+
+def predictive_draws(rng, history, draws, shared=False):
+    """
+    Draw next values from the Student-t predictive distribution of each column's past values.
+
+    For n observed values with mean m and sample SD s, the next value is distributed as
+    m + s * sqrt(1 + 1/n) * t(n - 1). Columns with a single value are repeated as is.
+
+    :param history: Observed values shaped (years, columns), NaN for missing years.
+    :param draws: Number of draws.
+    :param shared: Use the same t draw for all columns, so they move together.
+    :return: Draws shaped (draws, columns).
+    """
+    history = np.asarray(history, dtype=np.float64)
+    observed = ~np.isnan(history)
+    n = observed.sum(axis=0)
+    if np.any(n == 0):
+        raise ValueError("No observed values to forecast from")
+
+    mean = np.nanmean(history, axis=0)
+    spread = np.zeros(history.shape[1])
+    variable = n >= 2
+    if np.any(variable):
+        spread[variable] = np.nanstd(history[:, variable], axis=0, ddof=1) * np.sqrt(1 + 1 / n[variable])
+
+    # Degrees of freedom are at least 1, the t draws of single-value columns are multiplied by a zero spread
+    if shared:
+        t = rng.standard_t(max(n.min() - 1, 1), size=(draws, 1))
+    else:
+        t = rng.standard_t(np.maximum(n - 1, 1), size=(draws, history.shape[1]))
+    return mean + spread * t
+
+
+def wilson_interval(successes, trials, z=PROBABILITY_INTERVAL_Z):
+    """
+    Wilson score interval of a binomial proportion.
+
+    :return: Tuple of (low, high).
+    """
+    p = successes / trials
+    denominator = 1 + z ** 2 / trials
+    center = (p + z ** 2 / (2 * trials)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    # The bounds are exactly 0 without successes and 1 without failures, rounding misses them by an ulp
+    low = 0.0 if successes == 0 else max(0.0, center - half_width)
+    high = 1.0 if successes == trials else min(1.0, center + half_width)
+    return float(low), float(high)
+
+
+def summarize_probability(hits):
+    successes = int(np.count_nonzero(hits))
+    low, high = wilson_interval(successes, len(hits))
+    return {"probability": successes / len(hits), "interval": [low, high]}
+
+
+def summarize_values(values):
+    tail = (1 - INTERVAL_COVERAGE) / 2
+    low, median, high = np.quantile(values, [tail, 0.5, 1 - tail])
+    return {"median": float(median), "interval": [float(low), float(high)]}
+
+
+def load_history(cursor, faculty_id, subjects, grant_subject):
+    """
+    Load past exam parameters, faculty cutoffs and grant cutoffs.
+
+    :return: Tuple of (mean, standard_deviation, faculty_cutoffs, grant_cutoffs), exam parameters
+        shaped (years, subjects), faculty cutoffs shaped (years, 1), grant cutoffs shaped (years, tiers)
+        or None without a grant subject.
+    """
+    years, mean, standard_deviation = batch_analysis.load_exam_parameters(cursor, subjects)
+
+    faculty_cutoffs = np.array(cursor.execute("""
+        SELECT min_contest_score
+        FROM faculty_threshold
+        WHERE faculty_id = ?
+        ORDER BY year;""", (str(faculty_id),)
+    ).fetchall(), dtype=np.float64).reshape(-1, 1)
+
+    grant_cutoffs = None
+    if grant_subject is not None:
+        rows = cursor.execute("""
+            SELECT min_grant_100, min_grant_70, min_grant_50
+            FROM grant_threshold
+            WHERE subject_name = ?
+            ORDER BY year;""", (grant_subject,)
+        ).fetchall()
+        grant_cutoffs = np.array(rows, dtype=np.float64).reshape(-1, len(GRANT_TIERS))
+
+    return mean, standard_deviation, faculty_cutoffs, grant_cutoffs
+
+
+def forecast_admission(faculty_id, student_points, weights, grant_subject=None, draws=None, seed=None, cursor=None):
+    """
+    Forecast the probability of admission to a faculty and of each grant tier next year.
+
+    :param faculty_id: Faculty ID for contest ranking.
+    :param student_points: Dictionary with student raw points for each subject.
+    :param weights: Dictionary with coefficients for subjects (multipliers).
+    :param grant_subject: Subject of the grant lookup, defaults to the first elective subject.
+    :param draws: Number of simulation draws, defaults to `config.FORECAST_DRAWS`.
+    :param seed: Seed of the random generator, defaults to `config.FORECAST_SEED`.
+    :param cursor: Cursor of an open connection, defaults to a new connection to the database.
+    :return: Dictionary with "admission" and "grant" probabilities (each with a 95% interval of
+        the simulation estimate) and the median and interval of the drawn "contest_score",
+        "faculty_cutoff" and "grant_score". Grant tiers are exclusive, "none" is no grant.
+    :raises ValueError: For unknown subjects, a grant subject not among them, or a faculty or
+        subjects without history.
+    """
+    draws = draws or config.FORECAST_DRAWS
+    rng = np.random.default_rng(config.FORECAST_SEED if seed is None else seed)
+
+    subjects = scoring.normalize_subjects(weights)
+    scoring.check_grant_subject(subjects, grant_subject)
+    if grant_subject is None:
+        grant_subject = scoring.get_grant_subject(subjects)
+    points = np.array([student_points[subject] for subject in subjects], dtype=np.float64)
+    contest_weights = np.array([weights[subject] for subject in subjects], dtype=np.float64)
+    grant_weights = np.array(scoring.get_grant_coefficients(subjects, grant_subject), dtype=np.float64)
+
+    if cursor is not None:
+        history = load_history(cursor, faculty_id, subjects, grant_subject)
+    else:
+        connection = instrumentation.connect(config.DATABASE_PATH)
+        try:
+            history = load_history(connection.cursor(), faculty_id, subjects, grant_subject)
+        finally:
+            connection.close()
+    mean, standard_deviation, faculty_cutoffs, grant_cutoffs = history
+
+    if not len(faculty_cutoffs):
+        raise ValueError(f"No enrollment history of faculty {faculty_id}")
+
+    # Exam parameters shaped (draws, subjects), standard deviations kept positive
+    drawn_mean = predictive_draws(rng, mean, draws)
+    drawn_sd = np.maximum(predictive_draws(rng, standard_deviation, draws), 1e-6)
+    scaled = 15.0 * ((points - drawn_mean) / drawn_sd) + 150
+
+    contest_score = batch_analysis.weighted_sum(scaled, contest_weights)
+    faculty_cutoff = predictive_draws(rng, faculty_cutoffs, draws)[:, 0]
+    admitted = contest_score >= faculty_cutoff
+
+    result = {
+        "faculty_id": faculty_id,
+        "draws": draws,
+        "admission": summarize_probability(admitted),
+        "contest_score": summarize_values(contest_score),
+        "faculty_cutoff": summarize_values(faculty_cutoff),
+        "grant": None,
+        "grant_score": None,
+    }
+
+    if grant_subject is not None and grant_cutoffs is not None and len(grant_cutoffs):
+        grant_score = batch_analysis.weighted_sum(scaled, grant_weights) * 10
+
+        # Tier cutoffs of a year move together, one t draw shifts all of them; tiers never awarded are unreachable
+        observed = ~np.isnan(grant_cutoffs).all(axis=0)
+        tier_cutoffs = np.full((draws, len(GRANT_TIERS)), np.inf)
+        tier_cutoffs[:, observed] = predictive_draws(rng, grant_cutoffs[:, observed], draws, shared=True)
+
+        # Highest tier whose cutoff is reached, tiers are ordered from the highest amount
+        reached = grant_score[:, None] >= tier_cutoffs
+        tier = np.where(reached.any(axis=1), reached.argmax(axis=1), len(GRANT_TIERS))
+
+        result["grant"] = {
+            str(amount): summarize_probability(tier == i) for i, amount in enumerate(GRANT_TIERS)
+        }
+        result["grant"]["none"] = summarize_probability(tier == len(GRANT_TIERS))
+        result["grant_score"] = summarize_values(grant_score)
+
+    return result
+
+
+if __name__ == "__main__":
+    import json
+    import time
+
+    faculty_id = 19701034
+    student_points = {"MATHEMATICS": 46, "FOREIGN LANGUAGE": 69, "GEORGIAN LANGUAGE": 56}
+    weights = {"MATHEMATICS": 6, "FOREIGN LANGUAGE": 3, "GEORGIAN LANGUAGE": 3}
+
+    start = time.perf_counter()
+    forecast = forecast_admission(faculty_id, student_points, weights)
+    print(json.dumps(forecast, indent=2))
+    print(f"Forecast in {(time.perf_counter() - start) * 1e3:.1f}ms")
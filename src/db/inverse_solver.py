@@ -0,0 +1,248 @@
+"""
+Inverse of `analysis.check_historical_data`: the minimal raw points that would have secured
+a place in a faculty, or a grant tier, in each past year.
+
+Every integer raw point combination between the subjects' minimum (barrier) and maximum
+scores of a year forms a lattice, e.g. 41 x 65 x 46 points for Mathematics, Foreign and
+Georgian language. Contest and grant scores of the whole lattice are computed at once as
+outer sums of the weighted scaled scores of each subject, and compared with the year's
+cutoffs. Scores grow with every subject's points, so the combinations reaching a target are
+closed upwards; the minimal ones, the Pareto frontier, are those where one point less in
+any subject misses it.
+
+As in `check_historical_data`, a place requires a contest score above the one of the last
+enrolled student and a grant tier a grant score above the lowest one awarded that tier or
+a higher one. Grant targets require a place as well.
+
+Usage: python -m src.db.inverse_solver
+"""
+import functools
+
+import numpy as np
+
+from src import config, instrumentation
+from src.db import scoring
+
+# Grant amounts, in the order of the `grant_threshold` columns of their cutoffs
+GRANT_TIERS = (50, 70, 100)
+
+ADMISSION = "admission"
+
+
+def load_exam_ranges(cursor, subjects):
+    """
+    Load per-year point range, mean and standard deviation of the subjects.
+
+    :return: Dictionary of year to (min_score, max_score, mean, standard_deviation) arrays in
+        subject order, for years where all subjects have all four values.
+    """
+    rows = cursor.execute(f"""
+        SELECT year, subject_name, min_score, max_score, mean, standard_deviation
+        FROM exam
+        WHERE subject_name IN ({", ".join("?" * len(subjects))})
+          AND min_score IS NOT NULL AND max_score IS NOT NULL
+          AND mean IS NOT NULL AND standard_deviation IS NOT NULL
+        ORDER BY year;""", subjects
+    ).fetchall()
+
+    parameters = {}
+    for year, subject_name, *values in rows:
+        parameters.setdefault(year, np.full((4, len(subjects)), np.nan))[:, subjects.index(subject_name)] = values
+
+    return {
+        year: tuple(values) for year, values in parameters.items() if not np.isnan(values).any()
+    }
+
+
+def load_faculty_weights(cursor, faculty_id):
+    """
+    Inferred contest subject coefficients of a faculty per year, see `cross_faculty`.
+
+    :return: Dictionary of year to dictionary of subject to weight.
+    """
+    weights = {}
+    for year, subject_name, weight in cursor.execute("""
+            SELECT year, subject_name, weight
+            FROM faculty_subject
+            WHERE faculty_id = ?
+            ORDER BY year;""", (str(faculty_id),)):
+        weights.setdefault(year, {})[subject_name] = weight
+
+    return weights
+
+
+def load_cutoffs(cursor, faculty_id, grant_subject):
+    """
+    Load the faculty's admission cutoffs and the grant subject's tier cutoffs per year.
+
+    :return: Tuple of (faculty_cutoffs, grant_cutoffs), dictionaries of year to the contest score
+        of the last enrolled student and year to cutoffs in `GRANT_TIERS` order (None if never awarded).
+    """
+    faculty_cutoffs = dict(cursor.execute("""
+        SELECT year, min_contest_score
+        FROM faculty_threshold
+        WHERE faculty_id = ?;""", (str(faculty_id),)
+    ).fetchall())
+
+    grant_cutoffs = {
+        year: tier_cutoffs for year, *tier_cutoffs in cursor.execute("""
+            SELECT year, min_grant_50, min_grant_70, min_grant_100
+            FROM grant_threshold
+            WHERE subject_name = ?;""", (grant_subject,)
+        )
+    }
+
+    return faculty_cutoffs, grant_cutoffs
+
+
+def get_grant_cutoff(tier_cutoffs, target):
+    """
+    Grant score to exceed for the target tier: the lowest score awarded the tier or a higher one.
+    """
+    awarded = [cutoff for tier, cutoff in zip(GRANT_TIERS, tier_cutoffs) if tier >= target and cutoff is not None]
+    return min(awarded) if awarded else None
+
+
+def lattice_scores(ranges, coefficients, mean, standard_deviation):
+    """
+    Weighted sum of scaled scores of every raw point combination.
+
+    :param ranges: Raw points of each subject, one array per subject.
+    :return: Scores shaped (len(ranges[0]), len(ranges[1]), ...).
+    """
+    terms = [
+        coefficient * (15.0 * ((points - subject_mean) / subject_sd) + 150)
+        for points, coefficient, subject_mean, subject_sd in zip(ranges, coefficients, mean, standard_deviation)
+    ]
+    return functools.reduce(np.add.outer, terms)
+
+
+def pareto_frontier(reached):
+    """
+    Minimal elements of an upward closed boolean lattice: reached points where one step down
+    along any axis is not reached (or outside the lattice).
+
+    :return: Indices of the minimal points shaped (points, axes), in lexicographic order.
+    """
+    minimal = reached.copy()
+    for axis in range(reached.ndim):
+        below = np.zeros_like(reached)
+        # Point i along the axis is compared with point i - 1, the first one has nothing below it
+        target = [slice(None)] * reached.ndim
+        source = [slice(None)] * reached.ndim
+        target[axis] = slice(1, None)
+        source[axis] = slice(None, -1)
+        below[tuple(target)] = reached[tuple(source)]
+        minimal &= ~below
+
+    return np.argwhere(minimal)
+
+
+def solve_year(weights, grant_coefficients, exam_range, faculty_cutoff, grant_cutoff=None):
+    """
+    Pareto frontier of the minimal raw points reaching the cutoffs of one year.
+
+    :param weights: Contest coefficients in subject order.
+    :param grant_coefficients: Grant score coefficients in subject order.
+    :param exam_range: Tuple of (min_score, max_score, mean, standard_deviation) in subject order.
+    :param faculty_cutoff: Contest score to exceed.
+    :param grant_cutoff: Grant score to exceed, None for admission only.
+    :return: Tuple of (frontier, reached, lattice_size), frontier points shaped (points, subjects).
+    """
+    min_score, max_score, mean, standard_deviation = exam_range
+    ranges = [np.arange(low, high + 1, dtype=np.float64) for low, high in zip(min_score, max_score)]
+
+    reached = lattice_scores(ranges, weights, mean, standard_deviation) > faculty_cutoff
+    if grant_cutoff is not None:
+        reached &= lattice_scores(ranges, grant_coefficients, mean, standard_deviation) * 10 > grant_cutoff
+
+    frontier = pareto_frontier(reached) + np.asarray(min_score, dtype=np.int64)
+    return frontier, int(np.count_nonzero(reached)), reached.size
+
+
+def solve_minimum_points(faculty_id, target=ADMISSION, weights=None, grant_subject=None, cursor=None):
+    """
+    Minimal raw point combinations that would have reached a target in each past year.
+
+    :param faculty_id: Faculty ID of the admission cutoffs.
+    :param target: "admission", or a grant tier of `GRANT_TIERS` (which also requires admission).
+    :param weights: Dictionary with coefficients for subjects (multipliers), defaults to the
+        faculty's inferred coefficients of each year.
+    :param grant_subject: Subject of the grant lookup, defaults to the first elective subject.
+    :param cursor: Cursor of an open connection, defaults to a new connection to the database.
+    :return: List of dictionaries per year with "subjects", "faculty_cutoff", "grant_cutoff",
+        "frontier" (list of raw points in subject order, none of them reachable with less in
+        any subject), "reached" and "lattice_size" (combinations reaching the target, and all).
+        Years without cutoffs or exam ranges of all subjects are left out.
+    :raises ValueError: For an unknown target or subjects, or a faculty without weights.
+    """
+    if target != ADMISSION and target not in GRANT_TIERS:
+        raise ValueError(f"Unknown target {target!r}, expected {ADMISSION!r} or one of {GRANT_TIERS}")
+
+    if cursor is None:
+        connection = instrumentation.connect(config.DATABASE_PATH)
+        try:
+            return solve_minimum_points(faculty_id, target, weights, grant_subject, connection.cursor())
+        finally:
+            connection.close()
+
+    if weights is None:
+        weights_by_year = load_faculty_weights(cursor, faculty_id)
+        if not weights_by_year:
+            raise ValueError(f"No inferred subject weights of faculty {faculty_id}, pass them explicitly")
+    else:
+        weights_by_year = {year: weights for (year,) in cursor.execute(
+            "SELECT year FROM faculty_threshold WHERE faculty_id = ?;", (str(faculty_id),)
+        )}
+
+    results = []
+    for year, year_weights in sorted(weights_by_year.items()):
+        subjects = scoring.normalize_subjects(year_weights)
+        year_grant_subject = grant_subject or scoring.get_grant_subject(subjects)
+        if target != ADMISSION and year_grant_subject is None:
+            raise ValueError("Grant targets require an elective subject")
+
+        exam_range = load_exam_ranges(cursor, subjects).get(year)
+        faculty_cutoffs, grant_cutoffs = load_cutoffs(cursor, faculty_id, year_grant_subject)
+        if exam_range is None or year not in faculty_cutoffs:
+            continue
+
+        grant_cutoff = None
+        if target != ADMISSION:
+            grant_cutoff = get_grant_cutoff(grant_cutoffs.get(year, ()), target)
+            if grant_cutoff is None:
+                continue
+
+        contest_weights = np.array([year_weights[subject] for subject in subjects], dtype=np.float64)
+        grant_coefficients = np.array(scoring.get_grant_coefficients(subjects, year_grant_subject), dtype=np.float64)
+        with instrumentation.stage("inverse_solver"):
+            frontier, reached, lattice_size = solve_year(
+                contest_weights, grant_coefficients, exam_range, faculty_cutoffs[year], grant_cutoff
+            )
+
+        results.append({
+            "year": year,
+            "subjects": list(subjects),
+            "faculty_cutoff": faculty_cutoffs[year],
+            "grant_cutoff": grant_cutoff,
+            "frontier": frontier.tolist(),
+            "reached": reached,
+            "lattice_size": lattice_size,
+        })
+
+    return results
+
+if __name__ == "__main__":
+    import time
+
+    faculty_id = 19701034
+    for target in (ADMISSION,) + GRANT_TIERS:
+        start = time.perf_counter()
+        results = solve_minimum_points(faculty_id, target)
+        elapsed = time.perf_counter() - start
+
+        print(f"Faculty {faculty_id}, {target}: solved in {elapsed * 1e3:.1f}ms")
+        for result in results:
+            easiest = min(result["frontier"], key=sum) if result["frontier"] else None
+            print(f"  {result['year']}: {len(result['frontier'])} minimal combinations of {result['subjects']}, "
+                  f"{result['reached']} of {result['lattice_size']} reach it, lowest total {easiest}")
@@ -0,0 +1,120 @@
+"""
+Query plan regression check for the queries of `src/db/analysis.py`.
+
+Runs `EXPLAIN QUERY PLAN` for every analysis query against a database built from
+the schema seed and migrations, and fails if any of them scans instead of searching
+an index. Scanning a covering index reads every entry of it too, it fails as well;
+only the scans of `INTENDED_SCANS` pass.
+
+Usage: python -m src.db.query_plans [database_path]
+"""
+import os
+import sqlite3
+import sys
+
+from src import config
+from src.db import analysis, scoring, setup
+
+# Analysis queries with representative parameters to explain them with
+ANALYSIS_QUERIES = {
+    "check_historical_data": (
+        analysis.CHECK_HISTORICAL_DATA_QUERY,
+        (46, 69, 56, 6, 3, 3, "MATHEMATICS", "19701034", "19701034"),
+    ),
+    "check_historical_data (4 subjects)": (
+        scoring.compile_historical_query(
+            scoring.normalize_subjects(("PHYSICS", "MATHEMATICS", "FOREIGN LANGUAGE", "GEORGIAN LANGUAGE"))
+        ),
+        (40, 46, 69, 56, 2, 4, 3, 3, "PHYSICS", "19701034", "19701034"),
+    ),
+    "get_grant_thresholds": (analysis.GRANT_THRESHOLDS_QUERY, ()),
+    "get_enrollment_thresholds": (analysis.ENROLLMENT_THRESHOLDS_QUERY, ("19701034",)),
+}
+
+# Plan steps allowed to scan: the constant rows and CTEs the generated historical query
+# computes the scores of each year from, none of them reads a table
+INTENDED_SCANS = {"CONSTANT ROW", "x_values", "scores"}
+
+
+def create_schema_database():
+    """
+    Create an in-memory database with the schema seed and all migrations applied.
+    """
+    connection = sqlite3.connect(":memory:")
+    with open(os.path.join(config.SEED_DIR, "schema.sql"), 'r', encoding='utf-8') as file:
+        connection.executescript(file.read())
+    setup.migrate(connection)
+    return connection
+
+
+def explain(connection, query, params):
+    """
+    Return the detail lines of the query plan of a query.
+    """
+    rows = connection.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    return [detail for _, _, _, detail in rows]
+
+
+def get_scan_target(detail):
+    """
+    Table, index or CTE a plan step scans, e.g. "enrollment" of "SCAN enrollment USING COVERING INDEX
+    enrollment_student_idx", or None if the step does not scan.
+    """
+    words = detail.split()
+    if words[0] != "SCAN":
+        return None
+
+    # SQLite before 3.36 prints "SCAN TABLE <name>" instead of "SCAN <name>"
+    if words[1:2] == ["TABLE"]:
+        del words[1]
+
+    target = []
+    for word in words[1:]:
+        if word in ("USING", "AS"):
+            break
+        target.append(word)
+    return " ".join(target)
+
+
+def find_full_scans(connection, queries=None):
+    """
+    Find plan steps scanning instead of searching, covering index scans included.
+
+    Every step reading a table must be a SEARCH, scans of `INTENDED_SCANS` only are fine.
+
+    :return: List of (query name, plan detail) tuples, empty if every query searches indexes.
+    """
+    if queries is None:
+        queries = ANALYSIS_QUERIES
+
+    full_scans = []
+    for name, (query, params) in queries.items():
+        for detail in explain(connection, query, params):
+            target = get_scan_target(detail)
+            if target is not None and target not in INTENDED_SCANS:
+                full_scans.append((name, detail))
+
+    return full_scans
+
+
+def main(database_path=None):
+    if database_path is None:
+        connection = create_schema_database()
+    else:
+        connection = sqlite3.connect(database_path)
+
+    full_scans = find_full_scans(connection)
+    connection.close()
+
+    for name, detail in full_scans:
+        print(f"FAIL {name}: {detail}")
+
+    if full_scans:
+        return 1
+
+    print(f"OK: {len(ANALYSIS_QUERIES)} analysis queries search indexes only")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else None))
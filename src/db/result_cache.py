@@ -0,0 +1,124 @@
+"""
+Bounded LRU cache of analysis lookup results, tagged with the data version they were read at.
+
+Lookups of popular faculties with the same points and weights repeat a lot, a cached result
+spares running the query again. Every entry is tagged with the version of the data it was read
+at, e.g. the database and its `data_version` (see `api.bump_data_version`): a lookup at another
+version drops all entries at once, so a newly ingested year or calibration is never answered
+from results of the previous data.
+"""
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Thread-safe least recently used cache of results keyed by lookup arguments, with
+    hit, miss, eviction and invalidation counters.
+    """
+
+    def __init__(self, maxsize):
+        """
+        :param maxsize: Maximum number of cached results, 0 disables the cache.
+        """
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        # Key to (version, result), least recently used first
+        self._entries = OrderedDict()
+
+    def _advance(self, version):
+        """
+        Drop entries of other versions than `version`, must hold the lock.
+        """
+        if version == self.version:
+            return
+
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self.version = version
+
+    def _evict(self):
+        """
+        Drop least recently used entries over `maxsize`, must hold the lock.
+        """
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, version):
+        """
+        Cached result of a key read at the data version, or None. Entries of other versions are dropped.
+        """
+        with self._lock:
+            self._advance(version)
+
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, result):
+        """
+        Cache a result read at the data version, evicting the least recently used one when full.
+
+        Results read at another version than the last looked up one, e.g. by a lookup that
+        started before an ingestion committed, are not cached.
+        """
+        with self._lock:
+            if self.maxsize <= 0 or version != self.version:
+                return
+
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize):
+        """
+        Change the maximum number of cached results, evicting the least recently used ones
+        over it. 0 disables the cache.
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        """
+        Drop all entries and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.version = None
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        """
+        Counters of the cache.
+
+        :return: Dictionary with hits, misses, evictions, invalidations (entries dropped by a data
+            version change), hit_rate, size, maxsize and the data version of the cached results.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "version": self.version,
+            }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,278 @@
+"""
+Score-distribution index of enrolled students' contest scores, per faculty and year.
+
+Contest scores of each (faculty, year) are one ascending run of a contiguous float array,
+located by an offset table; ranks are stored alongside them. The index is a single file
+laid out for `numpy.memmap`, so loading it maps the file instead of reading it, and rank,
+percentile and points-to-next-rank queries are binary searches over a run, without SQLite.
+
+File layout, sections aligned to 64 bytes:
+
+    magic (8 bytes) | header length (uint64) | JSON header
+    keys     int64[K]    faculty position * 10000 + year, ascending
+    offsets  int64[K+1]  start of each key's run in scores and ranks
+    scores   float64[N]  contest scores, ascending within a run (ties ordered by rank)
+    ranks    int32[N]    rank of each score
+
+Faculty IDs are strings whose leading zeros are significant, the header holds them sorted
+and keys refer to a faculty by its position in that table. The header also records the
+enrollment ingestions the index was built from, `is_stale` compares them with the manifest. Ingestion refreshes a stale index, to rebuild it run:
+
+Usage: python -m src.db.score_index
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+from src import config, instrumentation
+from src.db.batch_analysis import lookup_below
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NAECIDX2"
+ALIGNMENT = 64
+# Years are below this, keys of a faculty are consecutive
+YEAR_FACTOR = 10000
+
+SECTIONS = (("keys", "<i8"), ("offsets", "<i8"), ("scores", "<f8"), ("ranks", "<i4"))
+
+
+def make_key(faculty_position, year):
+    """
+    Key of a faculty year, by the position of the faculty in the sorted faculty ID table.
+    """
+    return int(faculty_position) * YEAR_FACTOR + int(year)
+
+
+def get_source(cursor):
+    """
+    Enrollment ingestions of the database, as stored in the index header.
+    """
+    return [
+        list(row) for row in cursor.execute("""
+            SELECT year, file_hash, ingested_at
+            FROM ingestion
+            WHERE kind = 'enrollment'
+            ORDER BY year;"""
+        )
+    ]
+
+
+def align(position):
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def build_index(path=None):
+    """
+    Build the index from the `enrollment` table and write it, replacing the previous file.
+
+    :param path: Index file path, defaults to `config.SCORE_INDEX_PATH`.
+    :return: Path of the written index.
+    """
+    path = path or config.SCORE_INDEX_PATH
+
+    connection = instrumentation.connect(config.DATABASE_PATH)
+    try:
+        cursor = connection.cursor()
+        source = get_source(cursor)
+        rows = cursor.execute("""
+            SELECT faculty_id, year, contest_score, rank
+            FROM enrollment
+            ORDER BY faculty_id, year, contest_score, rank;"""
+        ).fetchall()
+    finally:
+        connection.close()
+
+    # Text faculty IDs sort the same in SQLite and NumPy, keys of the sorted rows are ascending
+    faculty_ids, faculty_positions = np.unique(
+        np.array([str(faculty_id) for faculty_id, _, _, _ in rows], dtype=str), return_inverse=True
+    )
+    years = np.array([year for _, year, _, _ in rows], dtype=np.int64)
+    row_keys = faculty_positions.astype(np.int64) * YEAR_FACTOR + years
+    arrays = {
+        "scores": np.array([score for _, _, score, _ in rows], dtype="<f8"),
+        "ranks": np.array([rank for _, _, _, rank in rows], dtype="<i4"),
+    }
+    arrays["keys"], starts = np.unique(row_keys, return_index=True)
+    arrays["offsets"] = np.append(starts, len(row_keys)).astype("<i8")
+
+    # Section positions follow the header, which holds them, so its length is fixed first
+    header = {"source": source, "faculty_ids": faculty_ids.tolist(), "sections": {}}
+    header_length = len(json.dumps(header)) + 256 * len(SECTIONS)
+    position = align(len(MAGIC) + 8 + header_length)
+    for name, dtype in SECTIONS:
+        header["sections"][name] = {"offset": position, "length": len(arrays[name]), "dtype": dtype}
+        position = align(position + arrays[name].nbytes)
+
+    encoded_header = json.dumps(header).encode("utf-8").ljust(header_length)
+    temporary_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(temporary_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(np.uint64(header_length).tobytes())
+        file.write(encoded_header)
+        for name, dtype in SECTIONS:
+            file.seek(header["sections"][name]["offset"])
+            file.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+    os.replace(temporary_path, path)
+
+    logger.info("Score index of %d faculty years and %d scores written to %s",
+                len(arrays["keys"]), len(arrays["scores"]), path)
+    return path
+
+
+def refresh_index(path=None):
+    """
+    Build the index if it is missing, unreadable or stale.
+
+    :return: True if the index was rebuilt.
+    """
+    path = path or config.SCORE_INDEX_PATH
+    if os.path.exists(path):
+        connection = instrumentation.connect(config.DATABASE_PATH)
+        try:
+            if not ScoreIndex(path).is_stale(connection.cursor()):
+                return False
+        except (ValueError, KeyError):
+            logger.warning("Score index %s is unreadable, rebuilding it", path)
+        finally:
+            connection.close()
+
+    build_index(path)
+    return True
+
+
+class ScoreIndex:
+    """
+    Memory-mapped score-distribution index, see the module documentation.
+
+    Query methods take a contest score, or an array of them, and return NaN where a
+    faculty year has no enrolled students below or above it.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: Index file path, defaults to `config.SCORE_INDEX_PATH`.
+        """
+        self.path = path or config.SCORE_INDEX_PATH
+
+        with open(self.path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a score index")
+            header_length = int(np.frombuffer(file.read(8), dtype=np.uint64)[0])
+            self.header = json.loads(file.read(header_length))
+        self.faculty_positions = {faculty_id: i for i, faculty_id in enumerate(self.header["faculty_ids"])}
+
+        for name, _ in SECTIONS:
+            section = self.header["sections"][name]
+            if not section["length"]:
+                setattr(self, name, np.empty(0, dtype=section["dtype"]))
+                continue
+
+            array = np.memmap(self.path, dtype=section["dtype"], mode="r",
+                              offset=section["offset"], shape=(section["length"],))
+            # Plain array views of the mapping, slicing memmap objects is several times slower
+            setattr(self, name, array.view(np.ndarray))
+
+    def is_stale(self, cursor):
+        """
+        Whether enrollment years were ingested since the index was built.
+        """
+        return get_source(cursor) != self.header["source"]
+
+    def get_run(self, faculty_id, year):
+        """
+        Sorted contest scores and ranks of a faculty year, as views of the mapped file.
+
+        :return: Tuple of (scores, ranks), empty when the faculty year has no enrollments.
+        """
+        position = self.faculty_positions.get(str(faculty_id))
+        if position is None:
+            return self.scores[:0], self.ranks[:0]
+
+        key = make_key(position, year)
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            return self.scores[:0], self.ranks[:0]
+
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.scores[start:stop], self.ranks[start:stop]
+
+    def get_years(self, faculty_id):
+        """
+        Years with enrollments of a faculty.
+        """
+        position = self.faculty_positions.get(str(faculty_id))
+        if position is None:
+            return []
+
+        start = np.searchsorted(self.keys, make_key(position, 0))
+        stop = np.searchsorted(self.keys, make_key(position, YEAR_FACTOR - 1), side="right")
+        return [int(key % YEAR_FACTOR) for key in self.keys[start:stop]]
+
+    def rank(self, faculty_id, year, contest_score):
+        """
+        Rank of the enrolled student with the greatest contest score below the given one,
+        the rank `analysis.check_historical_data` reports.
+        """
+        scores, ranks = self.get_run(faculty_id, year)
+        return lookup_below(scores, ranks, np.asarray(contest_score, dtype=np.float64))
+
+    def percentile(self, faculty_id, year, contest_score):
+        """
+        Percentile of a contest score among the enrolled students: the share below it, ties counted half.
+        """
+        scores, _ = self.get_run(faculty_id, year)
+        if not len(scores):
+            return np.full(np.shape(contest_score), np.nan)
+
+        below = np.searchsorted(scores, contest_score, side="left")
+        not_above = np.searchsorted(scores, contest_score, side="right")
+        return 100.0 * (below + not_above) / (2 * len(scores))
+
+    def points_to_next_rank(self, faculty_id, year, contest_score):
+        """
+        Contest points up to the next greater enrolled score, to be exceeded for a better rank.
+        """
+        scores, _ = self.get_run(faculty_id, year)
+        contest_score = np.asarray(contest_score, dtype=np.float64)
+        positions = np.searchsorted(scores, contest_score, side="right")
+        found = positions < len(scores)
+
+        result = np.full(contest_score.shape, np.nan)
+        result[found] = scores[positions[found]] - contest_score[found]
+        return result
+
+    def points_to_cutoff(self, faculty_id, year, contest_score):
+        """
+        Contest points missing to the score of the last enrolled student, 0 when reached.
+        """
+        scores, _ = self.get_run(faculty_id, year)
+        if not len(scores):
+            return np.full(np.shape(contest_score), np.nan)
+
+        return np.maximum(scores[0] - np.asarray(contest_score, dtype=np.float64), 0.0)
+
+    def lookup(self, faculty_id, year, contest_score):
+        """
+        All queries of a single contest score, as a dictionary of Python values (None for NaN).
+        """
+        scores, ranks = self.get_run(faculty_id, year)
+        total = len(scores)
+        below = int(np.searchsorted(scores, contest_score, side="left"))
+        not_above = int(np.searchsorted(scores, contest_score, side="right"))
+
+        return {
+            "rank": int(ranks[below - 1]) if below else None,
+            "percentile": 100.0 * (below + not_above) / (2 * total) if total else None,
+            "points_to_next_rank": float(scores[not_above] - contest_score) if not_above < total else None,
+            "points_to_cutoff": max(float(scores[0]) - contest_score, 0.0) if total else None,
+            "total_enrolled": total,
+        }
+
+
+if __name__ == "__main__":
+    with instrumentation.run("score_index"):
+        build_index()
@@ -0,0 +1,200 @@
+from functools import lru_cache
+
+from src import constants
+
+# Canonical order of subjects in generated queries: electives, then mandatory subjects.
+# Scores are summed in this order, e.g. MATHEMATICS, FOREIGN LANGUAGE, GEORGIAN LANGUAGE.
+SUBJECT_ORDER = tuple(
+    subject for subject in constants.SUBJECTS_KA_TO_EN_MAPPING.values()
+    if subject not in constants.MANDATORY_SUBJECTS
+) + constants.MANDATORY_SUBJECTS
+
+
+def normalize_subjects(subjects):
+    """
+    Validate subject names and return them as a tuple in canonical order.
+    """
+    subjects = set(subjects)
+    unknown = subjects.difference(SUBJECT_ORDER)
+    if unknown:
+        raise ValueError(f"Unknown subjects: {', '.join(sorted(unknown))}")
+
+    return tuple(subject for subject in SUBJECT_ORDER if subject in subjects)
+
+
+def get_grant_subject(subjects):
+    """
+    The subject whose grant list a subject combination competes in: its first elective subject.
+
+    :return: Subject name, or None if the combination has mandatory subjects only.
+    """
+    for subject in normalize_subjects(subjects):
+        if subject not in constants.MANDATORY_SUBJECTS:
+            return subject
+
+    return None
+
+
+def check_grant_subject(subjects, grant_subject):
+    """
+    Validate a requested grant subject, it must be one of the subjects of the combination.
+
+    :raises ValueError: If the grant subject is given and not one of the subjects.
+    """
+    if grant_subject is not None and grant_subject not in subjects:
+        raise ValueError(f"Grant subject {grant_subject!r} is not one of the weighted subjects")
+
+
+def get_grant_coefficients(subjects, grant_subject=None):
+    """
+    Grant score coefficients of the subjects in canonical order: 1.5 for the grant subject,
+    1 for mandatory subjects and 0 for other electives.
+    """
+    subjects = normalize_subjects(subjects)
+    if grant_subject is None:
+        grant_subject = get_grant_subject(subjects)
+
+    coefficients = []
+    for subject in subjects:
+        if subject == grant_subject:
+            coefficients.append(constants.GRANT_SUBJECT_COEFFICIENT)
+        elif subject in constants.MANDATORY_SUBJECTS:
+            coefficients.append(1)
+        else:
+            coefficients.append(0)
+
+    return tuple(coefficients)
+
+
+@lru_cache(maxsize=None)
+def compile_historical_query(subjects, grant_subject=None):
+    """
+    Generate the historical data query for a subject combination, cached by subject set.
+
+    Parameters of the query, the grant subject included, are bound by `historical_query_params`.
+    Years where any of the subjects has no mean/SD in the `exam` table are left out.
+
+    :param subjects: Tuple of subject names in canonical order, see `normalize_subjects`.
+    :param grant_subject: Subject of the grant lookup, defaults to `get_grant_subject(subjects)`.
+    :return: SQL query text.
+    """
+    if grant_subject is None:
+        grant_subject = get_grant_subject(subjects)
+
+    x_values = "\n        UNION ALL\n        ".join(
+        f"SELECT '{subject}' AS subject_name, ? AS x_value" if i == 0 else f"SELECT '{subject}', ?"
+        for i, subject in enumerate(subjects)
+    )
+
+    grant_terms = []
+    for subject, coefficient in zip(subjects, get_grant_coefficients(subjects, grant_subject)):
+        if coefficient == 0:
+            continue
+        multiplier = "" if coefficient == 1 else f" * {coefficient}"
+        grant_terms.append(
+            f"(scaled_score{multiplier} * CASE WHEN subject_name = '{subject}' THEN 1 ELSE 0 END)"
+        )
+
+    contest_terms = [
+        f"(scaled_score * ? * CASE WHEN subject_name = '{subject}' THEN 1 ELSE 0 END)"
+        for subject in subjects
+    ]
+
+    grant_sum = " +\n            ".join(grant_terms)
+    contest_sum = " +\n            ".join(contest_terms)
+
+    if grant_subject is None:
+        grant_amount = "NULL"
+    else:
+        grant_amount = f"""(SELECT grant_amount
+         FROM grant
+         WHERE grant_score < scores.grant_score
+           AND subject_id = (SELECT id FROM subject WHERE name = ?)
+           AND year = scores.year
+         ORDER BY grant_score DESC
+         LIMIT 1)"""
+
+    return f"""
+WITH CalculateSubjectScaledScores AS (
+    SELECT
+        x_values.subject_name,
+        x_values.x_value,
+        exam.year,
+        15.0 * ((x_values.x_value - exam.mean) / exam.standard_deviation) + 150 AS scaled_score
+    FROM (
+        {x_values}
+    ) AS x_values
+    JOIN exam ON x_values.subject_name = exam.subject_name
+), ComputeGrantAndContestScores AS (
+    SELECT
+        year,
+        SUM(
+            {grant_sum}
+        ) * 10 AS grant_score,
+        SUM(
+            {contest_sum}
+        ) AS contest_score
+    FROM CalculateSubjectScaledScores
+    GROUP BY year
+    HAVING COUNT(scaled_score) = {len(subjects)}
+), FinalRankAndGrant AS (
+    SELECT
+        scores.year,
+        scores.grant_score,
+        scores.contest_score,
+        {grant_amount} AS grant_amount,
+        (SELECT rank
+         FROM enrollment
+         WHERE contest_score < scores.contest_score
+           AND faculty_id = ?
+           AND year = scores.year
+         ORDER BY contest_score DESC
+         LIMIT 1) AS rank,
+         -- Total enrolled students in that faculty on that year
+        (SELECT COUNT(*)
+            FROM enrollment
+            WHERE year = scores.year
+            AND faculty_id = ?
+            ) AS total_enrolled
+    FROM ComputeGrantAndContestScores scores
+)
+SELECT *
+FROM FinalRankAndGrant;
+"""
+
+
+def historical_query_params(subjects, faculty_id, student_points, weights, grant_subject=None):
+    """
+    Bound parameters of `compile_historical_query(subjects, grant_subject)`.
+
+    :param subjects: Tuple of subject names in canonical order.
+    :param faculty_id: Faculty ID for contest ranking.
+    :param student_points: Dictionary with student raw points for each subject.
+    :param weights: Dictionary with coefficients for subjects (multipliers).
+    :param grant_subject: Subject of the grant lookup, defaults to `get_grant_subject(subjects)`.
+    """
+    if grant_subject is None:
+        grant_subject = get_grant_subject(subjects)
+
+    return (
+        [student_points[subject] for subject in subjects]
+        + [weights[subject] for subject in subjects]
+        + ([] if grant_subject is None else [grant_subject])
+        + [faculty_id, faculty_id]
+    )
+
+
+def prepare_historical_query(faculty_id, student_points, weights, grant_subject=None):
+    """
+    Resolve the cached query and its parameters for the subjects of the given weights.
+
+    :param grant_subject: Subject of the grant lookup, one of the weighted subjects,
+        defaults to `get_grant_subject(subjects)`.
+    :return: Tuple of (query, params).
+    :raises ValueError: For unknown subjects, or a grant subject not among them.
+    """
+    subjects = normalize_subjects(weights)
+    check_grant_subject(subjects, grant_subject)
+
+    query = compile_historical_query(subjects, grant_subject)
+    return query, historical_query_params(subjects, faculty_id, student_points, weights, grant_subject)
@@ -1,38 +1,111 @@
-import sqlite3
+import logging
 import os
 
-from src import config
+from src import config, instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Share of free pages left by migrations above which the database is vacuumed
+VACUUM_FREE_SHARE = 0.25
+
+
+def get_migrations():
+    """
+    List migration scripts of the seed directory as (version, path) tuples, ordered by version.
+
+    Migration files are named `<version>_<description>.sql`, e.g. `001_ingestion_manifest.sql`.
+    """
+    migrations_dir = os.path.join(config.SEED_DIR, "migrations")
+    if not os.path.isdir(migrations_dir):
+        return []
+
+    migrations = []
+    for filename in os.listdir(migrations_dir):
+        if filename.endswith(".sql"):
+            version = int(filename.split("_")[0])
+            migrations.append((version, os.path.join(migrations_dir, filename)))
+
+    return sorted(migrations)
+
+
+def migrate(connection, target_version=None):
+    """
+    Apply pending migrations, tracking the applied version in `PRAGMA user_version`.
+
+    Each migration runs in one transaction with its version bump, so an interrupted migration
+    leaves the database at the previous version. Migrations must not commit themselves. Once
+    applied, the database is vacuumed if they freed more than `VACUUM_FREE_SHARE` of its pages,
+    e.g. by rebuilding tables.
+
+    :param target_version: Last migration to apply, defaults to all of them.
+    """
+    cursor = connection.cursor()
+    current_version = cursor.execute("PRAGMA user_version;").fetchone()[0]
+
+    applied = False
+    for version, migration_path in get_migrations():
+        if version <= current_version:
+            continue
+        if target_version is not None and version > target_version:
+            break
+
+        with open(migration_path, 'r', encoding='utf-8') as file:
+            sql_script = file.read()
+
+        try:
+            cursor.executescript(f"BEGIN;\n{sql_script}\nPRAGMA user_version = {version};\nCOMMIT;")
+        except Exception:
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+
+        applied = True
+        logger.info("Migration %d applied from %s", version, migration_path)
+
+    if applied:
+        free_pages = cursor.execute("PRAGMA freelist_count;").fetchone()[0]
+        if free_pages > VACUUM_FREE_SHARE * cursor.execute("PRAGMA page_count;").fetchone()[0]:
+            cursor.execute("VACUUM;")
+            logger.info("Database vacuumed, %d free pages released", free_pages)
 
 
 def setup():
     """
-    Execute the SQL commands from a seed SQL file to create tables and insert data.
+    Execute the SQL commands from a seed SQL file to create tables and insert data,
+    then apply pending migrations. The seed is skipped for an already created database.
     """
     # Connect to SQLite database (creates the file if it doesn't exist)
-    connection = sqlite3.connect(config.DATABASE_PATH)
+    connection = instrumentation.connect(config.DATABASE_PATH)
     cursor = connection.cursor()
 
     try:
-        schema_seed_path = os.path.join(config.SEED_DIR, "schema.sql")
+        schema_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'subject';"
+        ).fetchone()
 
-        # Read the SQL file
-        with open(schema_seed_path, 'r', encoding='utf-8') as file:
-            sql_script = file.read()
+        if not schema_exists:
+            schema_seed_path = os.path.join(config.SEED_DIR, "schema.sql")
 
-        # Execute the SQL script
-        cursor.executescript(sql_script)
+            # Read the SQL file
+            with open(schema_seed_path, 'r', encoding='utf-8') as file:
+                sql_script = file.read()
 
-        # Commit the changes
-        connection.commit()
-        print(f"SQL script executed successfully from {schema_seed_path}")
+            # Execute the SQL script
+            cursor.executescript(sql_script)
+
+            # Commit the changes
+            connection.commit()
+            logger.info("SQL script executed successfully from %s", schema_seed_path)
+
+        migrate(connection)
 
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.exception("An error occurred: %s", e)
     finally:
         # Close the connection
         connection.close()
 
 
 if __name__ == "__main__":
+    instrumentation.configure_logging()
     setup()
-
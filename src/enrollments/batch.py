@@ -0,0 +1,109 @@
+"""
+Struct-of-arrays record batch of the enrollments of one faculty and year.
+
+A parsed faculty used to be a dictionary with one dictionary and one list of floats per
+student, several hundred bytes per row. A batch holds the faculty metadata once and the
+rows as NumPy columns, a few dozen bytes per row. The tokenizer fills batches directly,
+the database writer and the snapshot writer consume their columns.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from src import constants
+
+
+def score_matrix(subject_scores):
+    """
+    Subject scores of rows as a (rows, scores) float array, padded with NaN where rows have fewer scores.
+
+    :param subject_scores: Sequence of score sequences, one per row.
+    """
+    widths = {len(scores) for scores in subject_scores}
+    if len(widths) <= 1:
+        return np.array(subject_scores, dtype=np.float64).reshape(len(subject_scores), widths.pop() if widths else 0)
+
+    matrix = np.full((len(subject_scores), max(widths)), np.nan)
+    for i, scores in enumerate(subject_scores):
+        matrix[i, :len(scores)] = scores
+    return matrix
+
+
+@dataclass(eq=False)
+class EnrollmentBatch:
+    """
+    Enrolled students of a faculty, in the order of the enrollment list.
+
+    `subject_scores` has one column per score of a row, in the order of `subjects`; rows
+    with fewer scores than others are padded with NaN.
+    """
+    year: int
+    university_id: str
+    university_name: str
+    faculty_id: str
+    faculty_name: str
+    subjects: tuple  # Subject names as listed in the PDF, see `subject_names`
+    ranks: np.ndarray  # int32, shaped (rows,)
+    student_ids: np.ndarray  # int64, shaped (rows,)
+    contest_scores: np.ndarray  # float64, shaped (rows,)
+    subject_scores: np.ndarray  # float64, shaped (rows, scores)
+
+    def __len__(self):
+        return len(self.ranks)
+
+    @property
+    def nbytes(self):
+        """
+        Bytes of the row columns.
+        """
+        return self.ranks.nbytes + self.student_ids.nbytes + self.contest_scores.nbytes + self.subject_scores.nbytes
+
+    @property
+    def subject_names(self):
+        """
+        Subjects with their database names, unknown subjects are kept as is.
+        """
+        return tuple(constants.SUBJECTS_KA_FIRST_WORD_TO_EN_MAPPING.get(subject, subject) for subject in self.subjects)
+
+    def iter_result_columns(self):
+        """
+        Yield (subject_name, student_ids, scaled_scores) of each subject with a score column,
+        subjects without one and scores of a column beyond them are dropped, as are padded scores.
+        """
+        for j, subject_name in enumerate(self.subject_names[:self.subject_scores.shape[1]]):
+            scores = self.subject_scores[:, j]
+            scored = ~np.isnan(scores)
+            yield subject_name, self.student_ids[scored], scores[scored]
+
+    def equals(self, other):
+        """
+        Whether two batches hold the same metadata and rows.
+        """
+        return (
+            (self.year, self.university_id, self.university_name, self.faculty_id, self.faculty_name, self.subjects)
+            == (other.year, other.university_id, other.university_name, other.faculty_id, other.faculty_name,
+                other.subjects)
+            and np.array_equal(self.ranks, other.ranks)
+            and np.array_equal(self.student_ids, other.student_ids)
+            and np.array_equal(self.contest_scores, other.contest_scores)
+            and np.array_equal(self.subject_scores, other.subject_scores, equal_nan=True)
+        )
+
+    @classmethod
+    def from_columns(cls, year, university_id, university_name, faculty_id, faculty_name, subjects,
+                     ranks, student_ids, contest_scores, subject_scores):
+        """
+        Build a batch from row columns, subject scores given as one sequence of scores per row.
+        """
+        return cls(
+            year=year,
+            university_id=university_id,
+            university_name=university_name,
+            faculty_id=faculty_id,
+            faculty_name=faculty_name,
+            subjects=tuple(subjects),
+            ranks=np.array(ranks, dtype=np.int32),
+            student_ids=np.array(student_ids, dtype=np.int64),
+            contest_scores=np.array(contest_scores, dtype=np.float64),
+            subject_scores=score_matrix(subject_scores),
+        )
@@ -1,5 +1,8 @@
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
 
 def extract_university_name_and_id(text):
     """
@@ -13,7 +16,7 @@ def extract_university_name_and_id(text):
 
         return university_id, university_name
 
-    print(text)
+    logger.error("university ID/name not found in the given text chunk:\n%s", text)
     raise ValueError("university ID/name not found in the given text chunk.")
 
 def extract_faculty_name_and_id(text):
@@ -33,7 +36,7 @@ def extract_faculty_name_and_id(text):
         faculty_name = faculty_match.group(2).strip()
         return faculty_id, faculty_name.strip()
 
-    print(text)
+    logger.error("Faculty ID/name not found in the given text chunk:\n%s", text)
     raise ValueError("Faculty ID/name not found in the given text chunk.")
 
 def extract_taken_subjects(text):
@@ -55,7 +58,8 @@ def extract_enrollment_records(text):
     records = []
     # Pattern to match enrollment lines
     # RANK STUDENT_ID SUBJECT_SCORES+ CONTEST_SCORE GRANT_SCORE(Ignored)
-    enrollment_pattern = re.compile(r"^(\d+)\s+(\d{9})\s+((?:\d{3}\.\d\s+){3,4})(\d+\.\d)(?:\s+(?:50|70|100))?",
+    # The grant amount stays on the line, otherwise rows ranked 50, 70 or 100 after a row without grant are consumed
+    enrollment_pattern = re.compile(r"^(\d+)\s+(\d{9})\s+((?:\d{3}\.\d\s+){3,4})(\d+\.\d)(?:[ \t]+(?:50|70|100))?",
                                     flags=re.MULTILINE)
 
     for match in enrollment_pattern.finditer(text):
@@ -1,31 +1,43 @@
+import logging
 import os
 import re
-import pdfplumber
 
-from src import config
+from src import config, instrumentation, pdf_extraction
 
+logger = logging.getLogger(__name__)
 
-def pdf_to_string(pdf_filename):
+
+# Start of an enrollment group confined to a single line, safe to split the raw text at
+GROUP_START_LINE_PATTERN = re.compile(r"^\d{3}[ \t]+[ა-ჰ]+.*\n", flags=re.MULTILINE)
+
+
+def iter_pdf_pages(pdf_filename, workers=None):
     """
-    Extract text from a PDF file.
+    Yield text of each page of an enrollment PDF file, with the title removed.
+
+    :param pdf_filename: Name of the PDF file in the enrollments data directory.
+    :param workers: Number of extraction processes, defaults to `config.PDF_EXTRACTION_WORKERS`.
     """
     pdf_path = os.path.join(config.ENROLLMENT_DATA_DIR, pdf_filename)
-    with pdfplumber.open(pdf_path) as pdf:
-        print(f"Total pages: {len(pdf.pages)}")
-        print(f"Extracting text...")
-        result = ""
 
-        for i, page in enumerate(pdf.pages):
-            print(f"Processing page {i + 1}...")
-            string_content = page.extract_text()
+    pages = instrumentation.timed_iter(pdf_extraction.iter_pages(pdf_path, workers=workers), "pdf_extraction", "pages")
+    for i, string_content in enumerate(pages):
+        # Remove first two lines (title) of the first page
+        if i == 0:
+            string_content = "\n".join(string_content.split("\n")[2:])
 
-            # Remove first two lines (title) of the first page
-            if i == 0:
-                string_content = "\n".join(string_content.split("\n")[2:])
+        yield string_content
 
-            result += string_content
 
-        return result
+def pdf_to_string(pdf_filename, workers=None):
+    """
+    Extract text from a PDF file.
+
+    :param pdf_filename: Name of the PDF file in the enrollments data directory.
+    :param workers: Number of extraction processes, defaults to `config.PDF_EXTRACTION_WORKERS`.
+    """
+    logger.info("Extracting text of %s...", pdf_filename)
+    return "".join(iter_pdf_pages(pdf_filename, workers=workers))
 
 
 def segment_pdf_content(text):
@@ -57,4 +69,40 @@ def segment_pdf_content(text):
         chunk = text[start:end].strip()
         chunks.append(chunk)
 
-    return chunks
\ No newline at end of file
+    return chunks
+
+
+def iter_chunks(pages):
+    """
+    Segment PDF text pages into chunks for each faculty enrollment, lazily.
+
+    Yields the same chunks as `segment_pdf_content("".join(pages))` while holding
+    at most one unfinished enrollment group and one page in memory. Faculty groups
+    spanning page boundaries stay in the buffer until the next group starts.
+    """
+    buffer = ""
+
+    for page in pages:
+        # Chunks are yielded outside of the stage, the consumer's time is not segmentation
+        with instrumentation.stage("segmentation"):
+            buffer += page
+
+            # Split before the last complete group start, everything preceding it is final
+            split = None
+            for match in GROUP_START_LINE_PATTERN.finditer(buffer):
+                split = match.start()
+
+            chunks = []
+            if split:
+                chunks = segment_pdf_content(buffer[:split])
+                buffer = buffer[split:]
+
+        instrumentation.count("segmentation", "chunks", len(chunks))
+        yield from chunks
+
+    if buffer:
+        with instrumentation.stage("segmentation"):
+            chunks = segment_pdf_content(buffer)
+
+        instrumentation.count("segmentation", "chunks", len(chunks))
+        yield from chunks
@@ -0,0 +1,93 @@
+"""
+Single-pass tokenizer of faculty enrollment chunks.
+
+The patterns of `extractors` are combined into one precompiled scanner, every line of a
+chunk is matched against all of them in a single pass, instead of four separate
+searches over the chunk. Produces the same university, faculty, subjects and
+enrollment rows as `extractors`, as an `EnrollmentBatch` filled from the matched text.
+"""
+import logging
+import re
+
+import numpy as np
+
+from src.enrollments.batch import EnrollmentBatch, score_matrix
+
+logger = logging.getLogger(__name__)
+
+# Alternatives of the scanner, in order of precedence at the same line
+TOKEN_PATTERN = re.compile(
+    # RANK STUDENT_ID SUBJECT_SCORES{3,4} CONTEST_SCORE GRANT_AMOUNT(Ignored)
+    r"^(\d+)\s+(\d{9})\s+((?:\d{3}\.\d\s+){3,4})(\d+\.\d)(?:[ \t]+(?:50|70|100))?"
+    # FACULTY_ID FACULTY_NAME (possibly on several lines) წლიური გადასახადი
+    r"|^(\d{8,11})\s+((?s:.+?))\s+წლიური გადასახადი"
+    # საგამოცდოს SUBJECTS საკონკურსო
+    r"|საგამოცდოს\s+(.+?)\s+საკონკურსო"
+    # UNIVERSITY_ID UNIVERSITY_NAME
+    r"|^(\d{3})\s+(.+?)\n",
+    flags=re.MULTILINE
+)
+
+
+def tokenize_chunk(chunk, year=None):
+    """
+    Tokenize a faculty enrollment chunk in a single pass.
+
+    The first university, faculty and subjects tokens of the chunk are kept, as with the
+    searches of `extractors`. Row columns are collected as matched text and converted to
+    arrays at once.
+
+    :param year: Year of the enrollment list, stored in the batch.
+    :return: `EnrollmentBatch` of the chunk.
+    """
+    university = None
+    faculty = None
+    subjects = None
+    ranks = []
+    student_ids = []
+    contest_scores = []
+    subject_scores = []
+
+    for (rank, student_id, row_scores, contest_score,
+         faculty_id, faculty_name, taken_subjects, university_id, university_name) in TOKEN_PATTERN.findall(chunk):
+        if rank:
+            ranks.append(rank)
+            student_ids.append(student_id)
+            subject_scores.append(row_scores)
+            contest_scores.append(contest_score)
+        elif faculty_id:
+            if faculty is None:
+                faculty = (faculty_id, faculty_name.strip())
+        elif taken_subjects:
+            if subjects is None:
+                subjects = taken_subjects.strip().split()
+        elif university is None:
+            university = (university_id, university_name.strip())
+
+    if university is None:
+        logger.error("university ID/name not found in the given text chunk:\n%s", chunk)
+        raise ValueError("university ID/name not found in the given text chunk.")
+
+    if faculty is None:
+        logger.error("Faculty ID/name not found in the given text chunk:\n%s", chunk)
+        raise ValueError("Faculty ID/name not found in the given text chunk.")
+
+    # Every score has one decimal point, rows of a faculty usually have the same number of scores
+    widths = {row_scores.count(".") for row_scores in subject_scores}
+    if len(widths) == 1:
+        matrix = np.array(" ".join(subject_scores).split(), dtype=np.float64).reshape(len(ranks), widths.pop())
+    else:
+        matrix = score_matrix([list(map(float, row_scores.split())) for row_scores in subject_scores])
+
+    return EnrollmentBatch(
+        year=year,
+        university_id=university[0],
+        university_name=university[1],
+        faculty_id=faculty[0],
+        faculty_name=faculty[1],
+        subjects=tuple(subjects or ()),
+        ranks=np.array(ranks, dtype=np.int32),
+        student_ids=np.array(student_ids, dtype=np.int64),
+        contest_scores=np.array(contest_scores, dtype=np.float64),
+        subject_scores=matrix,
+    )
@@ -1,36 +1,17 @@
+import logging
 import os
 import re
+import sys
 
-import pdfplumber
-import pandas as pd
+from src import constants, config, ingestion, instrumentation, pdf_extraction
+from src.grants import tokenizer
 
-from src import constants, config
-from src.db import api
+logger = logging.getLogger(__name__)
 
 
 def main():
-    # List available PDF files
-    print("Available PDF files:")
-    pdfs = sorted(os.listdir(config.GRANTS_DATA_DIR))
-
-    # Display the list of PDF files
-    for i, pdf in enumerate(pdfs, start=1):
-        print(f"{i}. {pdf}")
-
-    # Prepare data for database insertion
-    data = []
-    for pdf in pdfs:
-        result = process_pdf_to_tuple_list(pdf)
-        data.extend(result)
-
-    # save as csv file for backup if DB insertion fails
-    print("Saving data to a CSV file for backup...")
-    df = pd.DataFrame(data, columns=["student_id", "grant_score", "grant_amount", "subject_name", "year"])
-    df.to_csv(config.DATA_DIR + "/grants_data.csv", index=False)
-
-    # Insert data into the database
-    print("Inserting into the database...")
-    api.batch_insert_grant_records(data)
+    # Year files are parsed in parallel and written by a single writer, see `src.ingestion`
+    ingestion.main(["--kind", "grant"] + sys.argv[1:])
 
 
 def extract_subject_and_percentage(text):
@@ -69,39 +50,43 @@ def extract_table_of_records(text):
     return records
 
 
-def process_pdf_to_tuple_list(pdf_filename):
+def process_pdf_to_tuple_list(pdf_filename, workers=None):
     """
     Process a PDF file, extract data from each page, and return a list of tuples for database insertion.
+
+    :param pdf_filename: Name of the PDF file in the grants data directory.
+    :param workers: Number of extraction processes, defaults to `config.PDF_EXTRACTION_WORKERS`.
     """
     # Convert PDF to images
-    print(f"Converting file {pdf_filename} to textual content...")
+    logger.info("Converting file %s to textual content...", pdf_filename)
 
     pdf_path = os.path.join(config.GRANTS_DATA_DIR, pdf_filename)
 
-    with pdfplumber.open(pdf_path) as pdf:
-        page_contents = [page.extract_text() for page in pdf.pages]
+    with instrumentation.stage("pdf_extraction"):
+        page_contents = pdf_extraction.extract_pages(pdf_path, workers=workers)
+    instrumentation.count("pdf_extraction", "pages", len(page_contents))
 
     # Initialize a list to store the extracted data
     records = []
     year = int(pdf_filename.split(".")[0])  # Extract year from the filename
 
     # Process each page
-    for page_number, page_content in enumerate(page_contents):
-        # Extract subject and percentage
-        subject_name, grant_amount = extract_subject_and_percentage(page_content)
-
-        # Extract student records
-        student_records = extract_table_of_records(page_content)
-
-        # Add records as tuples (student_id, grant_score, subject, percentage, year)
-        for record in student_records:
-            records.append((
-                record["student_id"],  # student_id
-                record["grant_score"],  # grant_score
-                int(grant_amount[:-1]),  # percentage (converted to integer)
-                subject_name,  # subject name of acquired grant
-                year  # year
-            ))
+    with instrumentation.stage("extraction"):
+        for page_number, page_content in enumerate(page_contents):
+            # Extract subject, percentage and student records in a single pass
+            subject_name, grant_amount, student_records = tokenizer.tokenize_page(page_content)
+
+            # Add records as tuples (student_id, grant_score, subject, percentage, year)
+            for student_id, grant_score in student_records:
+                records.append((
+                    student_id,  # student_id
+                    grant_score,  # grant_score
+                    grant_amount,  # percentage
+                    subject_name,  # subject name of acquired grant
+                    year  # year
+                ))
+    instrumentation.count("extraction", "pages", len(page_contents))
+    instrumentation.count("extraction", "rows", len(records))
 
     return records
 
@@ -0,0 +1,50 @@
+"""
+Single-pass tokenizer of grant list pages.
+
+The patterns of `grant_parser.extract_subject_and_percentage` and `extract_table_of_records`
+are combined into one precompiled scanner, so a page is scanned once instead of once for
+the header and once per line. Produces the same subject, grant amount and records.
+"""
+import logging
+import re
+
+from src import constants
+
+logger = logging.getLogger(__name__)
+
+# Alternatives of the scanner, in order of precedence at the same position
+TOKEN_PATTERN = re.compile(
+    # STUDENT_ID GRANT_SCORE, e.g. "401500482 6082.0", separated within the line
+    r"^(\d+)[^\S\n]+(\d+\.\d+)"
+    # Subject name of the page header, alternatives in mapping order
+    rf"|({'|'.join(constants.SUBJECTS_KA_TO_EN_MAPPING.keys())})"
+    # Grant amount of the page header, e.g. "100%"
+    r"|(\d+)%",
+    flags=re.MULTILINE
+)
+
+
+def tokenize_page(text):
+    """
+    Tokenize a grant list page in a single pass.
+
+    :return: Tuple of (subject_name, grant_amount, records) with records as (student_id, grant_score) tuples.
+    """
+    subject_name = None
+    grant_amount = None
+    records = []
+
+    for student_id, grant_score, subject, percentage in TOKEN_PATTERN.findall(text):
+        if student_id:
+            records.append((student_id, float(grant_score)))
+        elif subject:
+            if subject_name is None:
+                subject_name = constants.SUBJECTS_KA_TO_EN_MAPPING[subject]
+        elif grant_amount is None:
+            grant_amount = int(percentage)
+
+    if subject_name is None or grant_amount is None:
+        logger.error("Subject name or grant amount not found in the given page:\n%s", text)
+        raise ValueError("Subject name or grant amount not found in the given page.")
+
+    return subject_name, grant_amount, records
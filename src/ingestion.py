@@ -0,0 +1,297 @@
+"""
+Ingestion of all enrollment and grant year PDFs at once.
+
+Year files are independent until they reach the database, so each changed file is parsed
+in a process pool of `config.INGESTION_WORKERS` processes. Workers write the file's snapshot
+and stream its parsed records in batches over a bounded queue to this process, the single
+writer owning the SQLite connection, so parsers never contend for the database lock.
+
+Batches of different years arrive interleaved; the writer replaces one year at a time in
+its own transaction (see `api.replace_enrollment_year`), streaming the year's batches into
+it as they arrive and buffering the batches of the other years meanwhile. A year is
+committed once its worker reports the snapshot written. A file failing to parse rolls its
+year back and is reported, the other years are written as usual.
+
+Usage: python -m src.ingestion [--kind enrollment|grant] [--force] [--workers N]
+"""
+import argparse
+import collections
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src import config, instrumentation, page_cache, snapshots
+from src.db import api, calibration, cross_faculty, score_index
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("enrollment", "grant")
+
+# Grant records sent per queue message, enrollment records are batched by `config.INSERT_BATCH_SIZE`
+GRANT_BATCH_SIZE = 10000
+
+# Seconds the writer waits for a message before checking for crashed workers
+QUEUE_POLL_SECONDS = 1.0
+
+# Queue of the worker processes, set by `init_worker`
+_queue = None
+
+
+class IngestionError(Exception):
+    pass
+
+
+def get_data_dir(kind):
+    return config.ENROLLMENT_DATA_DIR if kind == "enrollment" else config.GRANTS_DATA_DIR
+
+
+def list_jobs(kinds=KINDS, force=False):
+    """
+    List year files to ingest, skipping files ingested before with the same content.
+
+    :param force: Ingest unchanged files as well.
+    :return: List of (kind, year, pdf_filename, file_hash) tuples.
+    """
+    jobs = []
+    for kind in kinds:
+        for pdf_filename in sorted(os.listdir(get_data_dir(kind))):
+            year = int(pdf_filename.split(".")[0])
+            file_hash = page_cache.file_hash(os.path.join(get_data_dir(kind), pdf_filename))
+            if not force and api.get_ingested_file_hash(kind, year) == file_hash:
+                logger.info("Skipping %s %s, already ingested.", kind, pdf_filename)
+                continue
+
+            jobs.append((kind, year, pdf_filename, file_hash))
+
+    return jobs
+
+
+def init_worker(queue):
+    global _queue
+    _queue = queue
+
+
+def iter_sent_batches(key, records, batch_size):
+    """
+    Send records to the writer in batches while passing them through.
+    """
+    for batch in api.iter_batches(records, batch_size):
+        _queue.put(("batch", key, batch))
+        yield from batch
+
+
+def parse_file(kind, year, pdf_filename, file_hash, extraction_workers):
+    """
+    Parse a year file in a worker process, write its snapshot and stream its records to the writer.
+
+    The last message of a file is ("done", key, (records, stages)) once its snapshot is written,
+    with the stages of `instrumentation.Run` recorded while parsing it, or ("failed", key, error)
+    if parsing or the snapshot failed.
+
+    :return: Number of parsed records.
+    """
+    # Imported here, the parsers import this module at the top for their entry points
+    from src.enrollments import enrollment_parser
+    from src.grants import grant_parser
+
+    key = (kind, year)
+    # Stages are recorded by this process, the writer merges them into the run of the ingestion
+    with instrumentation.collect(f"{kind}_{year}") as parse_run:
+        try:
+            if kind == "enrollment":
+                records = enrollment_parser.iter_enrollment_records(pdf_filename, workers=extraction_workers)
+                count = snapshots.write_enrollment_snapshot(
+                    year, iter_sent_batches(key, records, config.INSERT_BATCH_SIZE), pdf_filename, file_hash
+                )
+            else:
+                records = grant_parser.process_pdf_to_tuple_list(pdf_filename, workers=extraction_workers)
+                count = snapshots.write_grant_snapshot(year, records, pdf_filename, file_hash)
+                for batch in api.iter_batches(records, GRANT_BATCH_SIZE):
+                    _queue.put(("batch", key, batch))
+        except Exception as e:
+            _queue.put(("failed", key, f"{type(e).__name__}: {e}"))
+            raise
+
+    _queue.put(("done", key, (count, parse_run.stages)))
+    return count
+
+
+class BatchRouter:
+    """
+    Demultiplexes the interleaved messages of the workers into per-year streams.
+    """
+
+    def __init__(self, queue, futures):
+        """
+        :param futures: Dictionary of (kind, year) to the future of its `parse_file` call.
+        """
+        self.queue = queue
+        self.futures = futures
+        self.buffers = collections.defaultdict(collections.deque)
+        self.finished = set()
+        self.discarded = set()
+
+    def receive(self):
+        """
+        Buffer the next message, or a failure of a worker that exited without reporting.
+        """
+        try:
+            message = self.queue.get(timeout=QUEUE_POLL_SECONDS)
+        except queue_module.Empty:
+            for key, future in self.futures.items():
+                if key not in self.finished and future.done() and future.exception() is not None:
+                    self.finished.add(key)
+                    self.buffers[key].append(("failed", key, f"Worker failed: {future.exception()!r}"))
+            return
+
+        kind, key, payload = message
+        if kind in ("done", "failed"):
+            self.finished.add(key)
+        if key not in self.discarded:
+            self.buffers[key].append(message)
+
+    def next_key(self, remaining):
+        """
+        Year to write next: a completely received one if any, else the one with most buffered batches.
+        """
+        while True:
+            complete = [key for key in remaining if key in self.finished]
+            if complete:
+                return complete[0]
+
+            buffered = [key for key in remaining if self.buffers[key]]
+            if buffered:
+                return max(buffered, key=lambda key: len(self.buffers[key]))
+
+            self.receive()
+
+    def iter_records(self, key):
+        """
+        Yield the records of a year as they arrive, until its worker is done. The stages the
+        worker recorded are then added to the current run.
+
+        :raises IngestionError: If the worker reports a failure.
+        """
+        received = 0
+        while True:
+            while not self.buffers[key]:
+                self.receive()
+
+            kind, _, payload = self.buffers[key].popleft()
+            if kind == "failed":
+                raise IngestionError(payload)
+            if kind == "done":
+                _, stages = payload
+                instrumentation.merge_stages(stages)
+                return
+
+            received += len(payload)
+            logger.info("%s %d: %d records received", *key, received)
+            yield from payload
+
+    def discard(self, key):
+        """
+        Drop buffered and future messages of a year.
+        """
+        self.discarded.add(key)
+        self.buffers.pop(key, None)
+
+
+def write_year(router, kind, year, pdf_filename, file_hash):
+    """
+    Replace a year in the database with the records streamed by its worker.
+    """
+    records = router.iter_records((kind, year))
+    if kind == "enrollment":
+        api.replace_enrollment_year(year, records, pdf_filename, file_hash)
+    else:
+        api.replace_grant_year(year, list(records), pdf_filename, file_hash)
+
+
+def ingest(kinds=KINDS, force=False, workers=None):
+    """
+    Parse changed year files in parallel and write them to the database, one year at a time.
+
+    :param kinds: Kinds of files to ingest.
+    :param force: Ingest unchanged files as well.
+    :param workers: Number of parsing processes, defaults to `config.INGESTION_WORKERS`.
+    :return: Dictionary of (kind, year) to a dictionary with "status" ("succeeded" or "failed"),
+        "seconds" from the start of the ingestion until the year was written, and "error".
+    """
+    jobs = list_jobs(kinds, force)
+    if not jobs:
+        logger.info("All files are ingested already.")
+        return {}
+
+    workers = max(1, min(workers or config.INGESTION_WORKERS, len(jobs)))
+    # Cores left over by the file level parallelism go to the page extraction of each file
+    extraction_workers = max(1, config.PDF_EXTRACTION_WORKERS // workers)
+    logger.info("Ingesting %d files with %d processes", len(jobs), workers)
+
+    start = time.perf_counter()
+    # Queue owned by a manager process: a worker dying in the middle of a put would leave a partial
+    # message in the pipe of a `multiprocessing.Queue`, blocking the writer reading it for good
+    with multiprocessing.Manager() as manager:
+        queue = manager.Queue(config.INGESTION_QUEUE_SIZE)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(queue,)) as executor:
+            futures = {
+                (kind, year): executor.submit(parse_file, kind, year, pdf_filename, file_hash, extraction_workers)
+                for kind, year, pdf_filename, file_hash in jobs
+            }
+            return write_years(BatchRouter(queue, futures), jobs, start)
+
+
+def write_years(router, jobs, start):
+    """
+    Write the years of the jobs in the order their records arrive, see `ingest`.
+    """
+    jobs_by_key = {(kind, year): (pdf_filename, file_hash) for kind, year, pdf_filename, file_hash in jobs}
+    results = {}
+
+    remaining = list(jobs_by_key)
+    while remaining:
+        key = router.next_key(remaining)
+        remaining.remove(key)
+
+        try:
+            write_year(router, *key, *jobs_by_key[key])
+        except Exception as e:
+            logger.error("%s %d failed: %s", *key, e)
+            router.discard(key)
+            results[key] = {"status": "failed", "seconds": time.perf_counter() - start, "error": str(e)}
+            continue
+
+        results[key] = {"status": "succeeded", "seconds": time.perf_counter() - start, "error": None}
+        logger.info("%s %d written, %d of %d files done", *key, len(results), len(jobs))
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest enrollment and grant PDFs of all years in parallel.")
+    parser.add_argument("--kind", choices=KINDS, action="append", help="kind of files, defaults to all")
+    parser.add_argument("--force", action="store_true", help="ingest unchanged files as well")
+    parser.add_argument("--workers", type=int, default=config.INGESTION_WORKERS, help="number of parsing processes")
+    args = parser.parse_args(argv)
+
+    with instrumentation.run("ingestion"):
+        results = ingest(tuple(args.kind or KINDS), args.force, args.workers)
+
+        if any(kind == "enrollment" and result["status"] == "succeeded" for (kind, _), result in results.items()):
+            # Fit exam parameters and raw scores, infer faculty subjects and rebuild the score index of replaced years
+            calibration.calibrate()
+            cross_faculty.refresh_faculty_subjects()
+            score_index.refresh_index()
+
+        for (kind, year), result in sorted(results.items()):
+            logger.info("%-10s %d %-9s %6.1fs %s", kind, year, result["status"], result["seconds"], result["error"] or "")
+
+    if any(result["status"] == "failed" for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
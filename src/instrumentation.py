@@ -0,0 +1,386 @@
+"""
+Instrumentation of pipeline runs: logging, stage timers, throughput counters, SQL timings
+and peak memory, written as a JSON run report at the end of each run.
+
+Stages measure self time: while a nested stage runs (e.g. PDF extraction pulled by
+segmentation), the time is attributed to the nested stage only. Outside of a run, stages,
+counters and SQL timings are not recorded.
+
+    with instrumentation.run("enrollment_ingestion"):
+        with instrumentation.stage("segmentation"):
+            ...
+        instrumentation.count("segmentation", "chunks", len(chunks))
+
+Verbosity is set with `NAEC_LOG_LEVEL` (e.g. DEBUG, INFO, WARNING), tracemalloc peak memory
+tracking is enabled with `NAEC_TRACE_MEMORY=1`, it slows allocation heavy stages down.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+# Longest SQL statement text kept in the report
+SQL_STATEMENT_LENGTH = 200
+
+_run = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Run:
+    """
+    Measurements of a single run.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.queries = {}
+
+    def add_stage_time(self, name, seconds, calls=0):
+        with _lock:
+            stage_stats = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "counters": {}})
+            stage_stats["seconds"] += seconds
+            stage_stats["calls"] += calls
+
+    def add_count(self, name, counter, value):
+        with _lock:
+            stage_stats = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "counters": {}})
+            stage_stats["counters"][counter] = stage_stats["counters"].get(counter, 0) + value
+
+    def add_query(self, statement, seconds, rows, calls=1):
+        with _lock:
+            query_stats = self.queries.setdefault(statement, {"calls": 0, "seconds": 0.0, "rows": 0})
+            query_stats["calls"] += calls
+            query_stats["seconds"] += seconds
+            query_stats["rows"] += max(rows, 0)
+
+    def report(self, status):
+        """
+        Build the run report, with counter rates per second of stage time.
+        """
+        stages = {}
+        for name, stage_stats in self.stages.items():
+            seconds = stage_stats["seconds"]
+            stages[name] = {
+                "seconds": round(seconds, 6),
+                "calls": stage_stats["calls"],
+                "counters": stage_stats["counters"],
+                "rates": {
+                    f"{counter}_per_second": round(value / seconds, 1)
+                    for counter, value in stage_stats["counters"].items() if seconds > 0
+                },
+            }
+
+        queries = [
+            {"statement": statement, "calls": query_stats["calls"], "rows": query_stats["rows"],
+             "seconds": round(query_stats["seconds"], 6)}
+            for statement, query_stats in sorted(self.queries.items(), key=lambda item: -item[1]["seconds"])
+        ]
+
+        # Imported by runs only, query commands connecting through this module do not need them
+        import tracemalloc
+        try:
+            import resource
+        except ImportError:  # Not available on Windows
+            resource = None
+
+        memory = {}
+        if tracemalloc.is_tracing():
+            memory["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        if resource is not None:
+            # ru_maxrss is in KiB on Linux
+            memory["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        return {
+            "run": self.name,
+            "status": status,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - self.start, 6),
+            "stages": stages,
+            "queries": queries,
+            "memory": memory,
+        }
+
+
+def configure_logging(level=None):
+    """
+    Configure the root logger once, with verbosity from `level` or `config.LOG_LEVEL`.
+    """
+    level = level or config.LOG_LEVEL
+    logging.basicConfig(level=level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def write_report(report, report_path=None):
+    """
+    Write a run report as JSON, by default to `config.RUN_REPORT_DIR/<run>-<started_at>.json`.
+    """
+    if report_path is None:
+        started_at = report["started_at"].replace(":", "").replace("-", "").split("+")[0]
+        report_path = os.path.join(config.RUN_REPORT_DIR, f"{report['run']}-{started_at}.json")
+
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+
+    return report_path
+
+
+@contextmanager
+def run(name, report_path=None, trace_memory=None):
+    """
+    Record a run and write its report when it ends, also when it fails.
+
+    :param name: Name of the run, e.g. "enrollment_ingestion".
+    :param report_path: Path of the JSON report, see `write_report`.
+    :param trace_memory: Track peak memory with tracemalloc, defaults to `config.TRACE_MEMORY`.
+    """
+    global _run
+    import tracemalloc
+
+    configure_logging()
+    if trace_memory is None:
+        trace_memory = config.TRACE_MEMORY
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    previous_run = _run
+    _run = Run(name)
+    status = "failed"
+    try:
+        yield _run
+        status = "succeeded"
+    finally:
+        report = _run.report(status)
+        _run = previous_run
+        if started_tracing:
+            tracemalloc.stop()
+
+        report_path = write_report(report, report_path)
+        logger.info("Run %s %s in %.1fs, report written to %s", name, status, report["seconds"], report_path)
+
+
+@contextmanager
+def collect(name):
+    """
+    Record stages of the block into a separate run without writing a report, e.g. in a worker
+    process, whose copy of the parent's run is never reported. Its stages are sent to the
+    parent and added to its run with `merge_stages`.
+
+    :return: The `Run` of the block.
+    """
+    global _run
+
+    previous_run, previous_stack = _run, _get_stack()
+    _run = Run(name)
+    _local.stack = []
+    try:
+        yield _run
+    finally:
+        _run = previous_run
+        _local.stack = previous_stack
+
+
+def merge_stages(stages):
+    """
+    Add stage times and counters of another run, e.g. `Run.stages` of a worker, to the current run.
+
+    Times of runs in parallel processes add up, a stage can take longer than the run.
+    """
+    if _run is None:
+        return
+
+    for name, stage_stats in stages.items():
+        _run.add_stage_time(name, stage_stats["seconds"], stage_stats["calls"])
+        for counter, value in stage_stats["counters"].items():
+            _run.add_count(name, counter, value)
+
+
+def _get_stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def stage(name):
+    """
+    Time the block as self time of a stage, pausing the enclosing stage meanwhile.
+
+    Must not be held across `yield` of a generator, the consumer's time would be counted.
+    """
+    current_run = _run
+    if current_run is None:
+        yield
+        return
+
+    stack = _get_stack()
+    now = time.perf_counter()
+    if stack:
+        parent = stack[-1]
+        current_run.add_stage_time(parent[0], now - parent[1])
+
+    entry = [name, now]
+    stack.append(entry)
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        current_run.add_stage_time(name, now - entry[1], calls=1)
+        stack.pop()
+        if stack:
+            stack[-1][1] = now
+
+
+def count(stage_name, counter, value=1):
+    """
+    Add to a counter of a stage, e.g. `count("pdf_extraction", "pages")`.
+    """
+    if _run is not None:
+        _run.add_count(stage_name, counter, value)
+
+
+def timed_iter(iterable, stage_name, counter):
+    """
+    Yield items of an iterable, timing the production of each item as a stage and counting them.
+    """
+    iterator = iter(iterable)
+    while True:
+        with stage(stage_name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        count(stage_name, counter)
+        yield item
+
+
+def normalize_statement(sql):
+    """
+    Statement text as reported, whitespace collapsed and truncated to `SQL_STATEMENT_LENGTH`.
+    """
+    return " ".join(sql.split())[:SQL_STATEMENT_LENGTH]
+
+
+def record_query(sql, seconds, rows=-1):
+    if _run is not None:
+        _run.add_query(normalize_statement(sql), seconds, rows)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor recording the time of every executed statement in the current run.
+
+    SQLite runs a query while its rows are stepped through, `execute` only steps to the first
+    one, so fetching rows is timed too and added to the statement. Rows of a statement are the
+    changed rows of writes and the fetched rows of queries.
+    """
+
+    # Reported text of the statement last executed in a run, its fetched rows are added to it
+    _statement = None
+
+    def execute(self, sql, parameters=()):
+        self._statement = None if _run is None else normalize_statement(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            if self._statement is not None:
+                _run.add_query(self._statement, time.perf_counter() - start, self.rowcount)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._statement = None
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start, self.rowcount)
+
+    def executescript(self, sql_script):
+        self._statement = None
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            record_query(sql_script, time.perf_counter() - start)
+
+    def _record_fetch(self, start, rows):
+        if _run is not None and self._statement is not None:
+            _run.add_query(self._statement, time.perf_counter() - start, rows, calls=0)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._record_fetch(start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._record_fetch(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._record_fetch(start, len(rows))
+        return rows
+
+    def __iter__(self):
+        # Outside of a run, rows are stepped through by the cursor itself at full speed
+        if _run is None or self._statement is None:
+            return self
+        return self._iter_timed()
+
+    def _iter_timed(self):
+        seconds = 0.0
+        rows = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                row = sqlite3.Cursor.fetchone(self)
+                seconds += time.perf_counter() - start
+                if row is None:
+                    return
+                rows += 1
+                yield row
+        finally:
+            if _run is not None:
+                _run.add_query(self._statement, seconds, rows, calls=0)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors and shortcut methods record statement timings.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connect(database, **kwargs):
+    """
+    `sqlite3.connect` returning a connection that records statement timings.
+    """
+    return sqlite3.connect(database, factory=TimedConnection, **kwargs)
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+from src import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS document
+(
+    file_hash         CHAR(64)     NOT NULL, -- SHA-256 of the PDF file content.
+    extractor_version VARCHAR(255) NOT NULL, -- Version of the text extraction producing the pages.
+    page_count        INTEGER      NOT NULL, -- Total number of pages of the file.
+    size              INTEGER      NOT NULL, -- Total size of cached page text in bytes.
+    last_used         FLOAT        NOT NULL, -- Timestamp of the last read or write, for eviction.
+    PRIMARY KEY (file_hash, extractor_version)
+);
+
+CREATE TABLE IF NOT EXISTS page
+(
+    file_hash         CHAR(64)     NOT NULL,
+    extractor_version VARCHAR(255) NOT NULL,
+    page_number       INTEGER      NOT NULL,
+    text              TEXT         NOT NULL,
+    PRIMARY KEY (file_hash, extractor_version, page_number)
+);
+"""
+
+
+def file_hash(path):
+    """
+    Compute SHA-256 hex digest of a file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def connect():
+    """
+    Open the page cache database, creating it if it does not exist.
+
+    Parsing workers of `src.ingestion` write the cache concurrently: the database is in WAL
+    mode, so reads of one worker do not block writes of another, and a write waits up to
+    `config.PAGE_CACHE_BUSY_TIMEOUT` for the others instead of failing as locked.
+    """
+    os.makedirs(os.path.dirname(config.PAGE_CACHE_PATH), exist_ok=True)
+    connection = sqlite3.connect(config.PAGE_CACHE_PATH, timeout=config.PAGE_CACHE_BUSY_TIMEOUT)
+    connection.execute("PRAGMA journal_mode = WAL;")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_page_count(connection, digest, extractor_version):
+    """
+    Return the number of pages of a cached document, or None if it was never cached.
+    """
+    row = connection.execute("""
+        SELECT page_count FROM document
+        WHERE file_hash = ? AND extractor_version = ?;""", (digest, extractor_version)
+    ).fetchone()
+
+    if row is None:
+        return None
+
+    connection.execute("""
+        UPDATE document SET last_used = ?
+        WHERE file_hash = ? AND extractor_version = ?;""", (time.time(), digest, extractor_version)
+    )
+    connection.commit()
+    return row[0]
+
+
+def iter_cached_pages(connection, digest, extractor_version):
+    """
+    Yield (page_number, text) of cached pages of a document in page order.
+    """
+    cursor = connection.execute("""
+        SELECT page_number, text FROM page
+        WHERE file_hash = ? AND extractor_version = ?
+        ORDER BY page_number;""", (digest, extractor_version)
+    )
+    yield from cursor
+
+
+def put_pages(connection, digest, extractor_version, page_count, pages, max_bytes=None):
+    """
+    Store extracted pages of a document and evict old documents above the size limit.
+
+    A document larger than the limit is not stored, it would evict every other document
+    and then itself; its previously cached pages are dropped.
+
+    :param pages: List of (page_number, text) tuples, of pages not cached yet.
+    :param max_bytes: Size limit of the cache, defaults to `config.PAGE_CACHE_MAX_BYTES`.
+    :return: True if the pages were stored.
+    """
+    if max_bytes is None:
+        max_bytes = config.PAGE_CACHE_MAX_BYTES
+
+    cached_size = connection.execute("""
+        SELECT COALESCE(SUM(size), 0) FROM document
+        WHERE file_hash = ? AND extractor_version = ?;""", (digest, extractor_version)
+    ).fetchone()[0]
+    if cached_size + sum(len(text.encode("utf-8")) for _, text in pages) > max_bytes:
+        delete_document(connection, digest, extractor_version)
+        connection.commit()
+        return False
+
+    connection.executemany("""
+        INSERT OR REPLACE INTO page (file_hash, extractor_version, page_number, text)
+            VALUES (?, ?, ?, ?);""", [(digest, extractor_version, number, text) for number, text in pages]
+    )
+
+    size = connection.execute("""
+        SELECT COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0) FROM page
+        WHERE file_hash = ? AND extractor_version = ?;""", (digest, extractor_version)
+    ).fetchone()[0]
+
+    connection.execute("""
+        INSERT OR REPLACE INTO document (file_hash, extractor_version, page_count, size, last_used)
+            VALUES (?, ?, ?, ?, ?);""", (digest, extractor_version, page_count, size, time.time())
+    )
+    connection.commit()
+
+    evict(connection, max_bytes)
+    return True
+
+
+def delete_document(connection, digest, extractor_version):
+    """
+    Delete a document and its pages, without committing.
+    """
+    connection.execute("""
+        DELETE FROM page WHERE file_hash = ? AND extractor_version = ?;""", (digest, extractor_version)
+    )
+    connection.execute("""
+        DELETE FROM document WHERE file_hash = ? AND extractor_version = ?;""", (digest, extractor_version)
+    )
+
+
+def evict(connection, max_bytes):
+    """
+    Delete least recently used documents until the cache fits into `max_bytes`.
+    """
+    documents = connection.execute("""
+        SELECT file_hash, extractor_version, size FROM document
+        ORDER BY last_used DESC;"""
+    ).fetchall()
+
+    total = 0
+    for digest, extractor_version, size in documents:
+        if total + size <= max_bytes:
+            total += size
+            continue
+
+        delete_document(connection, digest, extractor_version)
+
+    connection.commit()
@@ -0,0 +1,141 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+
+from src import config, page_cache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the way page text is produced changes, so cached pages are re-extracted
+EXTRACTOR_VERSION = f"pdfplumber-{pdfplumber.__version__}/extract_text/1"
+
+
+def count_pages(pdf_path):
+    """
+    Return the number of pages of a PDF file.
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_page_numbers(pdf_path, page_numbers):
+    """
+    Extract text of the given pages from a PDF file.
+
+    Runs inside pool workers, so each call opens its own handle of the file.
+    """
+    page_contents = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_number in page_numbers:
+            page = pdf.pages[page_number]
+            page_contents.append(page.extract_text())
+            # Drop cached layout objects, only the text is needed
+            page.close()
+
+    return page_contents
+
+
+def split_page_ranges(total_pages, workers):
+    """
+    Split page indices [0, total_pages) into at most `workers` contiguous ranges.
+    """
+    workers = max(1, min(workers, total_pages))
+    size, remainder = divmod(total_pages, workers)
+
+    ranges = []
+    start = 0
+    for i in range(workers):
+        stop = start + size + (1 if i < remainder else 0)
+        ranges.append((start, stop))
+        start = stop
+
+    return ranges
+
+
+def iter_extracted_pages(pdf_path, page_numbers, workers):
+    """
+    Yield (page_number, text) of the given pages extracted from the PDF file, in order.
+    """
+    if workers <= 1:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_number in page_numbers:
+                page = pdf.pages[page_number]
+                yield page_number, page.extract_text()
+                page.close()
+        return
+
+    batches = [page_numbers[start:stop] for start, stop in split_page_ranges(len(page_numbers), workers)]
+    with ProcessPoolExecutor(max_workers=len(batches)) as executor:
+        results = executor.map(extract_page_numbers, [pdf_path] * len(batches), batches)
+
+        for batch, page_contents in zip(batches, results):
+            yield from zip(batch, page_contents)
+
+
+def iter_pages(pdf_path, workers=None, use_cache=None):
+    """
+    Yield text of every page of a PDF file, in page order.
+
+    Pages are read from the page text cache when the same file content was extracted
+    before, only missing pages go through pdfplumber. With more than one worker, page
+    ranges are extracted in a process pool and put back together in order, the text
+    is identical to the serial path.
+
+    :param pdf_path: Path to the PDF file.
+    :param workers: Number of worker processes, defaults to `config.PDF_EXTRACTION_WORKERS`.
+    :param use_cache: Whether to use the page text cache, defaults to `config.PAGE_CACHE_ENABLED`.
+    """
+    if workers is None:
+        workers = config.PDF_EXTRACTION_WORKERS
+    if use_cache is None:
+        use_cache = config.PAGE_CACHE_ENABLED
+
+    if not use_cache:
+        for _, text in iter_extracted_pages(pdf_path, list(range(count_pages(pdf_path))), workers):
+            yield text
+        return
+
+    connection = page_cache.connect()
+    try:
+        digest = page_cache.file_hash(pdf_path)
+        page_count = page_cache.get_page_count(connection, digest, EXTRACTOR_VERSION)
+        cached = dict(page_cache.iter_cached_pages(connection, digest, EXTRACTOR_VERSION)) \
+            if page_count is not None else {}
+
+        if page_count is None:
+            page_count = count_pages(pdf_path)
+
+        missing = [page_number for page_number in range(page_count) if page_number not in cached]
+        if not missing:
+            for page_number in range(page_count):
+                yield cached.pop(page_number)
+            return
+
+        logger.info("Extracting %d of %d pages, the rest is cached", len(missing), page_count)
+        extracted = []
+        pages = iter_extracted_pages(pdf_path, missing, workers)
+        for page_number in range(page_count):
+            if page_number in cached:
+                yield cached.pop(page_number)
+                continue
+
+            _, text = next(pages)
+            extracted.append((page_number, text))
+            yield text
+
+        page_cache.put_pages(connection, digest, EXTRACTOR_VERSION, page_count, extracted)
+    finally:
+        connection.close()
+
+
+def extract_pages(pdf_path, workers=None, use_cache=None):
+    """
+    Extract text of every page of a PDF file, in page order.
+
+    :param pdf_path: Path to the PDF file.
+    :param workers: Number of worker processes, defaults to `config.PDF_EXTRACTION_WORKERS`.
+    :param use_cache: Whether to use the page text cache, defaults to `config.PAGE_CACHE_ENABLED`.
+    :return: List of page text contents.
+    """
+    return list(iter_pages(pdf_path, workers=workers, use_cache=use_cache))
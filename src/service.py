@@ -0,0 +1,342 @@
+"""
+Local HTTP service of the analysis lookups of `src.db.analysis`, answering in JSON.
+
+    GET  /grant-thresholds
+    GET  /faculties/<faculty_id>/thresholds
+    POST /historical  {"faculty_id": "19701034",
+                       "student_points": {"MATHEMATICS": 46, "FOREIGN LANGUAGE": 69, "GEORGIAN LANGUAGE": 56},
+                       "weights": {"MATHEMATICS": 6, "FOREIGN LANGUAGE": 3, "GEORGIAN LANGUAGE": 3},
+                       "grant_subject": null}
+    POST /forecast    same body as /historical, see `forecast.forecast_admission`
+    POST /faculties/rank  {"student_points": {...}, "top_k": 20, "university_ids": null},
+                          see `cross_faculty.rank_faculties`
+
+Requests are read by one thread per HTTP connection, SQLite reads run on a bounded pool
+of `config.SERVICE_WORKERS` threads, each with its own read-only connection. The database
+is switched to WAL mode on startup, so reads do not block on ingestion and see its
+committed data. Identical requests arriving while one of them is being answered share
+its result instead of querying again.
+
+Usage: python -m src.service [--host HOST] [--port PORT] [--workers N]
+"""
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, urlsplit
+
+from src import config, instrumentation
+from src.db import analysis, cross_faculty, forecast, scoring
+
+logger = logging.getLogger(__name__)
+
+FACULTY_THRESHOLDS_PATH_PATTERN = re.compile(r"^/faculties/(\d+)/thresholds$")
+# Faculty IDs are digit strings, their leading zeros are significant (e.g. 00101015)
+FACULTY_ID_PATTERN = re.compile(r"\d+")
+
+# Largest accepted request body
+MAX_BODY_BYTES = 64 * 1024
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def enable_wal(database_path):
+    """
+    Switch the database to WAL journal mode, it is persistent in the database file.
+    """
+    connection = sqlite3.connect(database_path)
+    try:
+        return connection.execute("PRAGMA journal_mode = WAL;").fetchone()[0]
+    finally:
+        connection.close()
+
+
+class QueryExecutor:
+    """
+    Bounded pool of reader threads with per-thread read-only connections, coalescing
+    identical concurrent queries.
+    """
+
+    def __init__(self, database_path=None, workers=None):
+        """
+        :param database_path: Path to the database file, defaults to `config.DATABASE_PATH`.
+        :param workers: Number of reader threads, defaults to `config.SERVICE_WORKERS`.
+        """
+        self.database_path = database_path or config.DATABASE_PATH
+        self.workers = workers or config.SERVICE_WORKERS
+
+        self._local = threading.local()
+        self._connections = []
+        # Reentrant, the done callback runs right away in `fetch` if the query already finished
+        self._lock = threading.RLock()
+        self._in_flight = {}
+        self.coalesced = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="naec-reader")
+
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Used by its reader thread only, closed by `close` after the pool shut down
+            connection = instrumentation.connect(
+                f"file:{quote(self.database_path)}?mode=ro", uri=True, check_same_thread=False
+            )
+            connection.execute("PRAGMA query_only = 1;")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+
+        return connection
+
+    def _call(self, function, args):
+        return function(self._get_connection(), *args)
+
+    def run(self, key, function, *args):
+        """
+        Run `function(connection, *args)` on the pool with the reader's connection and wait for its result.
+
+        A call with the same key as one still running waits for the same result.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._executor.submit(self._call, function, args)
+                self._in_flight[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+            else:
+                self.coalesced += 1
+
+        return future.result()
+
+    def fetch(self, query, params=()):
+        """
+        Run a read query on the pool and wait for its rows, as dictionaries of column to value.
+        """
+        return self.run((query, tuple(params)), fetch_rows, query, params)
+
+    def _forget(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+
+
+def fetch_rows(connection, query, params):
+    cursor = connection.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def parse_student_request(body):
+    """
+    Validate the body of a `/historical` or `/forecast` request.
+
+    :return: Tuple of (faculty_id, student_points, weights, grant_subject).
+    """
+    try:
+        faculty_id = str(body["faculty_id"])
+        if not FACULTY_ID_PATTERN.fullmatch(faculty_id):
+            raise ValueError(f"Faculty ID must be digits, got {faculty_id!r}")
+        student_points = {subject: float(points) for subject, points in body["student_points"].items()}
+        weights = {subject: float(weight) for subject, weight in body["weights"].items()}
+        grant_subject = body.get("grant_subject")
+
+        # Points of every weighted subject are required
+        student_points = {subject: student_points[subject] for subject in weights}
+    except (KeyError, TypeError, AttributeError, ValueError) as e:
+        raise BadRequest(f"Invalid request: {e}") from e
+
+    return faculty_id, student_points, weights, grant_subject
+
+
+def get_historical_data(executor, body):
+    """
+    Answer `POST /historical`, see `analysis.check_historical_data`.
+    """
+    faculty_id, student_points, weights, grant_subject = parse_student_request(body)
+    try:
+        query, params = scoring.prepare_historical_query(faculty_id, student_points, weights, grant_subject)
+    except ValueError as e:
+        raise BadRequest(f"Invalid request: {e}") from e
+    return executor.fetch(query, params)
+
+
+def get_forecast(executor, body):
+    """
+    Answer `POST /forecast`, see `forecast.forecast_admission`.
+    """
+    faculty_id, student_points, weights, grant_subject = parse_student_request(body)
+
+    def run_forecast(connection):
+        try:
+            return forecast.forecast_admission(
+                faculty_id, student_points, weights, grant_subject, cursor=connection.cursor()
+            )
+        except ValueError as e:
+            raise BadRequest(str(e)) from e
+
+    key = ("forecast", faculty_id, tuple(sorted(student_points.items())), tuple(sorted(weights.items())), grant_subject)
+    return executor.run(key, run_forecast)
+
+
+def get_faculty_ranking(executor, body):
+    """
+    Answer `POST /faculties/rank`, see `cross_faculty.rank_faculties`.
+    """
+    try:
+        student_points = {subject: float(points) for subject, points in body["student_points"].items()}
+        # Unknown subjects are rejected here rather than skipped by the ranking
+        scoring.normalize_subjects(student_points)
+        top_k = body.get("top_k")
+        top_k = None if top_k is None else int(top_k)
+        university_ids = body.get("university_ids")
+        university_ids = None if university_ids is None else tuple(sorted(str(i) for i in university_ids))
+    except (KeyError, TypeError, AttributeError, ValueError) as e:
+        raise BadRequest(f"Invalid request: {e}") from e
+
+    def run_ranking(connection):
+        return cross_faculty.rank_faculties(student_points, top_k, university_ids, cursor=connection.cursor())
+
+    key = ("faculty_ranking", tuple(sorted(student_points.items())), top_k, university_ids)
+    return executor.run(key, run_ranking)
+
+
+POST_ROUTES = {
+    "/historical": get_historical_data,
+    "/forecast": get_forecast,
+    "/faculties/rank": get_faculty_ranking,
+}
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "naec-service"
+    # Headers and body are written separately, with Nagle's algorithm a kept-alive response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, respond):
+        try:
+            self.send_json(HTTPStatus.OK, respond())
+        except BadRequest as e:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except Exception:
+            logger.exception("Failed to answer %s %s", self.command, self.path)
+            self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"})
+
+    def do_GET(self):
+        executor = self.server.executor
+        path = urlsplit(self.path).path
+
+        if path == "/grant-thresholds":
+            self.handle_request(lambda: executor.fetch(analysis.GRANT_THRESHOLDS_QUERY))
+            return
+
+        match = FACULTY_THRESHOLDS_PATH_PATTERN.match(path)
+        if match:
+            faculty_id = match.group(1)
+            self.handle_request(lambda: executor.fetch(analysis.ENROLLMENT_THRESHOLDS_QUERY, (faculty_id,)))
+            return
+
+        self.send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {path}"})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Request body too large"})
+            self.close_connection = True
+            return
+        raw_body = self.rfile.read(length)
+
+        answer = POST_ROUTES.get(path)
+        if answer is None:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {path}"})
+            return
+
+        def respond():
+            try:
+                body = json.loads(raw_body)
+            except ValueError as e:
+                raise BadRequest(f"Invalid JSON body: {e}") from e
+            if not isinstance(body, dict):
+                raise BadRequest("JSON body must be an object")
+
+            return answer(self.server.executor, body)
+
+        self.handle_request(respond)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    """
+    HTTP server answering analysis lookups from a `QueryExecutor`.
+    """
+    daemon_threads = True
+    # Listen backlog, the default of 5 resets connections of clients connecting at once
+    request_queue_size = 128
+
+    def __init__(self, address, executor):
+        super().__init__(address, RequestHandler)
+        self.executor = executor
+
+
+def create_server(host=None, port=None, workers=None, database_path=None):
+    """
+    Enable WAL mode and create a server with its reader pool, serve it with `serve_forever`.
+
+    :param port: Port to listen on, 0 picks a free one, defaults to `config.SERVICE_PORT`.
+    """
+    database_path = database_path or config.DATABASE_PATH
+    journal_mode = enable_wal(database_path)
+    if journal_mode != "wal":
+        logger.warning("Database journal mode is %s, reads may wait for writers", journal_mode)
+
+    executor = QueryExecutor(database_path, workers)
+    return AnalysisServer((host or config.SERVICE_HOST, config.SERVICE_PORT if port is None else port), executor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve analysis lookups over HTTP.")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=config.SERVICE_WORKERS, help="number of SQLite reader threads")
+    args = parser.parse_args()
+
+    instrumentation.configure_logging()
+    server = create_server(args.host, args.port, args.workers)
+    host, port = server.server_address[:2]
+    logger.info("Serving analysis lookups on http://%s:%d with %d readers", host, port, server.executor.workers)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.executor.close()
+
+
+if __name__ == "__main__":
+    main()
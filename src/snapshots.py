@@ -0,0 +1,366 @@
+"""
+Columnar snapshots of parsed PDF data, one directory per kind and year.
+
+Snapshots are written by the parsers before the database insert, so the database can be
+rebuilt from them without parsing the PDFs again. Each table is stored in its own file,
+as Parquet when pyarrow is installed, otherwise as a NumPy `.npz` archive:
+
+    data/snapshots/enrollment_2024/source, faculty, enrollment, subject_score
+    data/snapshots/grant_2024/source, grant
+
+Usage: python -m src.snapshots [--fresh]
+"""
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from src import config, instrumentation
+from src.db import api, calibration, cross_faculty, score_index, setup
+from src.enrollments.batch import EnrollmentBatch
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401  Parquet engine of pandas
+    import pandas as pd
+
+    SNAPSHOT_FORMAT = "parquet"
+except ImportError:
+    SNAPSHOT_FORMAT = "npz"
+
+# Columns and types of the snapshot tables, per kind
+SNAPSHOT_TABLES = {
+    "enrollment": {
+        "source": {"source_file": str, "file_hash": str, "year": np.int64},
+        "faculty": {
+            "university_id": str, "university_name": str, "faculty_id": str, "faculty_name": str,
+        },
+        "enrollment": {"student_id": str, "faculty_id": str, "contest_score": np.float64, "rank": np.int64},
+        "subject_score": {"student_id": str, "subject_name": str, "scaled_score": np.float64},
+    },
+    "grant": {
+        "source": {"source_file": str, "file_hash": str, "year": np.int64},
+        "grant": {"student_id": str, "grant_score": np.float64, "grant_amount": np.int64, "subject_name": str},
+    },
+}
+
+
+def get_snapshot_dir(kind, year):
+    return os.path.join(config.SNAPSHOT_DIR, f"{kind}_{year}")
+
+
+def write_table(path, columns, dtypes):
+    """
+    Write a table of column lists to `path` plus the snapshot format's extension.
+    """
+    arrays = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in dtypes.items()}
+
+    if SNAPSHOT_FORMAT == "parquet":
+        pd.DataFrame(arrays).to_parquet(f"{path}.parquet", index=False)
+    else:
+        np.savez_compressed(f"{path}.npz", **arrays)
+
+
+def read_table(path, dtypes):
+    """
+    Read a table written by `write_table` into a dictionary of column arrays.
+    """
+    if os.path.exists(f"{path}.parquet"):
+        frame = pd.read_parquet(f"{path}.parquet")
+        return {name: frame[name].to_numpy(dtype=dtype) for name, dtype in dtypes.items()}
+
+    with np.load(f"{path}.npz", allow_pickle=False) as archive:
+        return {name: archive[name].astype(dtype) for name, dtype in dtypes.items()}
+
+
+@instrumentation.stage("snapshot_write")
+def write_snapshot(kind, year, tables):
+    """
+    Write the tables of a kind and year, replacing a previous snapshot of it.
+
+    Tables are written to a temporary directory first, so a failed write leaves the previous snapshot intact.
+    """
+    snapshot_dir = get_snapshot_dir(kind, year)
+    temporary_dir = f"{snapshot_dir}.tmp"
+    os.makedirs(temporary_dir, exist_ok=True)
+
+    for table, dtypes in SNAPSHOT_TABLES[kind].items():
+        write_table(os.path.join(temporary_dir, table), tables[table], dtypes)
+
+    if os.path.isdir(snapshot_dir):
+        for filename in os.listdir(snapshot_dir):
+            os.remove(os.path.join(snapshot_dir, filename))
+        os.rmdir(snapshot_dir)
+    os.rename(temporary_dir, snapshot_dir)
+
+    return snapshot_dir
+
+
+@instrumentation.stage("snapshot_read")
+def read_snapshot(kind, year):
+    """
+    Read all tables of a kind and year snapshot.
+
+    :return: Dictionary of table name to dictionary of column arrays.
+    """
+    snapshot_dir = get_snapshot_dir(kind, year)
+    return {
+        table: read_table(os.path.join(snapshot_dir, table), dtypes)
+        for table, dtypes in SNAPSHOT_TABLES[kind].items()
+    }
+
+
+def list_snapshots():
+    """
+    List snapshots in the snapshot directory as (kind, year) tuples, ordered by kind and year.
+    """
+    if not os.path.isdir(config.SNAPSHOT_DIR):
+        return []
+
+    snapshots = []
+    for name in os.listdir(config.SNAPSHOT_DIR):
+        kind, _, year = name.partition("_")
+        if kind in SNAPSHOT_TABLES and year.isdigit():
+            snapshots.append((kind, int(year)))
+
+    return sorted(snapshots)
+
+
+def write_enrollment_snapshot(year, records, source_file, file_hash):
+    """
+    Normalize faculty enrollment batches into snapshot tables and write them.
+
+    :param records: Iterable of `EnrollmentBatch` faculty enrollment groups.
+    :return: Number of written enrollments.
+    """
+    tables = {table: {column: [] for column in dtypes} for table, dtypes in SNAPSHOT_TABLES["enrollment"].items()}
+    tables["source"] = {"source_file": [source_file], "file_hash": [file_hash], "year": [year]}
+    faculty, enrollment, subject_score = tables["faculty"], tables["enrollment"], tables["subject_score"]
+
+    for batch in records:
+        faculty["university_id"].append(batch.university_id)
+        faculty["university_name"].append(batch.university_name)
+        faculty["faculty_id"].append(batch.faculty_id)
+        faculty["faculty_name"].append(batch.faculty_name)
+
+        student_ids = batch.student_ids.astype(str)
+        enrollment["student_id"].append(student_ids)
+        enrollment["faculty_id"].append(np.full(len(batch), batch.faculty_id, dtype=object))
+        enrollment["contest_score"].append(batch.contest_scores)
+        enrollment["rank"].append(batch.ranks)
+
+        # Results of a student are consecutive rows in subject order, subjects are stored with their
+        # database names and paired with scores as in `api.insert_enrollment_batch`
+        subject_names = batch.subject_names[:batch.subject_scores.shape[1]]
+        scores = batch.subject_scores[:, :len(subject_names)]
+        scored = ~np.isnan(scores)
+        subject_score["student_id"].append(np.repeat(student_ids, len(subject_names))[scored.ravel()])
+        subject_score["subject_name"].append(np.tile(np.array(subject_names, dtype=object), len(batch))[scored.ravel()])
+        subject_score["scaled_score"].append(scores[scored])
+
+    for table in (enrollment, subject_score):
+        for column, arrays in table.items():
+            table[column] = np.concatenate(arrays) if arrays else []
+
+    write_snapshot("enrollment", year, tables)
+    return len(enrollment["student_id"])
+
+
+def write_grant_snapshot(year, records, source_file, file_hash):
+    """
+    Write grant records of a year as a snapshot.
+
+    :param records: List of tuples containing (student_id, grant_score, percentage, subject, year)
+    """
+    student_ids, grant_scores, grant_amounts, subject_names, _ = zip(*records) if records else ([],) * 5
+
+    write_snapshot("grant", year, {
+        "source": {"source_file": [source_file], "file_hash": [file_hash], "year": [year]},
+        "grant": {
+            "student_id": student_ids,
+            "grant_score": grant_scores,
+            "grant_amount": grant_amounts,
+            "subject_name": subject_names,
+        },
+    })
+    return len(student_ids)
+
+
+def iter_enrollment_records(tables):
+    """
+    Rebuild faculty enrollment batches from enrollment snapshot tables, see `EnrollmentBatch`.
+
+    One batch is rebuilt per faculty of the faculty table, with all its enrollment rows.
+
+    :raises ValueError: If enrollments belong to a faculty missing from the faculty table.
+    """
+    year = int(tables["source"]["year"][0])
+    faculty, enrollment, subject_score = tables["faculty"], tables["enrollment"], tables["subject_score"]
+
+    # Results of a student are consecutive rows, in the subject order of its faculty: locate
+    # the run of each enrollment row, students without results have an empty one
+    student_ids = subject_score["student_id"]
+    offsets = np.zeros(len(enrollment["student_id"]), dtype=np.int64)
+    counts = np.zeros(len(enrollment["student_id"]), dtype=np.int64)
+    if len(student_ids):
+        starts = np.flatnonzero(np.concatenate(([True], student_ids[1:] != student_ids[:-1])))
+        ends = np.append(starts[1:], len(student_ids))
+        runs = dict(zip(student_ids[starts].tolist(), zip(starts.tolist(), (ends - starts).tolist())))
+        for i, student_id in enumerate(enrollment["student_id"].tolist()):
+            offsets[i], counts[i] = runs.get(student_id, (0, 0))
+
+    subject_names = subject_score["subject_name"]
+    scaled_scores = np.append(subject_score["scaled_score"], np.nan)
+
+    # Enrollments of a faculty, grouped in the order of the faculty table and in their list order
+    # within it: a stable sort by faculty does not rely on the rows of a faculty being consecutive
+    faculties = {}
+    for university_id, university_name, faculty_id, faculty_name in zip(
+            faculty["university_id"].tolist(), faculty["university_name"].tolist(),
+            faculty["faculty_id"].tolist(), faculty["faculty_name"].tolist()):
+        faculties.setdefault(faculty_id, (university_id, university_name, faculty_name))
+    faculty_index = {faculty_id: i for i, faculty_id in enumerate(faculties)}
+    try:
+        groups = np.array([faculty_index[faculty_id] for faculty_id in enrollment["faculty_id"].tolist()],
+                          dtype=np.int64)
+    except KeyError as e:
+        raise ValueError(f"Enrollments of faculty {e.args[0]} without a row in the faculty table") from None
+    order = np.argsort(groups, kind="stable")
+    bounds = np.searchsorted(groups[order], np.arange(len(faculties) + 1))
+
+    for i, (faculty_id, (university_id, university_name, faculty_name)) in enumerate(faculties.items()):
+        rows = order[bounds[i]:bounds[i + 1]]
+        width = int(counts[rows].max()) if len(rows) else 0
+        subjects = ()
+        if width:
+            widest = rows[int(np.argmax(counts[rows]))]
+            subjects = tuple(subject_names[offsets[widest]:offsets[widest] + width].tolist())
+
+        # Scores of shorter runs are padded with the NaN appended to the scores
+        columns = np.arange(width)
+        indices = np.where(columns < counts[rows, None], offsets[rows, None] + columns, len(scaled_scores) - 1)
+
+        yield EnrollmentBatch(
+            year=year,
+            university_id=university_id,
+            university_name=university_name,
+            faculty_id=faculty_id,
+            faculty_name=faculty_name,
+            subjects=subjects,
+            ranks=enrollment["rank"][rows].astype(np.int32),
+            student_ids=enrollment["student_id"][rows].astype(np.int64),
+            contest_scores=enrollment["contest_score"][rows],
+            subject_scores=scaled_scores[indices],
+        )
+
+
+def iter_grant_records(tables):
+    """
+    Rebuild grant record tuples from grant snapshot tables.
+    """
+    year = int(tables["source"]["year"][0])
+    grant = tables["grant"]
+    return [
+        (student_id, grant_score, grant_amount, subject_name, year)
+        for student_id, grant_score, grant_amount, subject_name in zip(
+            grant["student_id"].tolist(), grant["grant_score"].tolist(),
+            grant["grant_amount"].tolist(), grant["subject_name"].tolist(),
+        )
+    ]
+
+
+def load_snapshot(kind, year):
+    """
+    Replace the rows of a kind and year in the database with its snapshot.
+    """
+    tables = read_snapshot(kind, year)
+    source_file = str(tables["source"]["source_file"][0])
+    file_hash = str(tables["source"]["file_hash"][0])
+
+    if kind == "enrollment":
+        api.replace_enrollment_year(year, iter_enrollment_records(tables), source_file, file_hash)
+    else:
+        api.replace_grant_year(year, iter_grant_records(tables), source_file, file_hash)
+
+
+def load_all():
+    """
+    Create the schema if needed and load all snapshots, then refresh the derived tables.
+
+    :return: Number of loaded snapshots.
+    """
+    setup.setup()
+
+    snapshots = list_snapshots()
+    for kind, year in snapshots:
+        load_snapshot(kind, year)
+
+    calibration.calibrate()
+    cross_faculty.refresh_faculty_subjects()
+    score_index.refresh_index()
+    return len(snapshots)
+
+
+def replace_database(build_path, database_path):
+    """
+    Rename a built database file over the database, keeping its journal mode.
+
+    A database in WAL mode is switched to a rollback journal first, which checkpoints and
+    deletes its WAL file: left behind, it would be replayed into the new file. This needs
+    all other connections to the database closed, e.g. the service stopped.
+    """
+    wal = False
+    if os.path.exists(database_path):
+        connection = sqlite3.connect(database_path)
+        try:
+            wal = connection.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+            if wal and connection.execute("PRAGMA journal_mode = DELETE;").fetchone()[0] == "wal":
+                raise RuntimeError(f"{database_path} is in use, close its connections to replace it")
+        finally:
+            connection.close()
+
+    os.replace(build_path, database_path)
+
+    if wal:
+        connection = sqlite3.connect(database_path)
+        connection.execute("PRAGMA journal_mode = WAL;")
+        connection.close()
+
+
+def rebuild(fresh=False):
+    """
+    Rebuild the database from all snapshots, without touching the PDFs.
+
+    :param fresh: Build a new database file from the schema seed, with the unsafe but fast settings of
+        `api.fresh_build`, and rename it over the database once complete.
+    """
+    start = time.perf_counter()
+    if not fresh:
+        snapshot_count = load_all()
+    else:
+        database_path = config.DATABASE_PATH
+        build_path = database_path + ".build"
+        for path in (build_path, build_path + "-journal"):
+            if os.path.exists(path):
+                os.remove(path)
+
+        # Loads of `src.db.api` write to the configured database
+        config.DATABASE_PATH = build_path
+        try:
+            with api.fresh_build(build_path):
+                snapshot_count = load_all()
+        finally:
+            config.DATABASE_PATH = database_path
+
+        replace_database(build_path, database_path)
+
+    logger.info("%d snapshots loaded in %.1fs", snapshot_count, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    with instrumentation.run("snapshot_rebuild"):
+        rebuild(fresh="--fresh" in sys.argv[1:])
@@ -0,0 +1,110 @@
+"""
+Temporary data directories and small databases of the tests.
+"""
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from src import config
+from src.benchmarks import synthetic
+from src.db import api, setup
+from src.enrollments import enrollment_parser, segmentation
+from src.grants import tokenizer as grant_tokenizer
+
+# Paths of `config` moved into the temporary directory, relative to it
+DATA_PATHS = {
+    "DATABASE_PATH": "naec.db",
+    "ENROLLMENT_DATA_DIR": "enrollments",
+    "GRANTS_DATA_DIR": "grants",
+    "SNAPSHOT_DIR": "snapshots",
+    "RUN_REPORT_DIR": "runs",
+    "PAGE_CACHE_PATH": os.path.join("cache", "page_text.db"),
+    "SCORE_INDEX_PATH": os.path.join("cache", "score_index.bin"),
+}
+
+# Years of the fixture database, 2021 of the seed has no exam parameters and no data
+YEARS = (2022, 2023, 2024)
+# Exam parameter left out of the fixture database, its year is missing for subject combinations with it
+MISSING_EXAM_PARAMETER = ("FOREIGN LANGUAGE", 2022)
+# Volume of a synthetic year of the fixture database
+SYNTHETIC_VOLUME = {"FACULTIES": 30, "UNIVERSITIES": 3, "GRANT_RECORDS": 300}
+
+
+def use_temporary_data(test_case):
+    """
+    Point the data paths of `config` to a temporary directory until the test ends.
+
+    :return: Path of the temporary directory.
+    """
+    directory = tempfile.TemporaryDirectory()
+    test_case.addCleanup(directory.cleanup)
+
+    for name, path in DATA_PATHS.items():
+        patcher = mock.patch.object(config, name, os.path.join(directory.name, path))
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+
+    return directory.name
+
+
+def generate_pages(year):
+    """
+    Synthetic (enrollment pages, grant pages) of a year, see `synthetic`.
+    """
+    with mock.patch.multiple(synthetic, **SYNTHETIC_VOLUME):
+        return synthetic.generate_enrollment_pages(seed=year), synthetic.generate_grant_pages(seed=year)
+
+
+def iter_enrollment_batches(pages, year):
+    """
+    Parse enrollment pages of a year into batches, with student IDs unique over the years.
+    """
+    for chunk in segmentation.iter_chunks(pages):
+        batch = enrollment_parser.parse_chunk(chunk, year)
+        # Synthetic student IDs are drawn from 400000000-409999999 for every year
+        batch.student_ids += (year - YEARS[0] + 1) * 10 ** 7
+        yield batch
+
+
+def iter_grant_records(pages, year):
+    for page in pages:
+        subject_name, grant_amount, student_records = grant_tokenizer.tokenize_page(page)
+        for student_id, grant_score in student_records:
+            yield student_id, grant_score, grant_amount, subject_name, year
+
+
+def write_exam_parameters(connection):
+    """
+    Set the exam parameters the synthetic scores are generated with, but `MISSING_EXAM_PARAMETER`.
+    """
+    subject_names = [name for name, in connection.execute("SELECT name FROM subject;").fetchall()]
+    for subject_name in subject_names:
+        min_score, max_score, mean, standard_deviation = synthetic.EXAM_PARAMETERS.get(
+            subject_name, synthetic.ELECTIVE_EXAM_PARAMETERS
+        )
+        for year in YEARS:
+            connection.execute("""
+                INSERT OR REPLACE INTO exam (subject_name, year, max_score, min_score, mean, standard_deviation)
+                    VALUES (?, ?, ?, ?, ?, ?);""",
+                (subject_name, year, max_score, min_score, mean,
+                 None if (subject_name, year) == MISSING_EXAM_PARAMETER else standard_deviation)
+            )
+
+
+def create_database():
+    """
+    Create a database at `config.DATABASE_PATH` with a small synthetic year of enrollments and
+    grants for each of `YEARS`, and the exam parameters of its scores.
+    """
+    setup.setup()
+
+    for year in YEARS:
+        enrollment_pages, grant_pages = generate_pages(year)
+        api.replace_enrollment_year(year, iter_enrollment_batches(enrollment_pages, year), f"{year}.pdf", str(year))
+        api.replace_grant_year(year, list(iter_grant_records(grant_pages, year)), f"{year}.pdf", str(year))
+
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    write_exam_parameters(connection)
+    connection.commit()
+    connection.close()
@@ -0,0 +1,98 @@
+"""
+Tests of the enrollment record batch, see `src.enrollments.batch`.
+
+Usage: python -m unittest tests.test_batch
+"""
+import unittest
+
+import numpy as np
+
+from src.enrollments.batch import EnrollmentBatch, score_matrix
+
+# Georgian subject names of a faculty list and their database names, the last one is not mapped
+SUBJECTS = ("ქართული", "უცხოური", "მათემატიკა", "უცნობი")
+SUBJECT_NAMES = ("GEORGIAN LANGUAGE", "FOREIGN LANGUAGE", "MATHEMATICS", "უცნობი")
+
+
+def make_batch(**columns):
+    arguments = {
+        "year": 2024,
+        "university_id": "001",
+        "university_name": "უნივერსიტეტი",
+        "faculty_id": "00100001",
+        "faculty_name": "ფაკულტეტი",
+        "subjects": SUBJECTS[:3],
+        "ranks": [1, 2, 3],
+        "student_ids": [401000001, 401000002, 401000003],
+        "contest_scores": [1800.0, 1790.5, 1780.0],
+        "subject_scores": [[150.0, 160.0, 170.0], [149.0, 159.0], [148.0, 158.0, 168.0]],
+    }
+    arguments.update(columns)
+    return EnrollmentBatch.from_columns(**arguments)
+
+
+class EnrollmentBatchTest(unittest.TestCase):
+
+    def test_from_columns(self):
+        batch = make_batch()
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch.subjects, SUBJECTS[:3])
+        self.assertEqual(
+            (batch.ranks.dtype, batch.student_ids.dtype, batch.contest_scores.dtype, batch.subject_scores.dtype),
+            (np.int32, np.int64, np.float64, np.float64),
+        )
+        # The shorter row is padded with NaN
+        np.testing.assert_array_equal(batch.subject_scores[1], [149.0, 159.0, np.nan])
+        self.assertEqual(batch.nbytes, 3 * 4 + 3 * 8 + 3 * 8 + 9 * 8)
+        self.assertEqual(batch.subject_names, SUBJECT_NAMES[:3])
+
+    def test_from_columns_without_rows(self):
+        batch = make_batch(ranks=[], student_ids=[], contest_scores=[], subject_scores=[])
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.subject_scores.shape, (0, 0))
+        self.assertEqual(list(batch.iter_result_columns()), [])
+
+    def test_score_matrix(self):
+        np.testing.assert_array_equal(score_matrix([[1.0, 2.0], [3.0, 4.0]]), [[1.0, 2.0], [3.0, 4.0]])
+        np.testing.assert_array_equal(score_matrix([[1.0], [2.0, 3.0]]), [[1.0, np.nan], [2.0, 3.0]])
+        self.assertEqual(score_matrix([[], []]).shape, (2, 0))
+
+    def test_equals(self):
+        batch = make_batch()
+        self.assertTrue(batch.equals(make_batch()))
+        # Padded scores compare equal, NaN is not equal to itself otherwise
+        self.assertTrue(np.isnan(batch.subject_scores).any())
+
+        for name, value in (
+                ("year", 2023),
+                ("faculty_id", "0100001"),
+                ("faculty_name", "სხვა ფაკულტეტი"),
+                ("subjects", SUBJECTS[1:]),
+                ("ranks", [1, 2, 4]),
+                ("student_ids", [401000001, 401000002, 401000004]),
+                ("contest_scores", [1800.0, 1790.0, 1780.0]),
+                ("subject_scores", [[150.0, 160.0, 170.0], [149.0, 159.0, 169.0], [148.0, 158.0, 168.0]])):
+            with self.subTest(name):
+                self.assertFalse(batch.equals(make_batch(**{name: value})))
+                self.assertFalse(make_batch(**{name: value}).equals(batch))
+
+    def test_iter_result_columns(self):
+        batch = make_batch(subjects=SUBJECTS)
+        columns = list(batch.iter_result_columns())
+
+        # One column per score column, the fourth subject has none
+        self.assertEqual([subject_name for subject_name, _, _ in columns], list(SUBJECT_NAMES[:3]))
+        for (_, student_ids, scores), (expected_ids, expected_scores) in zip(columns, (
+                ([401000001, 401000002, 401000003], [150.0, 149.0, 148.0]),
+                ([401000001, 401000002, 401000003], [160.0, 159.0, 158.0]),
+                ([401000001, 401000003], [170.0, 168.0]))):
+            np.testing.assert_array_equal(student_ids, expected_ids)
+            np.testing.assert_array_equal(scores, expected_scores)
+
+    def test_scores_beyond_subjects_are_dropped(self):
+        batch = make_batch(subjects=SUBJECTS[:2])
+        self.assertEqual([subject_name for subject_name, _, _ in batch.iter_result_columns()], list(SUBJECT_NAMES[:2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Tests of the vectorized what-if scoring against the SQL path, see `src.db.batch_analysis`.
+
+Usage: python -m unittest tests.test_batch_analysis
+"""
+import math
+import sqlite3
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src import config
+from src.db import analysis, batch_analysis
+from tests import fixtures
+
+# Scores of both paths are compared with a tolerance, SQLite 3.43 and later sum with compensated summation
+SCORE_TOLERANCE = 1e-9
+
+
+class LookupBelowTest(unittest.TestCase):
+
+    def test_payload_of_greatest_value_below(self):
+        sorted_values = np.array([1.0, 2.0, 2.0, 3.0])
+        payload = np.array([10.0, 20.0, 21.0, 30.0])
+        result = batch_analysis.lookup_below(sorted_values, payload, np.array([0.5, 1.0, 2.5, 9.0]))
+        np.testing.assert_array_equal(result, [np.nan, np.nan, 21.0, 30.0])
+
+    def test_nan_query_finds_nothing(self):
+        result = batch_analysis.lookup_below(np.array([1.0, 2.0]), np.array([10.0, 20.0]), np.array([np.nan, 3.0]))
+        np.testing.assert_array_equal(result, [np.nan, 20.0])
+
+    def test_empty_values_find_nothing(self):
+        result = batch_analysis.lookup_below(np.array([]), np.array([]), np.array([1.0, np.nan]))
+        np.testing.assert_array_equal(result, [np.nan, np.nan])
+
+
+class BatchCheckHistoricalDataTest(unittest.TestCase):
+
+    def setUp(self):
+        fixtures.use_temporary_data(self)
+        fixtures.create_database()
+
+        patcher = mock.patch.object(analysis.result_cache, "maxsize", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        connection = sqlite3.connect(config.DATABASE_PATH)
+        self.faculty_ids = [faculty_id for faculty_id, in connection.execute(
+            "SELECT id FROM faculty ORDER BY id LIMIT 4;"
+        )]
+        connection.close()
+
+        rng = np.random.default_rng(0)
+        subjects = batch_analysis.SUBJECTS
+        bounds = [fixtures.synthetic.EXAM_PARAMETERS[subject][:2] for subject in subjects]
+        self.student_points = np.column_stack([rng.integers(low, high + 1, 40) for low, high in bounds])
+        self.weights = rng.integers(1, 7, (len(self.faculty_ids), len(subjects)))
+
+    def assert_lookup_equal(self, sql_value, batch_value, score, stored_scores):
+        """
+        Compare a rank or grant amount, unless the score ties a stored score within the tolerance:
+        the sums of both paths may round to either side of it.
+        """
+        if len(stored_scores) and np.min(np.abs(stored_scores - score)) < SCORE_TOLERANCE * abs(score):
+            return
+
+        if sql_value is None:
+            self.assertTrue(math.isnan(batch_value))
+        else:
+            self.assertEqual(batch_value, sql_value)
+
+    def test_agrees_with_check_historical_data(self):
+        subjects = batch_analysis.SUBJECTS
+        result = batch_analysis.batch_check_historical_data(self.faculty_ids, self.student_points, self.weights)
+        years = result["years"].tolist()
+
+        connection = sqlite3.connect(config.DATABASE_PATH)
+        grant_cutoffs = batch_analysis.load_grant_cutoffs(connection.cursor(), years, "MATHEMATICS")
+        contest_scores = batch_analysis.load_contest_scores(connection.cursor(), self.faculty_ids, years)
+        connection.close()
+
+        missing_years = {2021, fixtures.MISSING_EXAM_PARAMETER[1]}
+        self.assertTrue(missing_years.issubset(years))
+
+        for s, points in enumerate(self.student_points.tolist()):
+            for f, faculty_id in enumerate(self.faculty_ids):
+                rows = analysis.check_historical_data(
+                    faculty_id, dict(zip(subjects, points)), dict(zip(subjects, self.weights[f].tolist()))
+                )
+                rows_by_year = {row[0]: row for row in rows}
+                self.assertEqual(set(rows_by_year), set(years) - missing_years)
+
+                for y, year in enumerate(years):
+                    if year not in rows_by_year:
+                        for name in ("grant_score", "grant_amount"):
+                            self.assertTrue(math.isnan(result[name][s, y]), (name, year))
+                        for name in ("contest_score", "rank"):
+                            self.assertTrue(math.isnan(result[name][s, f, y]), (name, year))
+                        continue
+
+                    _, grant_score, contest_score, grant_amount, rank, total_enrolled = rows_by_year[year]
+                    self.assertAlmostEqual(result["grant_score"][s, y], grant_score,
+                                           delta=SCORE_TOLERANCE * abs(grant_score))
+                    self.assertAlmostEqual(result["contest_score"][s, f, y], contest_score,
+                                           delta=SCORE_TOLERANCE * abs(contest_score))
+                    self.assert_lookup_equal(grant_amount, result["grant_amount"][s, y],
+                                             grant_score, grant_cutoffs[y][0])
+                    self.assert_lookup_equal(rank, result["rank"][s, f, y], contest_score, contest_scores[f][y][0])
+                    self.assertEqual(result["total_enrolled"][f, y], total_enrolled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests of the inferred faculty weights and the cutoff matrix against the SQL path, see `src.db.cross_faculty`.
+
+Usage: python -m unittest tests.test_cross_faculty
+"""
+import sqlite3
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from src import config
+from src.db import analysis, cross_faculty
+from tests import fixtures
+
+# Scores of both paths are compared with a tolerance, SQLite 3.43 and later sum with compensated summation
+SCORE_TOLERANCE = 1e-9
+# Points of the students, as a share of the point range of each subject
+POINT_LEVELS = (0.3, 0.6, 0.75, 0.9)
+
+
+def get_student_points(subjects, level):
+    points = {}
+    for subject in subjects:
+        min_score, max_score, _, _ = fixtures.synthetic.EXAM_PARAMETERS.get(
+            subject, fixtures.synthetic.ELECTIVE_EXAM_PARAMETERS
+        )
+        points[subject] = round(min_score + level * (max_score - min_score))
+    return points
+
+
+class FitWeightsTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.weights = np.array([3.0, 0.0, 2.0, 1.0])
+        self.scaled_scores = rng.uniform(100, 200, (60, len(self.weights)))
+        self.contest_scores = np.round(self.scaled_scores @ self.weights, 1)
+
+    def test_known_weights_are_rebuilt(self):
+        weights, fit_share = cross_faculty.fit_weights(self.scaled_scores, self.contest_scores)
+        np.testing.assert_array_equal(weights, self.weights)
+        self.assertEqual(fit_share, 1.0)
+
+    def test_too_few_students_are_searched_closest_to_reference(self):
+        # Two students do not determine four weights, least squares finds other ones
+        weights, fit_share = cross_faculty.fit_weights(
+            self.scaled_scores[:2], self.contest_scores[:2], reference=self.weights
+        )
+        np.testing.assert_array_equal(weights, self.weights)
+        self.assertEqual(fit_share, 1.0)
+
+
+class CutoffMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        fixtures.use_temporary_data(self)
+        fixtures.create_database()
+        cross_faculty.refresh_faculty_subjects(force=True)
+
+        patcher = mock.patch.object(analysis.result_cache, "maxsize", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        connection = sqlite3.connect(config.DATABASE_PATH)
+        self.matrix = cross_faculty.CutoffMatrix(connection.cursor())
+        connection.close()
+
+    def test_weights_are_inferred(self):
+        weighted = (self.matrix.weights > 0).any(axis=2)
+        self.assertTrue(weighted.any(axis=1).all())
+        # Synthetic contest scores are weighted sums of scaled scores, they are reproduced
+        self.assertFalse(np.isnan(self.matrix.cutoffs[weighted]).any())
+
+    def test_score_agrees_with_check_historical_data(self):
+        admitted = set()
+        for f, faculty_id in enumerate(self.matrix.faculty_ids[:6]):
+            for y, year in enumerate(self.matrix.years.tolist()):
+                year_weights = self.matrix.weights[f, y]
+                weights = {
+                    subject: int(weight) for subject, weight in zip(self.matrix.subjects, year_weights) if weight > 0
+                }
+                if not weights:
+                    continue
+
+                for level in POINT_LEVELS:
+                    student_points = get_student_points(weights, level)
+                    with self.subTest(faculty_id, year=year, level=level):
+                        contest_score, margin, _ = self.matrix.score(student_points)
+                        rows = {row[0]: row for row in analysis.check_historical_data(faculty_id, student_points, weights)}
+
+                        if year not in rows:
+                            self.assertTrue(np.isnan(contest_score[f, y]))
+                            continue
+
+                        _, _, sql_contest_score, _, rank, _ = rows[year]
+                        self.assertAlmostEqual(contest_score[f, y], sql_contest_score,
+                                               delta=SCORE_TOLERANCE * abs(sql_contest_score))
+                        # Admitted with a place above the last enrolled student, unless within the tolerance of it
+                        if abs(margin[f, y]) >= SCORE_TOLERANCE * abs(sql_contest_score):
+                            self.assertEqual(margin[f, y] > 0, rank is not None)
+                            admitted.add(bool(margin[f, y] > 0))
+
+        # The students fall both below and above the cutoffs
+        self.assertEqual(admitted, {False, True})
+
+    def test_cutoff_score_is_not_admitted(self):
+        faculty_id = self.matrix.faculty_ids[0]
+        weights = {
+            subject: weight for subject, weight in zip(self.matrix.subjects, self.matrix.weights[0, -1]) if weight > 0
+        }
+        student_points = get_student_points(weights, 0.75)
+        contest_score, _, _ = self.matrix.score(student_points)
+
+        # A student scoring exactly the last enrolled student's contest score
+        self.matrix.cutoffs = contest_score.copy()
+        rows = self.matrix.rank(student_points)
+        ranked = {row["faculty_id"]: row for row in rows}
+        self.assertEqual(ranked[faculty_id]["min_margin"], 0)
+        self.assertEqual({row["admitted_years"] for row in rows}, {0})
+
+
+if __name__ == "__main__":
+    unittest.main()
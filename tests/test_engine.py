@@ -0,0 +1,94 @@
+"""
+Tests of the pooled analysis engine reloading on data changes, see `src.db.engine`.
+
+Usage: python -m unittest tests.test_engine
+"""
+import sqlite3
+import threading
+import unittest
+
+from src import config
+from src.db import api
+from src.db.engine import AnalysisEngine
+from tests import fixtures
+
+
+def is_closed(connection):
+    try:
+        connection.execute("SELECT 1;")
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+
+class AnalysisEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        fixtures.use_temporary_data(self)
+        fixtures.create_database()
+
+    def bump_data_version(self):
+        connection = sqlite3.connect(config.DATABASE_PATH)
+        api.bump_data_version(connection.cursor())
+        connection.commit()
+        connection.close()
+
+    def check_reload_closes_previous_pool(self, in_memory):
+        engine = AnalysisEngine(in_memory=in_memory, pool_size=2)
+        self.addCleanup(engine.close)
+        pool = engine._pool
+        memory_connection = pool._memory_connection
+        idle = list(pool._idle)
+
+        with engine.connection() as borrowed:
+            self.bump_data_version()
+            self.assertTrue(engine.refresh())
+            self.assertIsNot(engine._pool, pool)
+
+            # Idle connections are closed at once, the borrowed one and the copy it reads stay usable
+            self.assertEqual([is_closed(connection) for connection in idle], [True, False])
+            self.assertTrue(borrowed.execute("SELECT COUNT(*) FROM enrollment;").fetchone()[0])
+            if in_memory:
+                self.assertFalse(is_closed(memory_connection))
+
+        self.assertTrue(is_closed(borrowed))
+        if in_memory:
+            self.assertTrue(is_closed(memory_connection))
+        self.assertTrue(engine.get_grant_thresholds())
+
+    def test_reload_closes_previous_pool(self):
+        self.check_reload_closes_previous_pool(in_memory=False)
+
+    def test_reload_closes_previous_in_memory_copy(self):
+        self.check_reload_closes_previous_pool(in_memory=True)
+
+    def test_waiting_thread_borrows_from_reloaded_pool(self):
+        engine = AnalysisEngine(in_memory=True, pool_size=1)
+        self.addCleanup(engine.close)
+        results = []
+
+        with engine.connection():
+            # Waits for the only connection, then for one of the reloaded pool
+            thread = threading.Thread(target=lambda: results.append(engine.get_grant_thresholds()))
+            thread.start()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+
+            self.bump_data_version()
+            engine.refresh()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+        self.assertEqual(len(results), 1)
+        self.assertTrue(results[0])
+
+    def test_close_closes_borrowed_connections_when_returned(self):
+        engine = AnalysisEngine(pool_size=2)
+        with engine.connection() as borrowed:
+            engine.close()
+            self.assertFalse(is_closed(borrowed))
+        self.assertTrue(is_closed(borrowed))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Tests of the Monte Carlo admission forecast, see `src.db.forecast`.
+
+Usage: python -m unittest tests.test_forecast
+"""
+import sqlite3
+import unittest
+
+import numpy as np
+
+from src import config
+from src.db import forecast
+from tests import fixtures
+
+WEIGHTS = {"PHYSICS": 4, "MATHEMATICS": 2, "FOREIGN LANGUAGE": 1, "GEORGIAN LANGUAGE": 1}
+STUDENT_POINTS = {"PHYSICS": 48, "MATHEMATICS": 45, "FOREIGN LANGUAGE": 55, "GEORGIAN LANGUAGE": 50}
+
+
+def iter_probabilities(result):
+    yield result["admission"]
+    yield from result["grant"].values()
+
+
+class WilsonIntervalTest(unittest.TestCase):
+
+    def test_known_interval(self):
+        low, high = forecast.wilson_interval(50, 100)
+        self.assertAlmostEqual(low, 0.40383, places=4)
+        self.assertAlmostEqual(high, 0.59617, places=4)
+
+    def test_bounds(self):
+        for trials in (1, 10, 1000):
+            for successes in sorted({0, 1, trials // 2, trials - 1, trials}):
+                with self.subTest(successes=successes, trials=trials):
+                    low, high = forecast.wilson_interval(successes, trials)
+                    self.assertLessEqual(0.0, low)
+                    self.assertLessEqual(low, successes / trials)
+                    self.assertLessEqual(successes / trials, high)
+                    self.assertLessEqual(high, 1.0)
+
+        # Never certain from a finite number of draws, even without a single success or failure
+        self.assertEqual(forecast.wilson_interval(0, 1000)[0], 0.0)
+        self.assertGreater(forecast.wilson_interval(0, 1000)[1], 0.0)
+        self.assertLess(forecast.wilson_interval(1000, 1000)[0], 1.0)
+        self.assertEqual(forecast.wilson_interval(1000, 1000)[1], 1.0)
+
+    def test_narrows_with_trials(self):
+        widths = [np.subtract(*forecast.wilson_interval(trials // 4, trials)[::-1]) for trials in (100, 1000, 10000)]
+        self.assertEqual(widths, sorted(widths, reverse=True))
+
+
+class ForecastAdmissionTest(unittest.TestCase):
+
+    def setUp(self):
+        fixtures.use_temporary_data(self)
+        fixtures.create_database()
+
+        connection = sqlite3.connect(config.DATABASE_PATH)
+        self.faculty_id = connection.execute("SELECT id FROM faculty ORDER BY id LIMIT 1;").fetchone()[0]
+        # Exam parameters of the fixture are the same every year, the forecast draws from their spread
+        connection.execute("""
+            UPDATE exam SET mean = mean + year % 3, standard_deviation = standard_deviation - year % 2
+            WHERE mean IS NOT NULL;""")
+        connection.commit()
+        connection.close()
+
+    def test_same_seed_gives_same_forecast(self):
+        first = forecast.forecast_admission(self.faculty_id, STUDENT_POINTS, WEIGHTS, draws=2000, seed=7)
+        second = forecast.forecast_admission(self.faculty_id, STUDENT_POINTS, WEIGHTS, draws=2000, seed=7)
+        other = forecast.forecast_admission(self.faculty_id, STUDENT_POINTS, WEIGHTS, draws=2000, seed=8)
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first["contest_score"], other["contest_score"])
+
+    def test_probabilities(self):
+        result = forecast.forecast_admission(self.faculty_id, STUDENT_POINTS, WEIGHTS, draws=2000, seed=7)
+        self.assertEqual(result["draws"], 2000)
+        self.assertEqual(set(result["grant"]), {"100", "70", "50", "none"})
+        # Grant tiers are exclusive
+        self.assertAlmostEqual(sum(tier["probability"] for tier in result["grant"].values()), 1.0)
+
+        for probability in iter_probabilities(result):
+            low, high = probability["interval"]
+            self.assertLessEqual(0.0, low)
+            self.assertLessEqual(low, probability["probability"])
+            self.assertLessEqual(probability["probability"], high)
+            self.assertLessEqual(high, 1.0)
+
+        for name in ("contest_score", "faculty_cutoff", "grant_score"):
+            low, high = result[name]["interval"]
+            self.assertLessEqual(low, result[name]["median"])
+            self.assertLessEqual(result[name]["median"], high)
+
+    def test_grant_subject_must_be_weighted(self):
+        with self.assertRaises(ValueError):
+            forecast.forecast_admission(self.faculty_id, STUDENT_POINTS, WEIGHTS, grant_subject="CHEMISTRY")
+
+    def test_faculty_without_history_is_rejected(self):
+        with self.assertRaises(ValueError):
+            forecast.forecast_admission("0", STUDENT_POINTS, WEIGHTS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,19 @@
+"""
+Regression test of the startup imports of the query commands, see `src.benchmarks.import_time`.
+
+Usage: python -m unittest tests.test_import_time
+"""
+import unittest
+
+from src.benchmarks import import_time
+
+
+class ImportTimeTest(unittest.TestCase):
+
+    def test_query_commands_start_without_heavy_modules(self):
+        _, failures = import_time.check_commands(runs=3)
+        self.assertEqual(failures, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Tests of the parallel ingestion of year files, see `src.ingestion`.
+
+Usage: python -m unittest tests.test_ingestion
+"""
+import json
+import multiprocessing
+import os
+import unittest
+from unittest import mock
+
+from src import config, ingestion, instrumentation, pdf_extraction
+from src.benchmarks import synthetic
+from src.db import setup
+from tests import fixtures
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == "fork", "workers must inherit the patched extraction")
+class IngestionReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = fixtures.use_temporary_data(self)
+        setup.setup()
+
+        # Year files are hashed only, their pages come from the synthetic lists
+        for data_dir in (config.ENROLLMENT_DATA_DIR, config.GRANTS_DATA_DIR):
+            os.makedirs(data_dir)
+            with open(os.path.join(data_dir, "2024.pdf"), "w", encoding="utf-8") as file:
+                file.write(data_dir)
+
+        with mock.patch.multiple(synthetic, FACULTIES=20, UNIVERSITIES=3, GRANT_RECORDS=300):
+            enrollment_pages = synthetic.generate_enrollment_pages()
+            grant_pages = synthetic.generate_grant_pages()
+
+        for name, pages in (("iter_pages", enrollment_pages), ("extract_pages", grant_pages)):
+            patcher = mock.patch.object(pdf_extraction, name, lambda *args, pages=pages, **kwargs: list(pages))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_report_contains_stages_of_the_workers(self):
+        report_path = os.path.join(self.directory, "report.json")
+        with instrumentation.run("ingestion", report_path=report_path):
+            results = ingestion.ingest(workers=2)
+
+        self.assertEqual({result["status"] for result in results.values()}, {"succeeded"})
+
+        with open(report_path, encoding="utf-8") as file:
+            stages = json.load(file)["stages"]
+        for stage_name in ("pdf_extraction", "segmentation", "extraction", "snapshot_write", "db_insert"):
+            self.assertIn(stage_name, stages)
+        self.assertEqual(stages["snapshot_write"]["calls"], 2)
+        self.assertGreater(stages["pdf_extraction"]["counters"]["pages"], 0)
+        self.assertGreater(stages["segmentation"]["counters"]["chunks"], 0)
+        self.assertGreater(stages["extraction"]["counters"]["rows"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
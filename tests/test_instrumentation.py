@@ -0,0 +1,63 @@
+"""
+Tests of the run instrumentation, see `src.instrumentation`.
+
+Usage: python -m unittest tests.test_instrumentation
+"""
+import json
+import os
+import time
+import unittest
+
+from src import instrumentation
+from tests import fixtures
+
+# Seconds a row of the slow query takes to compute
+ROW_SECONDS = 0.01
+
+
+class TimedCursorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.report_path = os.path.join(fixtures.use_temporary_data(self), "report.json")
+
+    def run_queries(self, queries):
+        """
+        Run queries of a connection in a run and return the query stats of its report by statement.
+        """
+        with instrumentation.run("test", report_path=self.report_path):
+            connection = instrumentation.connect(":memory:")
+            connection.create_function("pause", 1, lambda value: time.sleep(ROW_SECONDS) or value)
+            connection.execute("CREATE TABLE item (value INTEGER);")
+            connection.executemany("INSERT INTO item (value) VALUES (?);", [(value,) for value in range(10)])
+            queries(connection)
+            connection.close()
+
+        with open(self.report_path, encoding="utf-8") as file:
+            return {query["statement"]: query for query in json.load(file)["queries"]}
+
+    def test_fetched_rows_are_timed_and_counted(self):
+        queries = self.run_queries(lambda connection: connection.execute("SELECT pause(value) FROM item;").fetchall())
+
+        query = queries["SELECT pause(value) FROM item;"]
+        self.assertEqual(query["calls"], 1)
+        self.assertEqual(query["rows"], 10)
+        # `execute` steps to the first row only, the other rows are computed while fetched
+        self.assertGreaterEqual(query["seconds"], 10 * ROW_SECONDS)
+
+    def test_every_fetch_method_counts_rows(self):
+        def queries(connection):
+            cursor = connection.execute("SELECT value FROM item;")
+            cursor.fetchone()
+            cursor.fetchmany(3)
+            for _ in cursor:
+                pass
+            connection.execute("SELECT value FROM item WHERE value < 0;").fetchone()
+
+        queries = self.run_queries(queries)
+        self.assertEqual(queries["SELECT value FROM item;"]["rows"], 10)
+        self.assertEqual(queries["SELECT value FROM item WHERE value < 0;"]["rows"], 0)
+        self.assertEqual(queries["INSERT INTO item (value) VALUES (?);"]["rows"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests of the extracted page text cache written by concurrent parsing workers, see `src.page_cache`.
+
+Usage: python -m unittest tests.test_page_cache
+"""
+import threading
+import unittest
+
+from src import config, page_cache
+from tests import fixtures
+
+EXTRACTOR_VERSION = "test"
+
+
+def make_pages(count, size):
+    return [(number, "x" * size) for number in range(count)]
+
+
+class PageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        fixtures.use_temporary_data(self)
+        self.connection = page_cache.connect()
+        self.addCleanup(self.connection.close)
+
+    def get_cached(self):
+        return dict(self.connection.execute("SELECT file_hash, size FROM document;").fetchall())
+
+    def test_connection_waits_for_other_writers(self):
+        self.assertEqual(self.connection.execute("PRAGMA journal_mode;").fetchone()[0], "wal")
+        self.assertEqual(self.connection.execute("PRAGMA busy_timeout;").fetchone()[0],
+                         config.PAGE_CACHE_BUSY_TIMEOUT * 1000)
+
+    def test_pages_are_stored(self):
+        self.assertTrue(page_cache.put_pages(self.connection, "a", EXTRACTOR_VERSION, 3, make_pages(3, 10), 100))
+        self.assertEqual(page_cache.get_page_count(self.connection, "a", EXTRACTOR_VERSION), 3)
+        pages = list(page_cache.iter_cached_pages(self.connection, "a", EXTRACTOR_VERSION))
+        self.assertEqual(pages, make_pages(3, 10))
+        self.assertEqual(self.get_cached(), {"a": 30})
+
+    def test_least_recently_used_is_evicted(self):
+        page_cache.put_pages(self.connection, "a", EXTRACTOR_VERSION, 4, make_pages(4, 10), 100)
+        page_cache.put_pages(self.connection, "b", EXTRACTOR_VERSION, 4, make_pages(4, 10), 100)
+        page_cache.put_pages(self.connection, "c", EXTRACTOR_VERSION, 4, make_pages(4, 10), 100)
+        self.assertEqual(self.get_cached(), {"b": 40, "c": 40})
+
+    def test_document_over_the_limit_is_not_stored(self):
+        page_cache.put_pages(self.connection, "a", EXTRACTOR_VERSION, 2, make_pages(2, 10), 100)
+
+        self.assertFalse(page_cache.put_pages(self.connection, "b", EXTRACTOR_VERSION, 2, make_pages(2, 60), 100))
+        self.assertEqual(self.get_cached(), {"a": 20})
+
+        # The pages of a document growing over the limit are dropped
+        self.assertFalse(page_cache.put_pages(self.connection, "a", EXTRACTOR_VERSION, 2, [(2, "x" * 90)], 100))
+        self.assertEqual(self.get_cached(), {})
+        self.assertEqual(self.connection.execute("SELECT COUNT(*) FROM page;").fetchone()[0], 0)
+
+    def test_concurrent_writers(self):
+        errors = []
+
+        def write(worker):
+            connection = page_cache.connect()
+            try:
+                for i in range(20):
+                    page_cache.put_pages(connection, f"{worker}-{i}", EXTRACTOR_VERSION, 5, make_pages(5, 1000))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.get_cached()), 80)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""
+Regression tests of the query plans of the analysis queries, see `src.db.query_plans`.
+
+Usage: python -m unittest discover -s tests -t .
+"""
+import unittest
+from unittest import mock
+
+from src.db import query_plans
+
+
+class FindFullScansTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = query_plans.create_schema_database()
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_analysis_queries_use_indexes(self):
+        self.assertEqual(query_plans.find_full_scans(self.connection), [])
+
+    def test_full_scan_is_reported(self):
+        queries = {"unindexed": ("SELECT * FROM faculty_threshold WHERE enrolled > ?;", (10,))}
+        full_scans = query_plans.find_full_scans(self.connection, queries)
+        self.assertEqual([name for name, _ in full_scans], ["unindexed"])
+
+    def test_scan_table_format_before_sqlite_3_36(self):
+        queries = {"legacy": ("SELECT 1;", ())}
+        with mock.patch.object(query_plans, "explain", return_value=["SCAN TABLE enrollment"]):
+            self.assertEqual(query_plans.find_full_scans(self.connection, queries), [("legacy", "SCAN TABLE enrollment")])
+
+        details = ["SCAN TABLE scores", "SEARCH TABLE enrollment USING PRIMARY KEY (faculty_id=?)"]
+        with mock.patch.object(query_plans, "explain", return_value=details):
+            self.assertEqual(query_plans.find_full_scans(self.connection, queries), [])
+
+    def test_covering_index_scan_is_reported(self):
+        queries = {"covering": ("SELECT student_id FROM enrollment WHERE student_id % 2 = ?;", (0,))}
+        self.assertEqual(
+            query_plans.find_full_scans(self.connection, queries),
+            [("covering", "SCAN enrollment USING COVERING INDEX enrollment_student_idx")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Tests of the data-versioned result cache of the analysis lookups, see `src.db.result_cache`.
+
+Usage: python -m unittest tests.test_result_cache
+"""
+import sqlite3
+import unittest
+from unittest import mock
+
+from src import config
+from src.db import analysis, api
+from src.db.result_cache import ResultCache
+from tests import fixtures
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = ResultCache(4)
+        self.assertIsNone(cache.get("a", 1))
+        cache.put("a", 1, ["row"])
+        self.assertEqual(cache.get("a", 1), ["row"])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_version_bump_invalidates_all_entries(self):
+        cache = ResultCache(4)
+        cache.get("a", 1)
+        cache.put("a", 1, ["a"])
+        cache.put("b", 1, ["b"])
+
+        self.assertIsNone(cache.get("a", 2))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()["invalidations"], 2)
+        self.assertEqual(cache.stats()["version"], 2)
+
+        # Entries of the new version are cached again
+        cache.put("a", 2, ["a2"])
+        self.assertEqual(cache.get("a", 2), ["a2"])
+
+    def test_put_of_another_version_is_skipped(self):
+        cache = ResultCache(4)
+        cache.get("a", 2)
+
+        # Read at version 1 by a lookup that started before version 2 was committed
+        cache.put("a", 1, ["stale"])
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get("a", 2))
+
+        # Nothing was looked up yet, no version to cache results of
+        cache = ResultCache(4)
+        cache.put("a", 1, ["a"])
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ResultCache(2)
+        cache.get("a", 1)
+        cache.put("a", 1, "a")
+        cache.put("b", 1, "b")
+        cache.get("a", 1)
+        cache.put("c", 1, "c")
+
+        self.assertIsNone(cache.get("b", 1))
+        self.assertEqual((cache.get("a", 1), cache.get("c", 1)), ("a", "c"))
+        self.assertEqual(cache.evictions, 1)
+
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get("c", 1), "c")
+
+        cache.resize(0)
+        cache.put("d", 1, "d")
+        self.assertEqual(len(cache), 0)
+
+
+class AnalysisCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        fixtures.use_temporary_data(self)
+        fixtures.create_database()
+
+        patcher = mock.patch.object(analysis, "result_cache", ResultCache(16))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        connection = sqlite3.connect(config.DATABASE_PATH)
+        self.faculty_id = connection.execute("SELECT id FROM faculty ORDER BY id LIMIT 1;").fetchone()[0]
+        connection.close()
+
+    def check_historical_data(self):
+        return analysis.check_historical_data(
+            self.faculty_id,
+            {"MATHEMATICS": 45, "FOREIGN LANGUAGE": 55, "GEORGIAN LANGUAGE": 50},
+            {"MATHEMATICS": 4, "FOREIGN LANGUAGE": 2, "GEORGIAN LANGUAGE": 2},
+        )
+
+    def bump_data_version(self):
+        connection = sqlite3.connect(config.DATABASE_PATH)
+        api.bump_data_version(connection.cursor())
+        connection.commit()
+        connection.close()
+
+    def test_data_version_bump_invalidates_lookups(self):
+        rows = self.check_historical_data()
+        self.assertEqual(self.check_historical_data(), rows)
+        self.assertEqual(analysis.cache_stats()["hits"], 1)
+
+        self.bump_data_version()
+        self.assertEqual(self.check_historical_data(), rows)
+        stats = analysis.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["invalidations"]), (1, 2, 1))
+
+    def test_result_of_a_previous_version_is_not_cached(self):
+        fetch_rows = analysis.fetch_rows
+
+        def fetch_rows_during_ingestion(query, params=()):
+            # An ingestion commits and another lookup sees its version while the query runs
+            self.bump_data_version()
+            analysis.result_cache.get("other lookup", analysis.get_data_version())
+            return fetch_rows(query, params)
+
+        with mock.patch.object(analysis, "fetch_rows", fetch_rows_during_ingestion):
+            self.check_historical_data()
+        self.assertEqual(analysis.cache_stats()["size"], 0)
+
+        self.check_historical_data()
+        self.assertEqual(analysis.cache_stats()["hits"], 0)
+        self.assertEqual(analysis.cache_stats()["size"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
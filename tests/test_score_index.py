@@ -0,0 +1,91 @@
+"""
+Tests of the score-distribution index against SQL counts of the enrollments, see `src.db.score_index`.
+
+Usage: python -m unittest tests.test_score_index
+"""
+import sqlite3
+import unittest
+
+import numpy as np
+
+from src import config
+from src.db import score_index
+from tests import fixtures
+
+
+class ScoreIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        fixtures.use_temporary_data(self)
+        fixtures.create_database()
+
+        self.connection = sqlite3.connect(config.DATABASE_PATH)
+        self.addCleanup(self.connection.close)
+        faculty_ids = [faculty_id for faculty_id, in self.connection.execute("SELECT id FROM faculty ORDER BY id LIMIT 3;")]
+
+        # Faculties whose IDs differ by leading zeros only, with lower scores than the original
+        self.faculty_ids = faculty_ids + [f"0{faculty_id}" for faculty_id in faculty_ids[:2]]
+        for offset, faculty_id in enumerate(faculty_ids[:2], start=1):
+            self.connection.execute("""
+                INSERT INTO faculty (id, name, university_id)
+                SELECT '0' || id, name, university_id FROM faculty WHERE id = ?;""", (faculty_id,)
+            )
+            self.connection.execute("""
+                INSERT INTO enrollment (student_id, faculty_id, contest_score, rank, year)
+                SELECT student_id + ? * 100000000, '0' || faculty_id, contest_score - 50, rank, year
+                FROM enrollment WHERE faculty_id = ?;""", (offset, faculty_id)
+            )
+        self.connection.commit()
+
+        score_index.build_index()
+        self.index = score_index.ScoreIndex()
+
+    def get_queries(self, faculty_id, year):
+        """
+        Contest scores to query a faculty year with: its enrolled scores, between them and beyond them.
+        """
+        scores = np.array([score for score, in self.connection.execute(
+            "SELECT contest_score FROM enrollment WHERE faculty_id = ? AND year = ? ORDER BY contest_score;",
+            (faculty_id, year)
+        )])
+        return np.concatenate((scores, (scores[1:] + scores[:-1]) / 2, [scores[0] - 1, scores[-1] + 1]))
+
+    def test_rank_and_percentile_match_sql(self):
+        for faculty_id in self.faculty_ids:
+            years = self.index.get_years(faculty_id)
+            self.assertEqual(years, list(fixtures.YEARS))
+
+            for year in years:
+                with self.subTest(faculty_id, year=year):
+                    queries = self.get_queries(faculty_id, year)
+                    ranks = self.index.rank(faculty_id, year, queries)
+                    percentiles = self.index.percentile(faculty_id, year, queries)
+
+                    for contest_score, rank, percentile in zip(queries.tolist(), ranks.tolist(), percentiles.tolist()):
+                        below, not_above, total, sql_rank = self.connection.execute("""
+                            SELECT COUNT(*) FILTER (WHERE contest_score < :score),
+                                   COUNT(*) FILTER (WHERE contest_score <= :score),
+                                   COUNT(*),
+                                   (SELECT rank FROM enrollment
+                                    WHERE faculty_id = :faculty_id AND year = :year AND contest_score < :score
+                                    ORDER BY contest_score DESC, rank DESC LIMIT 1)
+                            FROM enrollment
+                            WHERE faculty_id = :faculty_id AND year = :year;""",
+                            {"faculty_id": faculty_id, "year": year, "score": contest_score}
+                        ).fetchone()
+
+                        self.assertAlmostEqual(percentile, 100.0 * (below + not_above) / (2 * total))
+                        if sql_rank is None:
+                            self.assertTrue(np.isnan(rank))
+                        else:
+                            self.assertEqual(rank, sql_rank)
+                        self.assertEqual(self.index.lookup(faculty_id, year, contest_score)["total_enrolled"], total)
+
+    def test_unknown_faculty_has_no_runs(self):
+        self.assertEqual(self.index.get_years("0"), [])
+        self.assertTrue(np.isnan(self.index.rank("0", fixtures.YEARS[0], 500.0)))
+        self.assertTrue(np.isnan(self.index.percentile("0", fixtures.YEARS[0], 500.0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
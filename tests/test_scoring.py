@@ -0,0 +1,147 @@
+"""
+Tests of the historical query generated for any subject combination, see `src.db.scoring`.
+
+Usage: python -m unittest tests.test_scoring
+"""
+import sqlite3
+import unittest
+
+from src import config, constants
+from src.benchmarks import synthetic
+from src.db import scoring
+from tests import fixtures
+
+# Scores are compared with a tolerance, SQLite 3.43 and later sum with compensated summation
+SCORE_TOLERANCE = 1e-9
+
+# (weights, grant subject) of subject combinations, of 2, 3 and 4 subjects
+COMBINATIONS = {
+    "mathematics and georgian": ({"MATHEMATICS": 4, "GEORGIAN LANGUAGE": 2}, None),
+    "mandatory only": ({"FOREIGN LANGUAGE": 3, "GEORGIAN LANGUAGE": 3}, None),
+    "mathematics": ({"MATHEMATICS": 6, "FOREIGN LANGUAGE": 3, "GEORGIAN LANGUAGE": 3}, None),
+    "physics grant": ({"PHYSICS": 4, "MATHEMATICS": 2, "FOREIGN LANGUAGE": 1, "GEORGIAN LANGUAGE": 1}, "PHYSICS"),
+}
+# Points of the students, as a share of the point range of each subject
+POINT_LEVELS = (0.3, 0.6, 0.75, 0.9)
+
+
+def get_student_points(subjects, level):
+    points = {}
+    for subject in subjects:
+        min_score, max_score, _, _ = synthetic.EXAM_PARAMETERS.get(
+            subject, synthetic.ELECTIVE_EXAM_PARAMETERS
+        )
+        points[subject] = round(min_score + level * (max_score - min_score))
+    return points
+
+
+class HistoricalQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        fixtures.use_temporary_data(self)
+        fixtures.create_database()
+        self.connection = sqlite3.connect(config.DATABASE_PATH)
+        self.addCleanup(self.connection.close)
+        self.faculty_id = self.connection.execute("SELECT id FROM faculty ORDER BY id LIMIT 1;").fetchone()[0]
+
+    def expected_rows(self, student_points, weights, grant_subject):
+        """
+        Historical rows computed in Python from the fixture tables, by year.
+        """
+        subjects = scoring.normalize_subjects(weights)
+        if grant_subject is None:
+            grant_subject = scoring.get_grant_subject(subjects)
+        coefficients = dict(zip(subjects, scoring.get_grant_coefficients(subjects, grant_subject)))
+
+        parameters = {}
+        for subject_name, year, mean, standard_deviation in self.connection.execute(
+                "SELECT subject_name, year, mean, standard_deviation FROM exam;"):
+            parameters.setdefault(year, {})[subject_name] = (mean, standard_deviation)
+
+        expected = {}
+        for year, year_parameters in parameters.items():
+            if any(None in year_parameters.get(subject, (None,)) for subject in subjects):
+                continue
+
+            scaled = {
+                subject: 15.0 * ((student_points[subject] - year_parameters[subject][0]) / year_parameters[subject][1]) + 150
+                for subject in subjects
+            }
+            contest_score = sum(scaled[subject] * weights[subject] for subject in subjects)
+            grant_score = sum(scaled[subject] * coefficients[subject] for subject in subjects) * 10
+
+            enrolled = self.connection.execute(
+                "SELECT contest_score, rank FROM enrollment WHERE faculty_id = ? AND year = ?;", (self.faculty_id, year)
+            ).fetchall()
+            below = [row for row in enrolled if row[0] < contest_score]
+            rank = max(below)[1] if below else None
+
+            grant_amount = None
+            if grant_subject is not None:
+                granted = self.connection.execute("""
+                    SELECT grant_score, grant_amount FROM grant
+                    WHERE subject_id = (SELECT id FROM subject WHERE name = ?) AND year = ?;""", (grant_subject, year)
+                ).fetchall()
+                below = [row for row in granted if row[0] < grant_score]
+                grant_amount = max(below)[1] if below else None
+
+            expected[year] = (grant_score, contest_score, grant_amount, rank, len(enrolled))
+
+        return expected
+
+    def test_combinations_match_python(self):
+        ranks = set()
+        grant_amounts = set()
+        for name, (weights, grant_subject) in COMBINATIONS.items():
+            subjects = scoring.normalize_subjects(weights)
+            query = scoring.compile_historical_query(subjects, grant_subject)
+
+            for level in POINT_LEVELS:
+                student_points = get_student_points(subjects, level)
+                with self.subTest(name, level=level):
+                    params = scoring.historical_query_params(
+                        subjects, self.faculty_id, student_points, weights, grant_subject
+                    )
+                    rows = {row[0]: row[1:] for row in self.connection.execute(query, params)}
+
+                    expected = self.expected_rows(student_points, weights, grant_subject)
+                    self.assertTrue(rows)
+                    self.assertEqual(set(rows), set(expected))
+                    if "FOREIGN LANGUAGE" in subjects:
+                        self.assertNotIn(fixtures.MISSING_EXAM_PARAMETER[1], rows)
+
+                    for year, (grant_score, contest_score, grant_amount, rank, total_enrolled) in expected.items():
+                        row = rows[year]
+                        self.assertAlmostEqual(row[0], grant_score, delta=SCORE_TOLERANCE * abs(grant_score))
+                        self.assertAlmostEqual(row[1], contest_score, delta=SCORE_TOLERANCE * abs(contest_score))
+                        self.assertEqual(row[2:], (grant_amount, rank, total_enrolled))
+                        ranks.add(rank)
+                        grant_amounts.add(grant_amount)
+
+        # The students fall below, within and above the enrolled students and grant lists
+        self.assertGreater(len(ranks - {None, 1}), 1)
+        self.assertTrue({None, 50, 70, 100}.issubset(grant_amounts))
+
+    def test_grant_amount_is_null_without_elective(self):
+        weights, _ = COMBINATIONS["mandatory only"]
+        student_points = get_student_points(weights, 0.9)
+        query, params = scoring.prepare_historical_query(self.faculty_id, student_points, weights)
+        self.assertEqual({row[3] for row in self.connection.execute(query, params)}, {None})
+
+    def test_grant_subject_must_be_weighted(self):
+        weights, _ = COMBINATIONS["mathematics"]
+        student_points = get_student_points(weights, 0.9)
+        with self.assertRaises(ValueError):
+            scoring.prepare_historical_query(self.faculty_id, student_points, weights, "PHYSICS")
+        with self.assertRaises(ValueError):
+            scoring.prepare_historical_query(self.faculty_id, student_points, weights, "x' OR 1 = 1 --")
+
+    def test_grant_coefficients(self):
+        subjects = scoring.normalize_subjects(("GEORGIAN LANGUAGE", "PHYSICS", "MATHEMATICS", "FOREIGN LANGUAGE"))
+        self.assertEqual(subjects, ("PHYSICS", "MATHEMATICS") + constants.MANDATORY_SUBJECTS)
+        self.assertEqual(scoring.get_grant_coefficients(subjects), (1.5, 0, 1, 1))
+        self.assertEqual(scoring.get_grant_coefficients(subjects, "MATHEMATICS"), (0, 1.5, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
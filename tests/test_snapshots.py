@@ -0,0 +1,66 @@
+"""
+Tests of writing enrollment snapshots and rebuilding batches from them, see `src.snapshots`.
+
+Usage: python -m unittest tests.test_snapshots
+"""
+import unittest
+
+import numpy as np
+
+from src import snapshots
+from tests import fixtures
+
+
+class EnrollmentSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        fixtures.use_temporary_data(self)
+        self.year = fixtures.YEARS[0]
+        enrollment_pages, _ = fixtures.generate_pages(self.year)
+        self.batches = list(fixtures.iter_enrollment_batches(enrollment_pages, self.year))
+
+        count = snapshots.write_enrollment_snapshot(self.year, self.batches, f"{self.year}.pdf", "hash")
+        self.assertEqual(count, sum(len(batch) for batch in self.batches))
+        self.tables = snapshots.read_snapshot("enrollment", self.year)
+
+    def assert_batches_equal(self, batches):
+        """
+        Compare rebuilt batches with the written ones, subjects are stored with their database names.
+        """
+        self.assertEqual([batch.faculty_id for batch in batches], [batch.faculty_id for batch in self.batches])
+        for batch, expected in zip(batches, self.batches):
+            with self.subTest(batch.faculty_id):
+                self.assertEqual(
+                    (batch.year, batch.university_id, batch.university_name, batch.faculty_name),
+                    (expected.year, expected.university_id, expected.university_name, expected.faculty_name),
+                )
+                self.assertEqual(batch.subjects, expected.subject_names)
+                np.testing.assert_array_equal(batch.ranks, expected.ranks)
+                np.testing.assert_array_equal(batch.student_ids, expected.student_ids)
+                np.testing.assert_array_equal(batch.contest_scores, expected.contest_scores)
+                np.testing.assert_array_equal(batch.subject_scores, expected.subject_scores[:, :len(batch.subjects)])
+
+    def test_round_trip(self):
+        self.assertTrue(any(batch.subject_scores.shape[1] for batch in self.batches))
+        self.assert_batches_equal(list(snapshots.iter_enrollment_records(self.tables)))
+
+    def test_enrollments_of_a_faculty_need_not_be_consecutive(self):
+        # Rows of the faculties taken in turns, in list order within each faculty
+        enrollment = self.tables["enrollment"]
+        faculties = np.repeat(np.arange(len(self.batches)), [len(batch) for batch in self.batches])
+        positions = np.concatenate([np.arange(len(batch)) for batch in self.batches])
+        order = np.lexsort((faculties, positions))
+        self.tables["enrollment"] = {column: values[order] for column, values in enrollment.items()}
+        self.assertFalse(np.array_equal(self.tables["enrollment"]["faculty_id"], enrollment["faculty_id"]))
+
+        self.assert_batches_equal(list(snapshots.iter_enrollment_records(self.tables)))
+
+    def test_enrollments_without_faculty_are_rejected(self):
+        faculty = self.tables["faculty"]
+        self.tables["faculty"] = {column: values[1:] for column, values in faculty.items()}
+        with self.assertRaises(ValueError):
+            list(snapshots.iter_enrollment_records(self.tables))
+
+
+if __name__ == "__main__":
+    unittest.main()
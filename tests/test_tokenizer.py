@@ -0,0 +1,95 @@
+"""
+Tests of the single-pass tokenizers against the regular expression extractors they replace,
+see `src.enrollments.tokenizer` and `src.grants.tokenizer`.
+
+Usage: python -m unittest tests.test_tokenizer
+"""
+import re
+import unittest
+
+import numpy as np
+
+from src.benchmarks import tokenizer_benchmark
+from src.enrollments import extractors, segmentation
+from src.enrollments import tokenizer as enrollment_tokenizer
+from src.grants import tokenizer as grant_tokenizer
+from tests import fixtures
+
+# Enrollment row pattern before the grant amount was kept on its row, its \s+ crosses newlines
+ORIGINAL_ENROLLMENT_PATTERN = re.compile(
+    r"^(\d+)\s+(\d{9})\s+((?:\d{3}\.\d\s+){3,4})(\d+\.\d)(?:\s+(?:50|70|100))?", flags=re.MULTILINE
+)
+# Enrollment row line: rank and 9-digit student ID
+ROW_LINE_PATTERN = re.compile(r"^\d+ \d{9} ", flags=re.MULTILINE)
+
+# Rows ranked 50 and 100 follow rows without a grant amount, 51 has one
+GRANT_AMOUNT_CHUNK = """001 სსიპ - თბილისის სახელმწიფო უნივერსიტეტი
+00100001 ჰუმანიტარულ მეცნიერებათა
+ფაკულტეტი
+წლიური გადასახადი 2250
+საგამოცდოს ქართული უცხოური ისტორია საკონკურსო გრანტი %
+ნომერი ენა ქულა
+49 401000001 150.0 160.0 170.0 1800.0
+50 401000002 149.0 159.0 169.0 1790.0
+51 401000003 148.0 158.0 168.0 1780.0 70
+52 401000004 147.0 157.0 167.0 1770.0
+100 401000005 146.0 156.0 166.0 1760.0"""
+
+
+class EnrollmentTokenizerTest(unittest.TestCase):
+
+    def test_synthetic_chunks_match_extractors(self):
+        enrollment_pages, _ = fixtures.generate_pages(fixtures.YEARS[0])
+        chunks = list(segmentation.iter_chunks(enrollment_pages))
+        self.assertEqual(len(chunks), fixtures.SYNTHETIC_VOLUME["FACULTIES"])
+
+        dropped = 0
+        for chunk in chunks:
+            batch = enrollment_tokenizer.tokenize_chunk(chunk)
+            dropped += len(batch) - len(ORIGINAL_ENROLLMENT_PATTERN.findall(chunk))
+            with self.subTest(batch.faculty_id):
+                self.assertTrue(batch.equals(tokenizer_benchmark.regex_chunk(chunk)))
+                # One row per enrollment line, the original pattern drops some of them
+                self.assertEqual(len(batch), len(ROW_LINE_PATTERN.findall(chunk)))
+
+        # Rows ranked 50, 70 or 100 after a row without grant amount are among them
+        self.assertGreater(dropped, 0)
+
+    def test_grant_amount_stays_on_its_row(self):
+        batch = enrollment_tokenizer.tokenize_chunk(GRANT_AMOUNT_CHUNK)
+        self.assertTrue(batch.equals(tokenizer_benchmark.regex_chunk(GRANT_AMOUNT_CHUNK)))
+        np.testing.assert_array_equal(batch.ranks, [49, 50, 51, 52, 100])
+        np.testing.assert_array_equal(batch.contest_scores, [1800.0, 1790.0, 1780.0, 1770.0, 1760.0])
+        self.assertEqual(batch.faculty_name, "ჰუმანიტარულ მეცნიერებათა\nფაკულტეტი")
+
+        # The original pattern took the ranks 50 and 100 for grant amounts, dropping their rows
+        self.assertEqual([int(match[0]) for match in ORIGINAL_ENROLLMENT_PATTERN.findall(GRANT_AMOUNT_CHUNK)],
+                         [49, 51, 52])
+        self.assertEqual(len(extractors.extract_enrollment_records(GRANT_AMOUNT_CHUNK)), 5)
+
+    def test_missing_faculty_is_rejected(self):
+        chunk = GRANT_AMOUNT_CHUNK.replace("წლიური გადასახადი", "გადასახადი")
+        with self.assertRaises(ValueError):
+            enrollment_tokenizer.tokenize_chunk(chunk)
+        with self.assertRaises(ValueError):
+            extractors.extract_faculty_name_and_id(chunk)
+
+
+class GrantTokenizerTest(unittest.TestCase):
+
+    def test_synthetic_pages_match_extractors(self):
+        _, grant_pages = fixtures.generate_pages(fixtures.YEARS[0])
+        self.assertTrue(grant_pages)
+
+        for i, page in enumerate(grant_pages):
+            with self.subTest(page=i):
+                self.assertEqual(grant_tokenizer.tokenize_page(page), tokenizer_benchmark.regex_page(page))
+
+    def test_page_without_grant_amount_is_rejected(self):
+        _, grant_pages = fixtures.generate_pages(fixtures.YEARS[0])
+        with self.assertRaises(ValueError):
+            grant_tokenizer.tokenize_page(grant_pages[0].replace("%", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()